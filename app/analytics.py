@@ -0,0 +1,237 @@
+from datetime import timedelta
+import click
+from sqlalchemy import delete, func, insert, select, update, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Book, Category, Order, OrderItem, SalesDay, BookSalesDay
+
+"""
+Sales analytics
+Daily rollups of orders, units and revenue, store-wide (sales_day) and per
+book and category (book_sales_day). Checkout and order cancellation adjust
+the rollups in their own transaction; rebuild() recomputes them from the
+order tables in bulk. Admin charts read only the rollup tables, so they cost
+one small GROUP BY over days instead of a scan of order_item.
+"""
+
+MEASURES = ('orders', 'units', 'revenue')
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def _upsert(model, keys, rows):
+    """
+    Add rows of measure deltas to a rollup table
+    Uses one INSERT ... ON CONFLICT DO UPDATE where the database supports it,
+    so concurrent checkouts on the same day cannot collide on the insert;
+    other databases update existing keys and insert the rest
+    Args:
+        model: SalesDay or BookSalesDay
+        keys: Primary key column names
+        rows: List of dicts with the key columns and every measure
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect_insert = UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(table)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={name: table.c[name] + statement.excluded[name] for name in MEASURES}
+            ),
+            rows
+        )
+        return
+
+    key_columns = [table.c[name] for name in keys]
+    existing = set(db.session.execute(
+        select(*key_columns).where(tuple_(*key_columns).in_([tuple(row[k] for k in keys) for row in rows]))
+    ).all())
+    for row in rows:
+        if tuple(row[k] for k in keys) in existing:
+            db.session.execute(
+                update(table)
+                .where(*[table.c[k] == row[k] for k in keys])
+                .values({name: table.c[name] + row[name] for name in MEASURES})
+            )
+        else:
+            db.session.execute(insert(table).values(row))
+
+
+def record_sale(day, lines, sign=1):
+    """
+    Add one order to the rollups in the current transaction
+    Args:
+        day: Date of the order
+        lines: List of dicts with 'book_id', 'category_id', 'quantity' and
+               'price' (unit price paid)
+        sign: 1 for a new order, -1 to take a cancelled order back out
+    """
+    books = {}
+    for line in lines:
+        entry = books.setdefault(line['book_id'], {
+            'day': day, 'book_id': line['book_id'], 'category_id': line['category_id'],
+            'orders': sign, 'units': 0, 'revenue': 0,
+        })
+        entry['units'] += sign * line['quantity']
+        entry['revenue'] += sign * line['quantity'] * line['price']
+
+    _upsert(SalesDay, ['day'], [{
+        'day': day,
+        'orders': sign,
+        'units': sum(entry['units'] for entry in books.values()),
+        'revenue': sum(entry['revenue'] for entry in books.values()),
+    }])
+    _upsert(BookSalesDay, ['day', 'book_id'], list(books.values()))
+
+    if sign < 0:
+        # Drop rows a cancellation emptied, as rebuild() would not create them
+        db.session.execute(delete(SalesDay).where(SalesDay.day == day, SalesDay.orders <= 0))
+        db.session.execute(delete(BookSalesDay).where(BookSalesDay.day == day, BookSalesDay.orders <= 0))
+
+
+def record_order_status_change(order, old_status):
+    """
+    Keep the rollups in step with cancellations
+    Cancelled orders are not counted as sales; moving an order into or out of
+    'Cancelled' removes it from or adds it back to its day
+    Args:
+        order: Order whose status was just changed (not yet committed)
+        old_status: Status before the change
+    """
+    was_counted = old_status != 'Cancelled'
+    is_counted = order.status != 'Cancelled'
+    if was_counted == is_counted:
+        return
+
+    lines = [
+        {'book_id': row.book_id, 'category_id': row.category_id,
+         'quantity': row.quantity, 'price': row.price_at_purchase}
+        for row in db.session.query(OrderItem.book_id, Book.category_id, OrderItem.quantity,
+                                    OrderItem.price_at_purchase)
+        .outerjoin(Book, OrderItem.book_id == Book.id)
+        .filter(OrderItem.order_id == order.id)
+    ]
+    record_sale(order.created_at.date(), lines, sign=1 if is_counted else -1)
+
+
+def rebuild(since=None):
+    """
+    Recompute the rollups from the order tables
+    Each table is refilled by one INSERT ... SELECT ... GROUP BY
+    Args:
+        since: Only rebuild days from this date on (None rebuilds everything)
+    Returns:
+        Number of days with sales in the rollup table
+    """
+    day = func.date(Order.created_at)
+    counted = [Order.status != 'Cancelled']
+    if since is not None:
+        counted.append(Order.created_at >= since)
+        db.session.execute(delete(SalesDay).where(SalesDay.day >= since))
+        db.session.execute(delete(BookSalesDay).where(BookSalesDay.day >= since))
+    else:
+        db.session.execute(delete(SalesDay))
+        db.session.execute(delete(BookSalesDay))
+
+    order_units = (select(OrderItem.order_id, func.sum(OrderItem.quantity).label('units'))
+                   .group_by(OrderItem.order_id)
+                   .subquery())
+    db.session.execute(insert(SalesDay).from_select(
+        ['day', 'orders', 'units', 'revenue'],
+        select(day, func.count(Order.id), func.coalesce(func.sum(order_units.c.units), 0),
+               func.coalesce(func.sum(Order.total_price), 0))
+        .outerjoin(order_units, order_units.c.order_id == Order.id)
+        .where(*counted)
+        .group_by(day)
+    ))
+    db.session.execute(insert(BookSalesDay).from_select(
+        ['day', 'book_id', 'category_id', 'orders', 'units', 'revenue'],
+        select(day, OrderItem.book_id, func.max(Book.category_id),
+               func.count(func.distinct(OrderItem.order_id)), func.sum(OrderItem.quantity),
+               func.sum(OrderItem.quantity * OrderItem.price_at_purchase))
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Book, OrderItem.book_id == Book.id)
+        .where(*counted)
+        .group_by(day, OrderItem.book_id)
+    ))
+    db.session.commit()
+    return db.session.query(func.count(SalesDay.day)).scalar()
+
+
+def daily_series(start, end):
+    """
+    Orders, units and revenue for every day from start to end (inclusive)
+    Days without sales are filled in with zeros
+    Returns:
+        List of dicts with 'day' and every measure
+    """
+    rows = {row.day: row for row in
+            SalesDay.query.filter(SalesDay.day >= start, SalesDay.day <= end).all()}
+    series = []
+    current = start
+    while current <= end:
+        row = rows.get(current)
+        series.append({
+            'day': current,
+            'orders': row.orders if row else 0,
+            'units': row.units if row else 0,
+            'revenue': row.revenue if row else 0,
+        })
+        current += timedelta(days=1)
+    return series
+
+
+def top_sellers(start, end, limit=10):
+    """
+    Best selling books by units between start and end (inclusive)
+    Returns:
+        List of rows with book_id, title, units and revenue
+    """
+    totals = (db.session.query(BookSalesDay.book_id,
+                               func.sum(BookSalesDay.units).label('units'),
+                               func.sum(BookSalesDay.revenue).label('revenue'))
+              .filter(BookSalesDay.day >= start, BookSalesDay.day <= end)
+              .group_by(BookSalesDay.book_id)
+              .subquery())
+    return (db.session.query(totals.c.book_id, Book.title, totals.c.units, totals.c.revenue)
+            .outerjoin(Book, Book.id == totals.c.book_id)
+            .filter(totals.c.units > 0)
+            .order_by(totals.c.units.desc(), totals.c.revenue.desc())
+            .limit(limit)
+            .all())
+
+
+def category_revenue(start, end):
+    """
+    Revenue and units per category between start and end (inclusive)
+    Returns:
+        List of rows with category_id, name, units and revenue, highest revenue first
+    """
+    totals = (db.session.query(BookSalesDay.category_id,
+                               func.sum(BookSalesDay.units).label('units'),
+                               func.sum(BookSalesDay.revenue).label('revenue'))
+              .filter(BookSalesDay.day >= start, BookSalesDay.day <= end)
+              .group_by(BookSalesDay.category_id)
+              .subquery())
+    return (db.session.query(totals.c.category_id, Category.name, totals.c.units, totals.c.revenue)
+            .outerjoin(Category, Category.id == totals.c.category_id)
+            .filter(totals.c.units > 0)
+            .order_by(totals.c.revenue.desc())
+            .all())
+
+
+def init_app(app):
+    """Register the `flask rebuild-analytics` command"""
+
+    @app.cli.command('rebuild-analytics')
+    @click.option('--since', type=click.DateTime(['%Y-%m-%d']),
+                  help='Only rebuild days from this date (YYYY-MM-DD).')
+    def rebuild_analytics_command(since):
+        """Recompute the daily sales rollups from the order tables."""
+        print(f'Sales rollups rebuilt ({rebuild(since.date() if since else None)} days with sales).')
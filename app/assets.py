@@ -0,0 +1,331 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import urllib.request
+import click
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # .br variants are only built when brotli is installed
+    brotli = None
+
+"""
+Static asset pipeline
+`flask vendor-assets` downloads the pinned third-party CSS, JavaScript and
+fonts into static/vendor so pages no longer depend on a CDN.
+`flask build-assets` minifies every static file into static/dist under a
+content-hash name (css/style.css -> dist/css/style.1a2b3c4d5e.css), writes
+.gz (and .br) variants next to it and records the names in a manifest.
+url_for('static', filename=...) then returns the hashed name, the static
+view sends a precompressed variant the browser accepts, and hashed files
+are cached for ASSETS_MAX_AGE as immutable.
+"""
+
+# Third-party assets: static path -> pinned source URL
+VENDOR_ASSETS = {
+    'vendor/bootstrap/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff',
+}
+
+BUILD_DIR = 'dist'
+
+# Worth precompressing (fonts and images are compressed already)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def _strip_comments(source, line_comments):
+    """Drop /* */ (and // line) comments outside string literals"""
+    output = []
+    index, length = 0, len(source)
+    quote = None
+    while index < length:
+        char = source[index]
+        if quote:
+            output.append(char)
+            if char == '\\' and index + 1 < length:
+                output.append(source[index + 1])
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+            output.append(char)
+        elif char == '\\' and index + 1 < length:
+            output.append(source[index:index + 2])
+            index += 1
+        elif source.startswith('/*', index):
+            end = source.find('*/', index + 2)
+            index = length if end == -1 else end + 2
+            continue
+        elif (line_comments and source.startswith('//', index)
+              and not source[source.rfind('\n', 0, index) + 1:index].strip()):
+            # Whole-line comments only: '//' after code may sit in a regex literal
+            end = source.find('\n', index)
+            index = length if end == -1 else end
+            continue
+        else:
+            output.append(char)
+        index += 1
+    return ''.join(output)
+
+
+def minify_css(source):
+    """Remove comments and the whitespace CSS does not need"""
+    css = _strip_comments(source, line_comments=False)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """
+    Conservative JavaScript minification: comments, indentation and blank
+    lines go, line breaks stay (so automatic semicolon insertion still works)
+    """
+    script = _strip_comments(source, line_comments=True)
+    return '\n'.join(line.strip() for line in script.splitlines() if line.strip())
+
+
+def _hashed_name(path, data):
+    stem, extension = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{extension}'
+
+
+def _rewrite_css_urls(css, path, manifest):
+    """Point url() references of a stylesheet at the hashed files"""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        reference = match.group(2).strip()
+        if reference.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(directory, re.split(r'[?#]', reference)[0]))
+        if target not in manifest:
+            return match.group(0)
+        return f'url({posixpath.relpath(manifest[target], posixpath.join(BUILD_DIR, directory))})'
+    return _CSS_URL.sub(replace, css)
+
+
+def _compress(path, data):
+    """Write .gz (and .br) variants of a file when they are smaller"""
+    written = []
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + '.gz', 'wb') as handle:
+            handle.write(gz)
+        written.append('gzip')
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + '.br', 'wb') as handle:
+                handle.write(br)
+            written.append('br')
+    return written
+
+
+def _sources(static_folder, exclude=()):
+    """Static paths ('css/style.css') outside the build and excluded directories"""
+    skipped = {BUILD_DIR, *exclude}
+    for root, dirs, files in os.walk(static_folder):
+        relative = posixpath.relpath(root.replace(os.sep, '/'), static_folder.replace(os.sep, '/'))
+        if relative in skipped:
+            dirs[:] = []
+            continue
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                yield posixpath.normpath(posixpath.join(relative, name))
+
+
+def build(static_folder, clean=False, exclude=()):
+    """
+    Minify, fingerprint and precompress every static file into static/dist
+    Files of earlier builds are kept (pages and caches still referencing
+    them keep working) unless clean is set
+    Args:
+        static_folder: The app's static folder
+        clean: Remove build output not referenced by the new manifest
+        exclude: Static subdirectories that are not assets (e.g. uploads)
+    Returns:
+        Manifest dict of source path -> hashed path (both relative to static)
+    """
+    output = os.path.join(static_folder, BUILD_DIR)
+    manifest = {}
+    # Stylesheets last, so the fonts and images they reference are hashed first
+    for path in sorted(_sources(static_folder, exclude), key=lambda path: (path.endswith('.css'), path)):
+        with open(os.path.join(static_folder, path), 'rb') as handle:
+            data = handle.read()
+        minified = '.min.' in posixpath.basename(path)
+        if path.endswith('.css'):
+            css = _rewrite_css_urls(data.decode('utf-8'), path, manifest)
+            data = (css if minified else minify_css(css)).encode('utf-8')
+        elif path.endswith('.js') and not minified:
+            data = minify_js(data.decode('utf-8')).encode('utf-8')
+
+        hashed = _hashed_name(path, data)
+        target = os.path.join(output, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as handle:
+            handle.write(data)
+        if path.endswith(COMPRESSIBLE):
+            _compress(target, data)
+        manifest[path] = posixpath.join(BUILD_DIR, hashed)
+
+    with open(os.path.join(output, 'manifest.json'), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+
+    if clean:
+        keep = {os.path.join(static_folder, hashed) for hashed in manifest.values()}
+        keep |= {name + suffix for name in keep for _, suffix in ENCODINGS}
+        keep.add(os.path.join(output, 'manifest.json'))
+        for root, _, files in os.walk(output):
+            for name in files:
+                if os.path.join(root, name) not in keep:
+                    os.remove(os.path.join(root, name))
+    return manifest
+
+
+def vendor(static_folder, force=False):
+    """
+    Download the pinned third-party assets into static/vendor
+    Returns:
+        List of static paths downloaded
+    """
+    downloaded = []
+    for path, source in VENDOR_ASSETS.items():
+        target = os.path.join(static_folder, path)
+        if os.path.exists(target) and not force:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(source, timeout=30) as response:
+            data = response.read()
+        with open(target, 'wb') as handle:
+            handle.write(data)
+        downloaded.append(path)
+    return downloaded
+
+
+def load_manifest(app):
+    """
+    Read the build manifest and note which hashed files have precompressed
+    variants
+    Returns:
+        (manifest dict, dict of hashed path -> available encodings)
+    """
+    if not app.config['ASSETS_MANIFEST']:
+        return {}, {}
+    path = os.path.join(app.static_folder, app.config['ASSETS_MANIFEST'])
+    if not os.path.exists(path):
+        return {}, {}
+    with open(path) as handle:
+        manifest = json.load(handle)
+    variants = {}
+    for hashed in manifest.values():
+        available = [encoding for encoding, suffix in ENCODINGS
+                     if os.path.exists(os.path.join(app.static_folder, hashed + suffix))]
+        if available:
+            variants[hashed] = available
+    return manifest, variants
+
+
+def asset_url(filename):
+    """
+    URL of a static file for templates
+    Vendored assets that have not been downloaded yet fall back to their CDN
+    URL, so a fresh checkout still renders
+    """
+    state = current_app.extensions['assets']
+    if filename in VENDOR_ASSETS and filename not in state['manifest'] and filename not in state['vendored']:
+        return VENDOR_ASSETS[filename]
+    return url_for('static', filename=filename)
+
+
+def _fingerprint_url(endpoint, values):
+    """url_defaults hook: swap static file names for their hashed names"""
+    if endpoint != 'static':
+        return
+    manifest = current_app.extensions['assets']['manifest']
+    filename = values.get('filename')
+    if filename in manifest:
+        values['filename'] = manifest[filename]
+
+
+def send_static_file(filename):
+    """
+    Static view: precompressed variants for clients accepting them and
+    far-future immutable caching for hashed files
+    """
+    app = current_app
+    state = app.extensions['assets']
+    response = None
+    for encoding, suffix in ENCODINGS:
+        if encoding in state['variants'].get(filename, ()) and request.accept_encodings[encoding]:
+            response = send_from_directory(app.static_folder, filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.content_encoding = encoding
+            break
+    if response is None:
+        response = app.send_static_file(filename)
+
+    if filename in state['variants']:
+        response.vary.add('Accept-Encoding')
+    if filename in state['hashed']:
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['ASSETS_MAX_AGE']
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+
+def init_app(app):
+    """Load the asset manifest, install the static URL and view hooks and register the asset commands"""
+    app.config.setdefault('ASSETS_MANIFEST', posixpath.join(BUILD_DIR, 'manifest.json'))
+    app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+
+    manifest, variants = load_manifest(app)
+    app.extensions['assets'] = {
+        'manifest': manifest,
+        'hashed': set(manifest.values()),
+        'variants': variants,
+        'vendored': {path for path in VENDOR_ASSETS if os.path.exists(os.path.join(app.static_folder, path))},
+        # Static subdirectories build() skips; extensions storing files
+        # under static/ add theirs
+        'exclude': set(),
+    }
+    app.add_template_global(asset_url)
+    if manifest:
+        app.url_defaults(_fingerprint_url)
+        app.view_functions['static'] = send_static_file
+
+    @app.cli.command('vendor-assets')
+    @click.option('--force', is_flag=True, help='Download again even if the files exist.')
+    def vendor_assets_command(force):
+        """Download the pinned Bootstrap and Bootstrap Icons files into static/vendor."""
+        downloaded = vendor(app.static_folder, force)
+        print(f'{len(downloaded)} vendored assets downloaded, {len(VENDOR_ASSETS) - len(downloaded)} already present.')
+
+    @app.cli.command('build-assets')
+    @click.option('--clean', is_flag=True, help='Remove hashed files of earlier builds.')
+    def build_assets_command(clean):
+        """Minify, fingerprint and precompress static files into static/dist."""
+        manifest = build(app.static_folder, clean, app.extensions['assets']['exclude'])
+        print(f"{len(manifest)} assets built into {os.path.join(app.static_folder, BUILD_DIR)}"
+              f"{'' if brotli is not None else ' (install brotli for .br variants)'}.")
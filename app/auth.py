@@ -1,8 +1,13 @@
-from flask_login import LoginManager
-from app.models import User
+from flask import current_app
+from flask_login import LoginManager, UserMixin
+from app.models import db, User
+from app.cache import LRUCacheBackend
 
 """
 Authentication utilities for Flask-Login integration
+The user loader serves a read-only snapshot of the logged-in user from an
+in-process LRU cache, so authenticated requests do not query the user table.
+Code that changes a user loads the User row and invalidates the snapshot.
 """
 
 login_manager = LoginManager()
@@ -11,6 +16,75 @@ login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'warning'
 
 
+class UserSnapshot(UserMixin):
+    """
+    Immutable copy of the User columns that views and templates read
+    Load the User row to change a user or to follow its relationships
+    """
+    FIELDS = ('id', 'username', 'email', 'full_name', 'phone', 'address',
+              'city', 'postal_code', 'is_admin', 'created_at')
+
+    def __init__(self, user):
+        for name in self.FIELDS:
+            object.__setattr__(self, name, getattr(user, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserSnapshot is read-only; load the User to change it')
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+class IdentityCache:
+    """
+    Bounded LRU cache of UserSnapshot objects keyed by user ID
+    Each worker process keeps its own copy, so a change made in one process
+    reaches the others when their entry expires (USER_CACHE_TTL seconds);
+    USER_CACHE_TTL = 0 disables the cache
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        app.config.setdefault('USER_CACHE_MAX_ENTRIES', 4096)
+        ttl = app.config['USER_CACHE_TTL']
+        app.extensions['identity_cache'] = (
+            LRUCacheBackend(app.config['USER_CACHE_MAX_ENTRIES'], ttl) if ttl else None
+        )
+
+    @property
+    def backend(self):
+        return current_app.extensions['identity_cache']
+
+    def get(self, user_id):
+        """
+        Snapshot of a user, loaded from the database on a cache miss
+        Returns:
+            UserSnapshot or None if the user does not exist
+        """
+        backend = self.backend
+        snapshot = backend.get(user_id) if backend is not None else None
+        if snapshot is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            snapshot = UserSnapshot(user)
+            if backend is not None:
+                backend.set(user_id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Drop a user's snapshot after the user was changed or logged out"""
+        if self.backend is not None:
+            self.backend.delete(user_id)
+
+
+identity_cache = IdentityCache()
+
+
 @login_manager.user_loader
 def load_user(user_id):
     """
@@ -18,6 +92,6 @@ def load_user(user_id):
     Args:
         user_id: User ID from session
     Returns:
-        User object or None
+        UserSnapshot or None
     """
-    return User.query.get(int(user_id))
+    return identity_cache.get(int(user_id))
@@ -0,0 +1,204 @@
+import click
+from app.models import db, Book, Category, User
+from app.search import book_search
+from app.reviews import _ensure_rating_columns
+from app.inventory import _ensure_reorder_columns
+from app.covers import _ensure_cover_columns
+
+"""
+Database bootstrap
+Creates and upgrades the schema and loads the sample data. This runs once per
+deployment (`flask init-db`) instead of on every process start, so workers
+and test apps start without touching the database.
+"""
+
+
+def bootstrap(sample_data=True):
+    """
+    Create missing tables, indexes and columns, then optionally seed
+    Safe to run against an existing database
+    Args:
+        sample_data: Load the sample catalog and admin user into an empty database
+    Returns:
+        True if sample data was added
+    """
+    db.create_all()
+    # Columns added to tables that existed before them (create_all skips those)
+    _ensure_rating_columns()
+    _ensure_reorder_columns()
+    _ensure_cover_columns()
+    book_search.create_index()
+    return seed_sample_data() if sample_data else False
+
+
+def seed_sample_data():
+    """
+    Fill an empty database with sample categories, books and an admin user
+    Returns:
+        True if data was added, False if the database already had categories
+    """
+    # Check if data already exists
+    if Category.query.first() is not None:
+        return False
+    
+    # Create categories
+    categories = [
+        Category(name='Fiction', description='Fiction novels and stories'),
+        Category(name='Science Fiction', description='Science fiction and futuristic tales'),
+        Category(name='Mystery', description='Mystery and detective novels'),
+        Category(name='Self-Help', description='Self-help and personal development'),
+        Category(name='Technology', description='Technology and programming books'),
+    ]
+    
+    for cat in categories:
+        db.session.add(cat)
+    
+    db.session.commit()
+    
+    # Create sample books
+    sample_books = [
+        {
+            'title': 'The Great Gatsby',
+            'author': 'F. Scott Fitzgerald',
+            'isbn': '978-0743273565',
+            'description': 'A classic American novel set in the Jazz Age.',
+            'price': 12.99,
+            'stock': 50,
+            'category_id': 1,
+            'publisher': 'Scribner',
+            'publication_year': 1925,
+            'pages': 180,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/7725349-M.jpg'
+        },
+        {
+            'title': 'To Kill a Mockingbird',
+            'author': 'Harper Lee',
+            'isbn': '978-0061120084',
+            'description': 'A gripping tale of racial inequality and childhood innocence.',
+            'price': 14.99,
+            'stock': 45,
+            'category_id': 1,
+            'publisher': 'J.B. Lippincott',
+            'publication_year': 1960,
+            'pages': 324,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/7960105-M.jpg'
+        },
+        {
+            'title': '1984',
+            'author': 'George Orwell',
+            'isbn': '978-0451524935',
+            'description': 'A dystopian novel about totalitarianism.',
+            'price': 13.99,
+            'stock': 40,
+            'category_id': 2,
+            'publisher': 'Signet Classic',
+            'publication_year': 1949,
+            'pages': 328,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/7969049-M.jpg'
+        },
+        {
+            'title': 'The Hobbit',
+            'author': 'J.R.R. Tolkien',
+            'isbn': '978-0547928227',
+            'description': 'An adventure fantasy novel about a hobbit\'s unexpected journey.',
+            'price': 15.99,
+            'stock': 55,
+            'category_id': 2,
+            'publisher': 'Houghton Mifflin Harcourt',
+            'publication_year': 1937,
+            'pages': 310,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/8239898-M.jpg'
+        },
+        {
+            'title': 'The Girl with the Dragon Tattoo',
+            'author': 'Stieg Larsson',
+            'isbn': '978-0307454546',
+            'description': 'A thrilling mystery novel set in Sweden.',
+            'price': 16.99,
+            'stock': 35,
+            'category_id': 3,
+            'publisher': 'Knopf',
+            'publication_year': 2005,
+            'pages': 465,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/8239918-M.jpg'
+        },
+        {
+            'title': 'Atomic Habits',
+            'author': 'James Clear',
+            'isbn': '978-0735211292',
+            'description': 'Transform your habits and build systems for success.',
+            'price': 17.99,
+            'stock': 60,
+            'category_id': 4,
+            'publisher': 'Avery',
+            'publication_year': 2018,
+            'pages': 320,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/11292734-M.jpg'
+        },
+        {
+            'title': 'Clean Code',
+            'author': 'Robert C. Martin',
+            'isbn': '978-0132350884',
+            'description': 'A handbook for writing readable, maintainable code.',
+            'price': 32.99,
+            'stock': 30,
+            'category_id': 5,
+            'publisher': 'Prentice Hall',
+            'publication_year': 2008,
+            'pages': 464,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/7710078-M.jpg'
+        },
+        {
+            'title': 'Python Crash Course',
+            'author': 'Eric Matthes',
+            'isbn': '978-1593279288',
+            'description': 'A hands-on introduction to programming with Python.',
+            'price': 35.99,
+            'stock': 25,
+            'category_id': 5,
+            'publisher': 'No Starch Press',
+            'publication_year': 2015,
+            'pages': 544,
+            'language': 'English',
+            'cover_image': 'https://covers.openlibrary.org/b/id/10424263-M.jpg'
+        },
+    ]
+    
+    for book_data in sample_books:
+        book = Book(**book_data)
+        db.session.add(book)
+    
+    db.session.commit()
+    
+    # Create sample admin user
+    admin_user = User.query.filter_by(email='admin@bookstore.com').first()
+    if not admin_user:
+        admin = User(
+            username='admin',
+            email='admin@bookstore.com',
+            full_name='Admin User',
+            is_admin=True
+        )
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+    
+    return True
+
+
+def init_app(app):
+    """Register the `flask init-db` command"""
+
+    @app.cli.command('init-db')
+    @click.option('--no-sample-data', is_flag=True, help='Only create the schema.')
+    def init_db_command(no_sample_data):
+        """Create or upgrade the database schema and load sample data."""
+        seeded = bootstrap(sample_data=not no_sample_data)
+        print('Database initialized' + (' with sample data.' if seeded else '.'))
@@ -0,0 +1,379 @@
+import csv
+import io
+import json
+import math
+from datetime import date, datetime
+from itertools import islice
+import click
+from sqlalchemy import bindparam
+from app.models import db, Book, Category
+from app.stats import bump
+from app.cache import fragment_cache
+from app.inventory import refresh_reorder_levels
+
+"""
+Bulk catalog import and export
+Books are read from CSV or JSON Lines one chunk at a time, validated, and
+upserted by ISBN with one SELECT, one executemany INSERT and batched UPDATEs
+per chunk, each chunk in its own transaction. Exports stream the catalog in
+the same formats with keyset batches, so memory stays bounded for any
+catalog size.
+"""
+
+FORMATS = ('csv', 'jsonl')
+
+# Columns in import/export files; books reference categories by name
+EXPORT_FIELDS = ['isbn', 'title', 'author', 'description', 'price', 'stock', 'category',
+                 'cover_image', 'publisher', 'publication_year', 'pages', 'language',
+                 'reorder_threshold']
+
+REQUIRED_FOR_NEW = ('title', 'author', 'price', 'category_id')
+
+# Defaulted for new books; a blank cell leaves an existing book's value as is
+DEFAULTED = ('stock', 'language')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Errors kept in an ImportReport; further errors are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def _text(value):
+    value = str(value).strip() if value is not None else ''
+    return value or None
+
+
+def _number(kind, minimum=None):
+    def convert(value):
+        value = _text(value)
+        if value is None:
+            return None
+        number = kind(value)
+        if not math.isfinite(number):
+            raise ValueError('must be a finite number')
+        if minimum is not None and number < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        return number
+    return convert
+
+
+CONVERTERS = {
+    'title': _text,
+    'author': _text,
+    'description': _text,
+    'price': _number(float, 0),
+    'stock': _number(int, 0),
+    'cover_image': _text,
+    'publisher': _text,
+    'publication_year': _number(int),
+    'pages': _number(int, 0),
+    'language': _text,
+    'reorder_threshold': _number(int, 0),
+}
+
+
+class ImportReport:
+    """
+    Outcome of an import
+    Attributes:
+        inserted: Number of new books
+        updated: Number of existing books (matched by ISBN) updated
+        errors: List of (line number, message) for rejected rows, at most
+                MAX_REPORTED_ERRORS entries
+        error_count: Total number of rejected rows
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return f'{self.inserted} inserted, {self.updated} updated, {self.error_count} rejected'
+
+
+def detect_format(filename, default='csv'):
+    """Guess the file format from its extension"""
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """
+    Iterate over the records of a text stream
+    Args:
+        stream: Text file object
+        fmt: 'csv' (with a header row) or 'jsonl'
+    Yields:
+        (line number, dict) for every record; a dict is None when the line
+        could not be parsed
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def _parse(record, categories):
+    """
+    Convert one raw record to Book column values
+    Only keys present in the record are returned, so an update never blanks
+    columns the file does not mention
+    Raises:
+        ValueError: If the record is invalid
+    """
+    values = {}
+    isbn = _text(record.get('isbn'))
+    if isbn is None:
+        raise ValueError('isbn is required')
+    values['isbn'] = isbn
+
+    for name, convert in CONVERTERS.items():
+        if name in record:
+            try:
+                values[name] = convert(record[name])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'invalid {name}: {e}')
+
+    category = _text(record.get('category'))
+    if category is not None:
+        if category.lower() not in categories:
+            raise ValueError(f'unknown category {category!r}')
+        values['category_id'] = categories[category.lower()]
+    elif _text(record.get('category_id')) is not None:
+        try:
+            category_id = int(record['category_id'])
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError('invalid category_id')
+        if category_id not in categories.values():
+            raise ValueError(f'unknown category_id {category_id}')
+        values['category_id'] = category_id
+
+    for name in ('title', 'author', 'price'):
+        if name in values and values[name] is None:
+            raise ValueError(f'{name} cannot be empty')
+    return values
+
+
+def _write_chunk(chunk, report):
+    """Upsert one chunk of (line number, values) pairs and commit it"""
+    # Later rows for the same ISBN win
+    rows = {}
+    for line_number, values in chunk:
+        rows[values['isbn']] = (line_number, values)
+
+    existing = dict(db.session.query(Book.isbn, Book.id).filter(Book.isbn.in_(rows)).all())
+    now = datetime.utcnow()
+
+    new_books = []
+    updates = {}
+    for isbn, (line_number, values) in rows.items():
+        if isbn in existing:
+            values = {f'b_{name}': value for name, value in values.items()
+                      if name != 'isbn' and not (name in DEFAULTED and value is None)}
+            values.update(b_id=existing[isbn], b_updated_at=now)
+            # executemany needs the same keys in every parameter set
+            updates.setdefault(frozenset(values), []).append(values)
+            continue
+
+        missing = [name for name in REQUIRED_FOR_NEW if values.get(name) is None]
+        if missing:
+            report.error(line_number, f"new book is missing {', '.join(missing)}")
+            continue
+        new_books.append({
+            'isbn': isbn,
+            'title': values['title'],
+            'author': values['author'],
+            'description': values.get('description'),
+            'price': values['price'],
+            'stock': values.get('stock') or 0,
+            'category_id': values['category_id'],
+            'cover_image': values.get('cover_image'),
+            'publisher': values.get('publisher'),
+            'publication_year': values.get('publication_year'),
+            'pages': values.get('pages'),
+            'language': values.get('language') or 'English',
+            'reorder_threshold': values.get('reorder_threshold'),
+            'created_at': now,
+            'updated_at': now,
+        })
+
+    try:
+        if new_books:
+            db.session.execute(Book.__table__.insert(), new_books)
+            bump(total_books=len(new_books))
+        for keys, group in updates.items():
+            db.session.execute(
+                Book.__table__.update()
+                .where(Book.id == bindparam('b_id'))
+                .values({key[2:]: bindparam(key) for key in keys if key != 'b_id'}),
+                group
+            )
+        if new_books or updates:
+            refresh_reorder_levels(Book.isbn.in_(rows))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for line_number, _ in rows.values():
+            report.error(line_number, f'chunk rejected by the database: {e.__class__.__name__}')
+        return
+
+    report.inserted += len(new_books)
+    report.updated += sum(len(group) for group in updates.values())
+
+
+def import_books(stream, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import books from a CSV or JSON Lines stream
+    Rows are upserted by ISBN: unknown ISBNs are inserted (title, author,
+    price and category are then required), known ones have the columns
+    present in the file updated. Each chunk is committed on its own, so a
+    failure only loses that chunk.
+    Args:
+        stream: Text file object
+        fmt: 'csv' or 'jsonl'
+        chunk_size: Rows per transaction
+    Returns:
+        ImportReport
+    """
+    categories = {name.lower(): category_id
+                  for category_id, name in db.session.query(Category.id, Category.name).all()}
+    report = ImportReport()
+    records = read_rows(stream, fmt)
+
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            break
+        chunk = []
+        for line_number, record in batch:
+            if record is None:
+                report.error(line_number, 'could not parse line')
+                continue
+            try:
+                chunk.append((line_number, _parse(record, categories)))
+            except ValueError as e:
+                report.error(line_number, str(e))
+        if chunk:
+            _write_chunk(chunk, report)
+
+    if report.inserted or report.updated:
+        fragment_cache.invalidate('catalog')
+    return report
+
+
+def iter_books(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Iterate over every book as a dict of EXPORT_FIELDS
+    Reads id-ordered keyset batches of plain rows, never the whole table
+    """
+    columns = [getattr(Book, name) for name in EXPORT_FIELDS if name != 'category']
+    last_id = 0
+    while True:
+        rows = (db.session.query(Book.id, Category.name.label('category'), *columns)
+                .join(Category, Book.category_id == Category.id)
+                .filter(Book.id > last_id)
+                .order_by(Book.id)
+                .limit(chunk_size)
+                .all())
+        if not rows:
+            return
+        for row in rows:
+            yield {name: getattr(row, name) for name in EXPORT_FIELDS}
+        last_id = rows[-1].id
+
+
+def encode_records(records, fieldnames, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Encode dicts as CSV or JSON Lines text, a chunk of records at a time
+    Args:
+        records: Iterable of dicts
+        fieldnames: Keys to write, in column order
+        fmt: 'csv' (with a header row) or 'jsonl'
+        chunk_size: Records per yielded string
+    Yields:
+        Text chunks ready to be written to a file or HTTP response
+    """
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+
+    for count, record in enumerate(records, start=1):
+        record = {name: value.isoformat() if isinstance(value, (date, datetime)) else value
+                  for name, value in record.items()}
+        if writer is not None:
+            writer.writerow(record)
+        else:
+            buffer.write(json.dumps({name: record.get(name) for name in fieldnames},
+                                    separators=(',', ':'), ensure_ascii=False))
+            buffer.write('\n')
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_books(fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream the catalog as CSV or JSON Lines
+    Args:
+        fmt: 'csv' or 'jsonl'
+        chunk_size: Books per database batch (and per yielded string)
+    Yields:
+        Text chunks ready to be written to a file or HTTP response
+    """
+    return encode_records(iter_books(chunk_size), EXPORT_FIELDS, fmt, chunk_size)
+
+
+def init_app(app):
+    """Register the `flask import-books` and `flask export-books` commands"""
+
+    @app.cli.command('import-books')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+    @click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True)
+    def import_books_command(path, fmt, chunk_size):
+        """Upsert books by ISBN from a CSV or JSON Lines file."""
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            report = import_books(stream, fmt or detect_format(path), chunk_size)
+        for line_number, message in report.errors:
+            print(f'line {line_number}: {message}')
+        print(f'Import finished: {report}.')
+
+    @app.cli.command('export-books')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True), required=False)
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+    def export_books_command(path, fmt):
+        """Write the catalog to a CSV or JSON Lines file (stdout without a path)."""
+        fmt = fmt or detect_format(path)
+        if path is None:
+            for text in export_books(fmt):
+                click.echo(text, nl=False)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            for text in export_books(fmt):
+                stream.write(text)
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import pickle
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g
+from markupsafe import Markup
+
+"""
+Fragment caching for public catalog pages
+Rendered HTML fragments (book grids, category lists, book detail panels) are
+stored in a pluggable backend and reused until their TTL runs out or their
+namespace is invalidated by an admin change
+"""
+
+
+class NullCacheBackend:
+    """Backend that never stores anything (caching disabled)"""
+    name = 'null'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCacheBackend:
+    """
+    In-process LRU cache with a size bound and per-entry TTL
+    Each worker process keeps its own copy
+    """
+    name = 'lru'
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCacheBackend:
+    """
+    File-system cache shared by every worker process on a host
+    One pickle file per key, written atomically; expired files are pruned
+    and the oldest removed once the directory grows past max_entries
+    """
+    name = 'file'
+
+    prune_interval = 100
+
+    def __init__(self, directory, max_entries=10000, default_ttl=300):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _prune(self):
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as f:
+                    expires_at, _ = pickle.load(f)
+                mtime = os.path.getmtime(path)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            if expires_at is not None and expires_at < now:
+                os.remove(path)
+            else:
+                entries.append((mtime, path))
+
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class FragmentCache:
+    """
+    Fragment cache extension
+    Configured by CACHE_BACKEND ('lru', 'file' or 'null'), CACHE_DEFAULT_TTL,
+    CACHE_MAX_ENTRIES and CACHE_DIR. Templates use it as
+
+        {% call cache_fragment('catalog', 'home-categories') %}...{% endcall %}
+
+    Keys live in namespaces; invalidate(namespace) drops every fragment in it
+    by moving the namespace to a new generation
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'lru')
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'lru':
+            instance = LRUCacheBackend(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_DEFAULT_TTL'])
+        elif backend == 'file':
+            instance = FileCacheBackend(app.config['CACHE_DIR'], app.config['CACHE_MAX_ENTRIES'],
+                                        app.config['CACHE_DEFAULT_TTL'])
+        else:
+            instance = NullCacheBackend()
+        app.extensions['fragment_cache'] = instance
+
+        app.jinja_env.globals['cache_fragment'] = self.fragment
+
+        @app.cli.command('clear-cache')
+        def clear_cache():
+            """Drop every cached fragment."""
+            self.backend.clear()
+            print('Fragment cache cleared.')
+
+    @property
+    def backend(self):
+        return current_app.extensions['fragment_cache']
+
+    def _generation(self, namespace):
+        """Current generation token of a namespace (memoized per request)"""
+        generations = g.setdefault('cache_generations', {})
+        if namespace not in generations:
+            key = f'generation:{namespace}'
+            generation = self.backend.get(key)
+            if generation is None:
+                generation = secrets.token_hex(4)
+                self.backend.set(key, generation, ttl=0)
+            generations[namespace] = generation
+        return generations[namespace]
+
+    def key(self, namespace, *parts):
+        """
+        Full cache key for a fragment
+        The parts are hashed as one JSON list, so values containing ':' or
+        None and the string 'None' can never produce the same key
+        """
+        digest = hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+        return f'{namespace}:{self._generation(namespace)}:{digest}'
+
+    def fragment(self, namespace, *parts, ttl=None, caller=None):
+        """
+        Return a cached fragment, rendering it with caller() on a miss
+        Args:
+            namespace: Invalidation namespace (e.g. 'catalog')
+            *parts: Values identifying the fragment (page name, query args...)
+            ttl: Seconds to keep the fragment (defaults to CACHE_DEFAULT_TTL)
+            caller: Renders the fragment (supplied by Jinja's call block)
+        """
+        key = self.key(namespace, *parts)
+        html = self.backend.get(key)
+        if html is None:
+            html = str(caller())
+            self.backend.set(key, html, ttl)
+        return Markup(html)
+
+    def invalidate(self, namespace):
+        """Drop every fragment in a namespace (all worker processes for shared backends)"""
+        self.backend.set(f'generation:{namespace}', secrets.token_hex(4), ttl=0)
+        g.pop('cache_generations', None)
+
+
+fragment_cache = FragmentCache()
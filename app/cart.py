@@ -0,0 +1,346 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app, session
+from flask_login import current_user, user_logged_in
+from sqlalchemy import bindparam, case, delete, select, update
+from app.models import db, Book, CartItem
+from app.analytics import UPSERT_DIALECTS
+
+"""
+Shopping cart
+Server-side cart storage (SQL table or in-process store) keyed by a short cart
+ID, and the pricing service that resolves every line of a cart with a single
+query; shared by the cart page, checkout and any cart API
+"""
+
+
+class PricedCart:
+    """
+    Result of pricing a cart
+    Attributes:
+        lines: List of dicts with 'book', 'quantity' and 'item_total',
+               in cart order
+        total_price: Sum of all line totals
+        missing_ids: Book IDs in the cart that no longer exist
+    """
+
+    def __init__(self, lines, total_price, missing_ids):
+        self.lines = lines
+        self.total_price = total_price
+        self.missing_ids = missing_ids
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+
+def price_cart(cart):
+    """
+    Price a cart with one IN query for all of its books
+    Args:
+        cart: Mapping of book ID (int or str) to quantity
+    Returns:
+        PricedCart instance
+    """
+    quantities = {}
+    for book_id, quantity in (cart or {}).items():
+        try:
+            quantities[int(book_id)] = int(quantity)
+        except (TypeError, ValueError):
+            continue
+
+    if not quantities:
+        return PricedCart([], 0, [])
+
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(quantities)).all()}
+
+    lines = []
+    total_price = 0
+    missing_ids = []
+    for book_id, quantity in quantities.items():
+        book = books.get(book_id)
+        if book is None:
+            missing_ids.append(book_id)
+            continue
+        item_total = book.price * quantity
+        lines.append({
+            'book': book,
+            'quantity': quantity,
+            'item_total': item_total
+        })
+        total_price += item_total
+
+    return PricedCart(lines, total_price, missing_ids)
+
+
+class SQLCartStore:
+    """
+    Cart store backed by the cart_item table
+    Shared by every worker process. Lines idle for longer than the TTL are
+    treated as gone (never returned, and re-adding a book starts from 0);
+    purge_expired() (`flask purge-carts`) deletes their rows
+    """
+    name = 'sql'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def get(self, cart_id):
+        rows = (db.session.query(CartItem.book_id, CartItem.quantity)
+                .filter(CartItem.cart_id == cart_id, CartItem.updated_at >= datetime.utcnow() - self.ttl)
+                .all())
+        return {row.book_id: row.quantity for row in rows}
+
+    def add(self, cart_id, book_id, quantity=1):
+        now = datetime.utcnow()
+        # An expired line that was not purged yet counts as empty
+        current = case((CartItem.__table__.c.updated_at < now - self.ttl, 0),
+                       else_=CartItem.__table__.c.quantity)
+        dialect_insert = UPSERT_DIALECTS.get(db.engine.dialect.name)
+        if dialect_insert is not None:
+            # One statement, so concurrent adds of the same book cannot both
+            # try to insert the line
+            statement = dialect_insert(CartItem.__table__).values(
+                cart_id=cart_id, book_id=book_id, quantity=quantity, updated_at=now
+            )
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['cart_id', 'book_id'],
+                set_={'quantity': current + statement.excluded.quantity,
+                      'updated_at': statement.excluded.updated_at}
+            ))
+            db.session.commit()
+            return
+
+        updated = db.session.execute(
+            update(CartItem)
+            .where(CartItem.cart_id == cart_id, CartItem.book_id == book_id)
+            .values(quantity=current + quantity, updated_at=now)
+        ).rowcount
+        if not updated:
+            db.session.add(CartItem(cart_id=cart_id, book_id=book_id, quantity=quantity))
+        db.session.commit()
+
+    def set_quantities(self, cart_id, quantities):
+        # Expired rows included: they are overwritten rather than inserted again
+        existing = set(db.session.scalars(select(CartItem.book_id).where(CartItem.cart_id == cart_id)))
+        now = datetime.utcnow()
+        removed = [book_id for book_id, quantity in quantities.items() if quantity <= 0]
+        changed = [
+            {'b_cart_id': cart_id, 'b_book_id': book_id, 'b_quantity': quantity, 'b_updated_at': now}
+            for book_id, quantity in quantities.items() if quantity > 0 and book_id in existing
+        ]
+        added = [
+            {'cart_id': cart_id, 'book_id': book_id, 'quantity': quantity, 'updated_at': now}
+            for book_id, quantity in quantities.items() if quantity > 0 and book_id not in existing
+        ]
+
+        if removed:
+            db.session.execute(
+                delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.book_id.in_(removed))
+            )
+        if changed:
+            db.session.execute(
+                CartItem.__table__.update()
+                .where(CartItem.cart_id == bindparam('b_cart_id'),
+                       CartItem.book_id == bindparam('b_book_id'))
+                .values(quantity=bindparam('b_quantity'), updated_at=bindparam('b_updated_at')),
+                changed
+            )
+        if added:
+            db.session.execute(CartItem.__table__.insert(), added)
+        db.session.commit()
+
+    def remove(self, cart_id, book_id):
+        db.session.execute(delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.book_id == book_id))
+        db.session.commit()
+
+    def clear(self, cart_id):
+        db.session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        db.session.commit()
+
+    def purge_expired(self):
+        cutoff = datetime.utcnow() - self.ttl
+        removed = db.session.execute(delete(CartItem).where(CartItem.updated_at < cutoff)).rowcount
+        db.session.commit()
+        return removed
+
+
+class MemoryCartStore:
+    """
+    In-process cart store with TTL eviction
+    Fast, but each worker process has its own carts, so it is only suitable
+    for single-process deployments, development and tests
+    """
+    name = 'memory'
+
+    def __init__(self, ttl, max_carts=10000):
+        self.ttl = ttl.total_seconds()
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cart_id):
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._carts.pop(cart_id, None)
+                return {}
+            return dict(entry[1])
+
+    def _update(self, cart_id, change):
+        with self._lock:
+            now = time.monotonic()
+            entry = self._carts.pop(cart_id, None)
+            lines = entry[1] if entry is not None and entry[0] >= now else {}
+            change(lines)
+            if lines:
+                self._carts[cart_id] = (now + self.ttl, lines)
+            self._evict(now)
+
+    def _evict(self, now):
+        # Carts are kept in least-recently-updated order, so expired carts
+        # and carts over the size bound are always at the front
+        while self._carts:
+            cart_id, (expires_at, _) = next(iter(self._carts.items()))
+            if expires_at >= now and len(self._carts) <= self.max_carts:
+                break
+            del self._carts[cart_id]
+
+    def add(self, cart_id, book_id, quantity=1):
+        def change(lines):
+            lines[book_id] = lines.get(book_id, 0) + quantity
+        self._update(cart_id, change)
+
+    def set_quantities(self, cart_id, quantities):
+        def change(lines):
+            for book_id, quantity in quantities.items():
+                if quantity > 0:
+                    lines[book_id] = quantity
+                else:
+                    lines.pop(book_id, None)
+        self._update(cart_id, change)
+
+    def remove(self, cart_id, book_id):
+        self._update(cart_id, lambda lines: lines.pop(book_id, None))
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def purge_expired(self):
+        with self._lock:
+            before = len(self._carts)
+            self._evict(time.monotonic())
+            return before - len(self._carts)
+
+
+CART_BACKENDS = {
+    'sql': SQLCartStore,
+    'memory': MemoryCartStore,
+}
+
+
+class CartStore:
+    """
+    Server-side cart extension
+    Only a short cart ID travels in the session cookie; cart lines live in the
+    backend chosen by CART_BACKEND. Anonymous carts are merged into the user's
+    cart when they log in.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CART_BACKEND', 'sql')
+        app.config.setdefault('CART_TTL', timedelta(days=30))
+        app.extensions['cart_store'] = CART_BACKENDS[app.config['CART_BACKEND']](app.config['CART_TTL'])
+
+        user_logged_in.connect(self._merge_on_login, app)
+
+        @app.cli.command('purge-carts')
+        def purge_carts():
+            """Remove carts that have been idle for longer than CART_TTL."""
+            print(f'Removed {self.backend.purge_expired()} expired cart entries.')
+
+    @property
+    def backend(self):
+        return current_app.extensions['cart_store']
+
+    def cart_id(self, create=False):
+        """
+        Cart ID for the current visitor
+        Args:
+            create: Assign a new anonymous cart ID if the visitor has none
+        Returns:
+            Cart ID string, or None for an anonymous visitor without a cart
+        """
+        if current_user.is_authenticated:
+            return f'u{current_user.id}'
+        if 'cart_id' not in session and create:
+            session['cart_id'] = secrets.token_urlsafe(12)
+        return session.get('cart_id')
+
+    def get(self):
+        """Current visitor's cart as a mapping of book ID to quantity"""
+        cart_id = self.cart_id()
+        return self.backend.get(cart_id) if cart_id else {}
+
+    def add(self, book_id, quantity=1):
+        """Add quantity copies of a book to the current cart"""
+        self.backend.add(self.cart_id(create=True), book_id, quantity)
+
+    def set_quantities(self, quantities):
+        """
+        Bulk update line quantities; lines set to 0 or less are removed
+        Books that are not in the cart are ignored (the IDs come from the
+        posted form)
+        Args:
+            quantities: Mapping of book ID to new quantity
+        """
+        cart_id = self.cart_id()
+        if not cart_id or not quantities:
+            return
+        lines = self.backend.get(cart_id)
+        quantities = {book_id: quantity for book_id, quantity in quantities.items() if book_id in lines}
+        if quantities:
+            self.backend.set_quantities(cart_id, quantities)
+
+    def remove(self, book_id):
+        """Remove a book from the current cart"""
+        cart_id = self.cart_id()
+        if cart_id:
+            self.backend.remove(cart_id, book_id)
+
+    def clear(self, cart_id=None):
+        """
+        Empty the current cart
+        Args:
+            cart_id: Cart to clear, when it was looked up earlier (e.g. before
+                     a commit expired current_user)
+        """
+        cart_id = cart_id or self.cart_id()
+        if cart_id:
+            self.backend.clear(cart_id)
+
+    def _merge_on_login(self, app, user):
+        anonymous_id = session.pop('cart_id', None)
+        if not anonymous_id:
+            return
+        anonymous = self.backend.get(anonymous_id)
+        if anonymous:
+            user_cart_id = f'u{user.id}'
+            merged = self.backend.get(user_cart_id)
+            for book_id, quantity in anonymous.items():
+                merged[book_id] = merged.get(book_id, 0) + quantity
+            self.backend.set_quantities(user_cart_id, merged)
+            self.backend.clear(anonymous_id)
+
+
+cart_store = CartStore()
@@ -0,0 +1,338 @@
+import hashlib
+import io
+import os
+import time
+import click
+from flask import current_app, send_from_directory, url_for
+from PIL import Image, ImageOps
+from sqlalchemy import inspect, select, text, update
+from app.models import db, Book, CoverImage
+from app.jobs import job_queue
+from app.cache import fragment_cache
+
+"""
+Cover images
+Covers are uploaded from the admin book forms or imported from a directory
+(`flask import-covers`), stored once per distinct content under
+UPLOAD_FOLDER/covers/<hash prefix>/<sha256>.<ext> and turned into fixed-size
+JPEG and WebP thumbnails (COVER_WIDTHS, 2:3) by the process_cover job. File
+names contain the content hash, so /covers/ responses are cached as
+immutable. Templates render them with the book_cover macro
+(macros/covers.html), which emits srcset/sizes and falls back to the
+external cover_image URL. Originals are written before the upload's
+transaction commits; `flask purge-covers` removes the files a rolled-back
+upload left without a cover_image row.
+"""
+
+# Pillow format -> stored extension
+ACCEPTED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+# Thumbnail formats: extension -> (Pillow format, save options)
+THUMBNAIL_FORMATS = {
+    'jpg': ('JPEG', {'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'method': 6}),
+}
+
+COVER_RATIO = 1.5  # height / width of a book cover
+
+# Files younger than this are never purged: their upload may not have
+# committed yet
+ORPHAN_MIN_AGE = 3600  # seconds
+
+
+class InvalidCover(Exception):
+    """Raised when uploaded data is not a usable image"""
+
+
+def upload_folder(app):
+    """Absolute UPLOAD_FOLDER"""
+    folder = app.config['UPLOAD_FOLDER']
+    if not os.path.isabs(folder):
+        # Relative to the project root, like the default 'app/static/uploads'
+        folder = os.path.join(os.path.dirname(app.root_path), folder)
+    return os.path.abspath(folder)
+
+
+def cover_folder():
+    """Absolute directory the covers are stored in"""
+    return os.path.join(upload_folder(current_app), 'covers')
+
+
+def original_name(key, extension):
+    """Path of an original cover, relative to cover_folder()"""
+    return f'{key[:2]}/{key}.{extension}'
+
+
+def thumbnail_name(key, width, extension):
+    """Path of a thumbnail, relative to cover_folder()"""
+    return f'{key[:2]}/{key}-{width}.{extension}'
+
+
+def _write(path, data):
+    """Write a file atomically (readers never see a partial image)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'wb') as handle:
+        handle.write(data)
+    os.replace(partial, path)
+
+
+def ingest(data):
+    """
+    Store a cover image, reusing the stored copy of identical content
+    New covers, and known ones whose processing failed, get a process_cover
+    job in the current transaction; the caller commits
+    Args:
+        data: Image file contents
+    Returns:
+        CoverImage instance
+    Raises:
+        InvalidCover: If the data is not a JPEG, PNG, GIF or WebP image
+    """
+    key = hashlib.sha256(data).hexdigest()
+    cover = CoverImage.query.filter_by(key=key).first()
+    if cover is not None:
+        if cover.status == 'failed':
+            # Uploading the image again retries it (the original may have
+            # been unreadable on disk rather than corrupt)
+            _write(os.path.join(cover_folder(), original_name(key, cover.extension)), data)
+            cover.status = 'pending'
+            job_queue.enqueue('process_cover', cover_id=cover.id)
+        return cover
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except Exception:
+        raise InvalidCover('The cover must be a JPEG, PNG, GIF or WebP image.')
+    if image_format not in ACCEPTED_FORMATS:
+        raise InvalidCover('The cover must be a JPEG, PNG, GIF or WebP image.')
+
+    extension = ACCEPTED_FORMATS[image_format]
+    path = os.path.join(cover_folder(), original_name(key, extension))
+    if os.path.exists(path):
+        # Left by a rolled-back upload; fresh again, so purge_orphans skips it
+        os.utime(path)
+    else:
+        _write(path, data)
+
+    cover = CoverImage(key=key, extension=extension, width=width, height=height,
+                       size=len(data), status='pending')
+    db.session.add(cover)
+    db.session.flush()
+    job_queue.enqueue('process_cover', cover_id=cover.id)
+    return cover
+
+
+def assign_cover(book, cover):
+    """
+    Use a stored cover for a book
+    The book shows it at once if its thumbnails exist, otherwise once
+    process_cover has made them
+    """
+    book.cover_id = cover.id
+    book.cover_key = cover.key if cover.status == 'ready' else None
+
+
+def render_thumbnails(cover):
+    """
+    Generate every thumbnail of a cover from its original
+    Returns:
+        List of written paths, relative to cover_folder()
+    """
+    config = current_app.config
+    folder = cover_folder()
+    quality = {'jpg': config['COVER_JPEG_QUALITY'], 'webp': config['COVER_WEBP_QUALITY']}
+
+    with Image.open(os.path.join(folder, original_name(cover.key, cover.extension))) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode != 'RGB':
+            # Transparent areas become white rather than black in JPEG
+            background = Image.new('RGB', image.size, 'white')
+            converted = image.convert('RGBA')
+            background.paste(converted, mask=converted.getchannel('A'))
+            image = background
+
+        written = []
+        for width in config['COVER_WIDTHS']:
+            thumbnail = ImageOps.fit(image, (width, round(width * COVER_RATIO)), Image.Resampling.LANCZOS)
+            for extension, (image_format, options) in THUMBNAIL_FORMATS.items():
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, image_format, quality=quality[extension], **options)
+                name = thumbnail_name(cover.key, width, extension)
+                _write(os.path.join(folder, name), buffer.getvalue())
+                written.append(name)
+    return written
+
+
+@job_queue.task('process_cover', max_attempts=3)
+def process_cover(cover_id):
+    """Make a cover's thumbnails, then show it on every book using it"""
+    cover = db.session.get(CoverImage, cover_id)
+    if cover is None or cover.status == 'ready':
+        return
+    try:
+        render_thumbnails(cover)
+    except (OSError, Image.DecompressionBombError):
+        # Unreadable original: retrying will not help
+        current_app.logger.exception('Cover %s could not be processed', cover.key)
+        cover.status = 'failed'
+        db.session.commit()
+        return
+
+    cover.status = 'ready'
+    db.session.execute(
+        update(Book).where(Book.cover_id == cover.id).values(cover_key=cover.key)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    fragment_cache.invalidate('catalog')
+
+
+def cover_url(key, width, extension='jpg'):
+    """URL of one thumbnail of a cover"""
+    return url_for('cover_file', filename=thumbnail_name(key, width, extension))
+
+
+def cover_srcset(key, extension='jpg'):
+    """srcset attribute value listing every thumbnail width of a cover"""
+    return ', '.join(f'{cover_url(key, width, extension)} {width}w'
+                     for width in current_app.config['COVER_WIDTHS'])
+
+
+def send_cover(filename):
+    """Serve a cover file; names contain the content hash, so they never change"""
+    response = send_from_directory(cover_folder(), filename, max_age=current_app.config['COVER_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def import_covers(directory, overwrite=False, batch_size=100):
+    """
+    Import cover files named after book ISBNs (e.g. 978-0743273565.jpg)
+    Dashes and spaces in names and ISBNs are ignored when matching
+    Args:
+        directory: Directory with the image files
+        overwrite: Replace covers books already have
+        batch_size: Books per commit
+    Returns:
+        Dict with 'imported', 'unmatched', 'skipped' and 'invalid' counts
+    """
+    def normalize(isbn):
+        return (isbn or '').replace('-', '').replace(' ', '').upper()
+
+    books = {normalize(isbn): (book_id, cover_id)
+             for book_id, isbn, cover_id in db.session.execute(select(Book.id, Book.isbn, Book.cover_id))}
+    counts = {'imported': 0, 'unmatched': 0, 'skipped': 0, 'invalid': 0}
+    pending = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path) or name.startswith('.'):
+            continue
+        match = books.get(normalize(os.path.splitext(name)[0]))
+        if match is None:
+            counts['unmatched'] += 1
+            continue
+        book_id, cover_id = match
+        if cover_id is not None and not overwrite:
+            counts['skipped'] += 1
+            continue
+
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        try:
+            cover = ingest(data)
+        except InvalidCover:
+            counts['invalid'] += 1
+            continue
+        assign_cover(db.session.get(Book, book_id), cover)
+        counts['imported'] += 1
+        pending += 1
+        if pending >= batch_size:
+            db.session.commit()
+            pending = 0
+    db.session.commit()
+    fragment_cache.invalidate('catalog')
+    return counts
+
+
+def purge_orphans(min_age=ORPHAN_MIN_AGE):
+    """
+    Remove cover files that no cover_image row refers to
+    Args:
+        min_age: Only files last modified at least this many seconds ago
+    Returns:
+        Number of files removed
+    """
+    folder = cover_folder()
+    cutoff = time.time() - min_age
+    candidates = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) <= cutoff:
+                # <key>.<ext>, <key>-<width>.<ext> or a partial <key>...tmp
+                candidates.setdefault(name[:64], []).append(path)
+
+    keys = list(candidates)
+    known = set()
+    for start in range(0, len(keys), 500):
+        known.update(db.session.scalars(select(CoverImage.key).where(CoverImage.key.in_(keys[start:start + 500]))))
+
+    removed = 0
+    for key, paths in candidates.items():
+        if key in known:
+            continue
+        for path in paths:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _ensure_cover_columns():
+    """Add the cover columns and index to a book table created before they existed"""
+    existing = {c['name'] for c in inspect(db.engine).get_columns('book')}
+    if 'cover_id' not in existing:
+        db.session.execute(text('ALTER TABLE book ADD COLUMN cover_id INTEGER REFERENCES cover_image (id)'))
+    if 'cover_key' not in existing:
+        db.session.execute(text('ALTER TABLE book ADD COLUMN cover_key VARCHAR(64)'))
+    db.session.commit()
+    for index in Book.__table__.indexes:
+        if index.name == 'ix_book_cover_id':
+            index.create(db.engine, checkfirst=True)
+
+
+def init_app(app):
+    """Register the cover route, template helpers and the `flask import-covers` / `purge-covers` commands"""
+    app.config.setdefault('COVER_WIDTHS', (160, 320, 640))
+    app.config.setdefault('COVER_JPEG_QUALITY', 85)
+    app.config.setdefault('COVER_WEBP_QUALITY', 80)
+    app.config.setdefault('COVER_MAX_AGE', 365 * 24 * 3600)
+
+    # Uploads under static/ are served by /covers/, not built as assets
+    uploads = os.path.relpath(upload_folder(app), os.path.abspath(app.static_folder))
+    if not uploads.startswith(os.pardir) and 'assets' in app.extensions:
+        app.extensions['assets']['exclude'].add(uploads.replace(os.sep, '/'))
+
+    app.add_url_rule('/covers/<path:filename>', 'cover_file', send_cover)
+    app.add_template_global(cover_url)
+    app.add_template_global(cover_srcset)
+
+    @app.cli.command('import-covers')
+    @click.argument('directory', type=click.Path(exists=True, file_okay=False))
+    @click.option('--overwrite', is_flag=True, help='Replace covers books already have.')
+    def import_covers_command(directory, overwrite):
+        """Import cover images named after book ISBNs from a directory."""
+        counts = import_covers(directory, overwrite)
+        print(f"{counts['imported']} covers imported ({counts['skipped']} books already had one, "
+              f"{counts['unmatched']} files matched no ISBN, {counts['invalid']} not images); "
+              f"thumbnails are made by the job workers (`flask run-jobs`).")
+
+    @app.cli.command('purge-covers')
+    @click.option('--min-age', default=ORPHAN_MIN_AGE, show_default=True,
+                  help='Seconds a file must be unchanged before it can be removed.')
+    def purge_covers_command(min_age):
+        """Remove cover files left behind by uploads that were rolled back."""
+        print(f'Removed {purge_orphans(min_age)} orphaned cover files.')
@@ -0,0 +1,95 @@
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from app.models import db
+from app.replicas import REPLICA_BIND_PREFIX
+
+"""
+Database engine profiles
+Turns the DB_POOL_* and SQLITE_PRAGMAS settings of the active config class
+into engine options: connection pool sizing, recycling and pre-ping for
+server databases, and PRAGMAs run on every new SQLite connection (WAL
+journal, relaxed fsync, busy timeout, mmap and page cache), so several
+worker processes can share one SQLite file without "database is locked".
+"""
+
+# Pool settings -> create_engine() keyword
+POOL_OPTIONS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+    'DB_POOL_PRE_PING': 'pool_pre_ping',
+}
+
+# Only worth it for databases reached over a network connection
+SERVER_ONLY_OPTIONS = ('pool_recycle', 'pool_pre_ping')
+
+
+def _is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def _is_sqlite_memory(uri):
+    return _is_sqlite(uri) and make_url(uri).database in (None, '', ':memory:')
+
+
+def configure(app):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS from the engine profile
+    Must run before db.init_app(); options already present in
+    SQLALCHEMY_ENGINE_OPTIONS take precedence
+    """
+    config = app.config
+    for name, default in (('DB_POOL_SIZE', 5), ('DB_MAX_OVERFLOW', 10), ('DB_POOL_TIMEOUT', 30),
+                          ('DB_POOL_RECYCLE', 1800), ('DB_POOL_PRE_PING', True), ('SQLITE_PRAGMAS', {}),
+                          ('DB_REPLICA_URIS', [])):
+        config.setdefault(name, default)
+
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    options = {}
+    # In-memory SQLite runs on a single static connection with no pool to size
+    if not _is_sqlite_memory(uri):
+        for setting, option in POOL_OPTIONS.items():
+            if config[setting] is None or (_is_sqlite(uri) and option in SERVER_ONLY_OPTIONS):
+                continue
+            options[option] = config[setting]
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    # Read replicas become binds; see app/replicas.py for the routing
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for number, replica_uri in enumerate(config['DB_REPLICA_URIS']):
+        binds[f'{REPLICA_BIND_PREFIX}{number}'] = replica_uri
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def _apply_pragmas(pragmas):
+    """Connect listener running the configured PRAGMAs on a new SQLite connection"""
+    statements = [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_app(app):
+    """Install the SQLite PRAGMAs on the app's engines and register `flask db-settings`"""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        for engine in db.engines.values():
+            if pragmas and engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _apply_pragmas(pragmas))
+
+    @app.cli.command('db-settings')
+    def db_settings_command():
+        """Show the engine pool and effective SQLite settings."""
+        engine = db.engine
+        print(f'{engine.url.render_as_string(hide_password=True)} ({engine.pool.status()})')
+        if engine.dialect.name == 'sqlite':
+            for name in app.config['SQLITE_PRAGMAS']:
+                print(f"{name}: {db.session.execute(text(f'PRAGMA {name}')).scalar()}")
@@ -0,0 +1,187 @@
+from blinker import Namespace
+from flask import current_app
+from sqlalchemy import case, func, inspect, select, text, update
+from sqlalchemy.orm import joinedload
+from app.models import db, Book, Category
+
+"""
+Inventory reservation and low-stock monitoring
+Decrements stock with conditional UPDATE statements so concurrent checkouts
+cannot oversell: the database, not Python, decides whether enough stock is left.
+Books whose stock falls below their reorder level are served from the
+ix_book_low_stock partial index, and a stock-low signal is sent when a
+checkout takes a book below its level.
+"""
+
+_signals = Namespace()
+
+# Sent with book_id, stock and reorder_level when a checkout takes a book
+# below its reorder level
+stock_low = _signals.signal('stock-low')
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when one or more cart lines cannot be reserved
+    Attributes:
+        shortages: List of dicts with 'book_id', 'title', 'requested' and
+                   'available' for every short line
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        titles = ', '.join(s['title'] for s in shortages)
+        super().__init__(f'Insufficient stock for {titles}')
+
+
+def reserve_stock(quantities):
+    """
+    Reserve stock for every line in the current transaction
+    All lines are decremented by one conditional bulk statement,
+    `UPDATE book SET stock = stock - CASE id ... END WHERE id IN (...) AND
+    stock >= CASE id ... END RETURNING id`, so every short line is known at
+    once. Databases without UPDATE ... RETURNING fall back to one conditional
+    UPDATE per line, in book ID order so concurrent reservations lock rows in
+    the same order. The caller owns the transaction and must roll back when
+    InsufficientStock is raised.
+    Args:
+        quantities: Mapping of book ID to quantity
+    Returns:
+        List of dicts with 'book_id', 'stock' and 'reorder_level' for every
+        book this reservation took below its reorder level (pass to
+        notify_low_stock() once the transaction has committed)
+    Raises:
+        InsufficientStock: If any line could not be reserved
+    """
+    if not quantities:
+        return []
+
+    if db.engine.dialect.update_returning:
+        requested = case(quantities, value=Book.id)
+        rows = db.session.execute(
+            update(Book)
+            .where(Book.id.in_(quantities), Book.stock >= requested)
+            .values(stock=Book.stock - requested)
+            .returning(Book.id, Book.stock, Book.reorder_level)
+            .execution_options(synchronize_session=False)
+        ).all()
+        reserved = {row.id for row in rows}
+    else:
+        reserved = set()
+        for book_id in sorted(quantities):
+            result = db.session.execute(
+                update(Book)
+                .where(Book.id == book_id, Book.stock >= quantities[book_id])
+                .values(stock=Book.stock - quantities[book_id])
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                reserved.add(book_id)
+        rows = []
+        if reserved:
+            rows = (db.session.query(Book.id, Book.stock, Book.reorder_level)
+                    .filter(Book.id.in_(reserved))
+                    .all())
+
+    short = {book_id: quantity for book_id, quantity in quantities.items() if book_id not in reserved}
+    if short:
+        found = {row.id: row for row in
+                 db.session.query(Book.id, Book.title, Book.stock).filter(Book.id.in_(short))}
+        raise InsufficientStock([
+            {
+                'book_id': book_id,
+                'title': found[book_id].title if book_id in found else 'this book',
+                'requested': quantity,
+                'available': max(found[book_id].stock or 0, 0) if book_id in found else 0,
+            }
+            for book_id, quantity in short.items()
+        ])
+
+    return [
+        {'book_id': row.id, 'stock': row.stock, 'reorder_level': row.reorder_level}
+        for row in rows
+        if row.stock < row.reorder_level <= row.stock + quantities[row.id]
+    ]
+
+
+def notify_low_stock(crossings):
+    """
+    Send stock_low for every book a committed reservation took below its level
+    Args:
+        crossings: List returned by reserve_stock()
+    """
+    app = current_app._get_current_object()
+    for crossing in crossings:
+        stock_low.send(app, **crossing)
+
+
+def low_stock_books(query=None):
+    """
+    Book query restricted to books below their reorder level
+    The predicate matches the ix_book_low_stock partial index, so only the
+    low-stock rows are read
+    Args:
+        query: Existing Book query to extend (defaults to Book.query)
+    Returns:
+        Query with Book.category eager-loaded
+    """
+    query = query if query is not None else Book.query
+    return (query
+            .options(joinedload(Book.category))
+            .filter(Book.stock < Book.reorder_level))
+
+
+def refresh_reorder_levels(*criteria):
+    """
+    Resolve Book.reorder_level from the book, category and global thresholds
+    Runs one UPDATE in the current transaction; the caller commits
+    Example:
+        refresh_reorder_levels(Book.category_id == category.id)
+    Args:
+        *criteria: Filters selecting the books to refresh (all books if none)
+    """
+    category_threshold = (select(Category.reorder_threshold)
+                          .where(Category.id == Book.category_id)
+                          .scalar_subquery())
+    db.session.execute(
+        update(Book)
+        .where(*criteria)
+        .values(reorder_level=func.coalesce(Book.reorder_threshold, category_threshold,
+                                            current_app.config['LOW_STOCK_THRESHOLD']))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _ensure_reorder_columns():
+    """Add the threshold columns and low-stock index to databases created before them"""
+    inspector = inspect(db.engine)
+    book_columns = {c['name'] for c in inspector.get_columns('book')}
+    if 'reorder_threshold' not in book_columns:
+        db.session.execute(text('ALTER TABLE book ADD COLUMN reorder_threshold INTEGER'))
+    if 'reorder_level' not in book_columns:
+        db.session.execute(text('ALTER TABLE book ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT 5'))
+    if 'reorder_threshold' not in {c['name'] for c in inspector.get_columns('category')}:
+        db.session.execute(text('ALTER TABLE category ADD COLUMN reorder_threshold INTEGER'))
+    db.session.commit()
+    for index in Book.__table__.indexes:
+        if index.name == 'ix_book_low_stock':
+            index.create(db.engine, checkfirst=True)
+
+
+def _log_low_stock(app, book_id, stock, reorder_level):
+    app.logger.warning('Book %s is low on stock: %s left (reorder level %s)',
+                       book_id, stock, reorder_level)
+
+
+def init_app(app):
+    """Log stock_low events and register the `flask refresh-reorder-levels` command"""
+    app.config.setdefault('LOW_STOCK_THRESHOLD', 5)
+    stock_low.connect(_log_low_stock, app)
+
+    @app.cli.command('refresh-reorder-levels')
+    def refresh_reorder_levels_command():
+        """Recompute every book's reorder level (after changing LOW_STOCK_THRESHOLD)."""
+        _ensure_reorder_columns()
+        refresh_reorder_levels()
+        db.session.commit()
+        print(f'Reorder levels refreshed; {low_stock_books().count()} books are low on stock.')
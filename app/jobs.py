@@ -0,0 +1,252 @@
+import json
+import random
+import threading
+import traceback
+from datetime import datetime, timedelta
+import click
+from flask import current_app, g
+from sqlalchemy import and_, delete, or_, update
+from app.models import db, Job
+
+"""
+Background jobs
+Work that does not have to finish inside the request (emails, statistics
+recomputation) is queued in the job table, normally in the same transaction
+as the change that needs it, and executed after commit by worker threads in
+the web process or by `flask run-jobs` worker processes. Failed jobs are
+retried with exponential backoff until they run out of attempts.
+"""
+
+JOB_MODES = ('thread', 'external', 'eager')
+
+
+class JobQueue:
+    """
+    Job queue extension
+    JOBS_MODE selects who executes queued jobs:
+        'thread'   -- JOBS_WORKERS daemon threads in each web process, started
+                      on the first enqueue (plus any `flask run-jobs` workers)
+        'external' -- only `flask run-jobs` worker processes
+        'eager'    -- the request that queued them, once it has finished
+                      (tests and debugging)
+    Tasks are registered with the task() decorator and queued by name with
+    JSON-serializable keyword arguments
+    """
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_MODE', 'thread')
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 2.0)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_BACKOFF', 30)
+        app.config.setdefault('JOBS_BACKOFF_MAX', 3600)
+        app.config.setdefault('JOBS_LOCK_TIMEOUT', timedelta(minutes=10))
+        app.config.setdefault('JOBS_KEEP_DONE', timedelta(days=7))
+        if app.config['JOBS_MODE'] not in JOB_MODES:
+            raise ValueError(f"JOBS_MODE must be one of {', '.join(JOB_MODES)}")
+
+        app.extensions['job_queue'] = {
+            'workers': [],
+            'wakeup': threading.Event(),
+            'stop': threading.Event(),
+            'lock': threading.Lock(),
+        }
+        app.teardown_request(self._after_request)
+
+        @app.cli.command('run-jobs')
+        @click.option('--workers', default=None, type=int, help='Worker threads (defaults to JOBS_WORKERS).')
+        @click.option('--once', is_flag=True, help='Run the jobs that are due, then exit.')
+        def run_jobs(workers, once):
+            """Execute queued background jobs."""
+            if once:
+                print(f'Ran {self.run_pending()} jobs.')
+                return
+            threads = self.start_workers(current_app._get_current_object(), workers)
+            print(f'Running jobs with {len(threads)} workers (Ctrl+C to stop).')
+            try:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(1)
+            except KeyboardInterrupt:
+                current_app.extensions['job_queue']['stop'].set()
+
+        @app.cli.command('purge-jobs')
+        def purge_jobs():
+            """Delete finished jobs older than JOBS_KEEP_DONE."""
+            cutoff = datetime.utcnow() - current_app.config['JOBS_KEEP_DONE']
+            removed = db.session.execute(
+                delete(Job).where(Job.status == 'done', Job.finished_at < cutoff)
+            ).rowcount
+            db.session.commit()
+            print(f'Removed {removed} finished jobs.')
+
+    def task(self, name, max_attempts=None):
+        """
+        Register a function as a job task
+        Args:
+            name: Name the task is queued under
+            max_attempts: Attempts before the job is marked failed
+                          (defaults to JOBS_MAX_ATTEMPTS)
+        """
+        def decorator(f):
+            f.max_attempts = max_attempts
+            self.tasks[name] = f
+            return f
+        return decorator
+
+    def enqueue(self, name, /, unique=False, delay=None, **payload):
+        """
+        Queue a job in the current transaction; the caller commits
+        The job only becomes visible to workers once the transaction commits,
+        so rolled-back changes never trigger their follow-up work
+        Args:
+            name: Registered task name
+            unique: Skip if an identical job is already waiting
+            delay: Optional timedelta before the job may run
+            **payload: Keyword arguments for the task (JSON-serializable)
+        Returns:
+            The new Job, or None when unique and already queued
+        """
+        if name not in self.tasks:
+            raise KeyError(f'Unknown job task: {name}')
+        encoded = json.dumps(payload, sort_keys=True)
+        if unique and db.session.query(Job.id).filter_by(
+                name=name, payload=encoded, status='queued').first() is not None:
+            return None
+
+        max_attempts = self.tasks[name].max_attempts or current_app.config['JOBS_MAX_ATTEMPTS']
+        job = Job(name=name, payload=encoded, max_attempts=max_attempts,
+                  run_at=datetime.utcnow() + (delay or timedelta()))
+        db.session.add(job)
+        g.jobs_enqueued = True
+        return job
+
+    def _after_request(self, error=None):
+        if not g.pop('jobs_enqueued', False):
+            return
+        app = current_app._get_current_object()
+        mode = app.config['JOBS_MODE']
+        if mode == 'eager':
+            # Fresh app context, so the request's session is left alone
+            with app.app_context():
+                self.run_pending()
+        elif mode == 'thread':
+            self.start_workers(app)
+            app.extensions['job_queue']['wakeup'].set()
+
+    def start_workers(self, app, count=None):
+        """
+        Start worker threads for an app unless they are already running
+        Returns:
+            List of worker threads
+        """
+        state = app.extensions['job_queue']
+        with state['lock']:
+            state['workers'] = [thread for thread in state['workers'] if thread.is_alive()]
+            for number in range(len(state['workers']), count or app.config['JOBS_WORKERS']):
+                thread = threading.Thread(target=self._work, args=(app,),
+                                          name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                state['workers'].append(thread)
+            return list(state['workers'])
+
+    def _work(self, app):
+        """Worker loop: run due jobs, then sleep until woken or the poll interval passes"""
+        state = app.extensions['job_queue']
+        while not state['stop'].is_set():
+            try:
+                with app.app_context():
+                    ran = self.run_pending()
+            except Exception:
+                app.logger.exception('Job worker error')
+                ran = 0
+            if not ran:
+                state['wakeup'].wait(app.config['JOBS_POLL_INTERVAL'])
+                state['wakeup'].clear()
+
+    def claim(self):
+        """
+        Claim the next due job for this worker
+        A job is claimed by a conditional UPDATE, so concurrent workers in
+        any process never run the same job twice; jobs left 'running' by a
+        crashed worker are reclaimed after JOBS_LOCK_TIMEOUT
+        Returns:
+            Claimed Job, or None when nothing is due
+        """
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_at < now - current_app.config['JOBS_LOCK_TIMEOUT']),
+        )
+        while True:
+            job_id = (db.session.query(Job.id)
+                      .filter(claimable)
+                      .order_by(Job.run_at, Job.id)
+                      .limit(1)
+                      .scalar())
+            if job_id is None:
+                db.session.rollback()
+                return None
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, claimable)
+                .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+
+    def execute(self, job):
+        """
+        Run a claimed job and record the outcome
+        Failures are retried after JOBS_BACKOFF * 2^(attempt - 1) seconds
+        (capped at JOBS_BACKOFF_MAX, with jitter) until max_attempts
+        """
+        task = self.tasks.get(job.name)
+        try:
+            if task is None:
+                raise KeyError(f'Unknown job task: {job.name}')
+            task(**json.loads(job.payload))
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc()
+            current_app.logger.warning('Job %s (%s) failed on attempt %s', job.id, job.name, job.attempts)
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+            else:
+                backoff = min(current_app.config['JOBS_BACKOFF'] * 2 ** (job.attempts - 1),
+                              current_app.config['JOBS_BACKOFF_MAX'])
+                job.status = 'queued'
+                job.run_at = datetime.utcnow() + timedelta(seconds=backoff * random.uniform(0.8, 1.2))
+            job.last_error = error[-4000:]
+            job.locked_at = None
+        else:
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            job.locked_at = None
+        db.session.commit()
+
+    def run_pending(self, limit=None):
+        """
+        Claim and run due jobs until none are left (or limit is reached)
+        Returns:
+            Number of jobs run
+        """
+        count = 0
+        while limit is None or count < limit:
+            job = self.claim()
+            if job is None:
+                break
+            self.execute(job)
+            count += 1
+        return count
+
+
+job_queue = JobQueue()
@@ -0,0 +1,72 @@
+import smtplib
+from email.message import EmailMessage
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Order, OrderItem
+from app.jobs import job_queue
+
+"""
+Outgoing email
+send_email() delivers through the SMTP server in MAIL_SERVER, or only logs
+the message when none is configured (development). Emails are always sent
+from background jobs, never inside a request.
+"""
+
+
+def send_email(to, subject, body, reply_to=None):
+    """
+    Send a plain-text email
+    Args:
+        to: Recipient address
+        subject: Subject line
+        body: Message text
+        reply_to: Optional Reply-To address
+    """
+    config = current_app.config
+    if not config.get('MAIL_SERVER'):
+        current_app.logger.info('Email to %s (MAIL_SERVER not set): %s\n%s', to, subject, body)
+        return
+
+    message = EmailMessage()
+    message['From'] = config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    if reply_to:
+        message['Reply-To'] = reply_to
+    message.set_content(body)
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30) as smtp:
+        if config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        smtp.send_message(message)
+
+
+@job_queue.task('send_order_confirmation')
+def send_order_confirmation(order_id):
+    """Email the customer a summary of a newly placed order"""
+    order = (Order.query
+             .options(joinedload(Order.user),
+                      selectinload(Order.order_items).joinedload(OrderItem.book))
+             .filter_by(id=order_id)
+             .first())
+    if order is None:
+        return
+
+    lines = [f'Hello {order.user.full_name},', '',
+             f'Thank you for your order #{order.id}. We have received it and will let you know when it ships.', '']
+    for item in order.order_items:
+        lines.append(f'  {item.quantity} x {item.book.title}  ₨{item.quantity * item.price_at_purchase:,.2f}')
+    lines += ['', f'Total: ₨{order.total_price:,.2f}']
+    if order.shipping_address:
+        lines += ['', 'Shipping to:', f'  {order.shipping_address}',
+                  f'  {order.shipping_city or ""} {order.shipping_postal or ""}'.rstrip()]
+    send_email(order.user.email, f'Your order #{order.id}', '\n'.join(lines))
+
+
+@job_queue.task('deliver_contact_message')
+def deliver_contact_message(name, email, subject, message):
+    """Forward a contact form submission to CONTACT_EMAIL"""
+    send_email(current_app.config['CONTACT_EMAIL'], f'[Contact] {subject}',
+               f'From: {name} <{email}>\n\n{message}', reply_to=email)
@@ -0,0 +1,205 @@
+import hashlib
+import hmac
+import re
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from app.models import db
+
+"""
+Request instrumentation
+Times every request and the SQL it runs: latency histograms and query / DB
+time counters per endpoint, a Server-Timing header, slow-query log lines
+keyed by a statement fingerprint, and a Prometheus text endpoint at
+/metrics. Statement counts come from query_counter (g.query_count). With
+METRICS_ENABLED off nothing is registered, so requests pay nothing.
+Each worker process keeps and exposes its own numbers.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETER = r'(?:\?|%\(\w+\)s|%s|:\w+)'
+_PARAMETER_LISTS = re.compile(rf'\(\s*{_PARAMETER}(?:\s*,\s*{_PARAMETER})+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """
+    Normalize a SQL statement so every execution of the same query matches
+    Literals become ?, IN lists of any length become (...), whitespace collapses
+    Returns:
+        (fingerprint, short hash)
+    """
+    text = _LITERALS.sub('?', _WHITESPACE.sub(' ', statement).strip())
+    text = _PARAMETER_LISTS.sub('(...)', text)
+    return text, hashlib.sha1(text.encode()).hexdigest()[:8]
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class RequestMetrics:
+    """
+    Instrumentation extension
+    Settings:
+        METRICS_ENABLED: Master switch
+        METRICS_SERVER_TIMING: Add a Server-Timing header to responses
+        METRICS_TOKEN: Scrapers sending `Authorization: Bearer <token>`
+                       may read /metrics from anywhere
+        METRICS_ALLOWED_IPS: Client addresses allowed to read /metrics
+                             without the token (None allows everyone).
+                             Behind a reverse proxy every client looks like
+                             the proxy unless ProxyFix sets remote_addr
+        SLOW_QUERY_THRESHOLD: Log statements slower than this many seconds
+                              (None disables)
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('METRICS_SERVER_TIMING', True)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+        app.config.setdefault('SLOW_QUERY_THRESHOLD', 0.25)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        app.extensions['request_metrics'] = {
+            'lock': threading.Lock(),
+            'latency': {},    # (endpoint, method) -> [bucket counts..., +Inf count, sum]
+            'requests': {},   # (endpoint, method, status) -> count
+            'queries': {},    # endpoint -> statements
+            'db_time': {},    # endpoint -> seconds
+            'slow': {},       # (endpoint, fingerprint hash) -> count
+        }
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_statement)
+                event.listen(engine, 'after_cursor_execute', self._after_statement)
+                event.listen(engine, 'handle_error', self._statement_failed)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    @staticmethod
+    def _before_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def _statement_failed(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('statement_started'):
+            connection.info['statement_started'].pop()
+
+    @staticmethod
+    def _after_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+        if not has_request_context():
+            return
+        g.db_time = g.get('db_time', 0.0) + elapsed
+
+        threshold = current_app.config['SLOW_QUERY_THRESHOLD']
+        if threshold is not None and elapsed >= threshold:
+            text, digest = fingerprint(statement)
+            state = current_app.extensions['request_metrics']
+            with state['lock']:
+                key = (request.endpoint or 'unmatched', digest)
+                state['slow'][key] = state['slow'].get(key, 0) + 1
+            current_app.logger.warning('Slow query %s (%.1f ms) in %s: %s',
+                                       digest, elapsed * 1000, request.endpoint, text)
+
+    @staticmethod
+    def _start_request():
+        g.request_started = time.perf_counter()
+
+    def _finish_request(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        queries = g.get('query_count', 0)
+        db_time = g.get('db_time', 0.0)
+        endpoint = request.endpoint or 'unmatched'
+
+        state = current_app.extensions['request_metrics']
+        with state['lock']:
+            histogram = state['latency'].setdefault((endpoint, request.method),
+                                                    [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += elapsed
+            key = (endpoint, request.method, response.status_code)
+            state['requests'][key] = state['requests'].get(key, 0) + 1
+            state['queries'][endpoint] = state['queries'].get(endpoint, 0) + queries
+            state['db_time'][endpoint] = state['db_time'].get(endpoint, 0.0) + db_time
+
+        if current_app.config['METRICS_SERVER_TIMING']:
+            response.headers.add('Server-Timing', f'db;dur={db_time * 1000:.1f};desc="{queries} queries"')
+            response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+        return response
+
+    @staticmethod
+    def _may_read_metrics():
+        token = current_app.config['METRICS_TOKEN']
+        if token:
+            scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+                return True
+        allowed = current_app.config['METRICS_ALLOWED_IPS']
+        return allowed is None or request.remote_addr in allowed
+
+    def metrics_view(self):
+        """Prometheus text exposition of this process's metrics"""
+        if not self._may_read_metrics():
+            abort(403)
+
+        state = current_app.extensions['request_metrics']
+        lines = []
+        with state['lock']:
+            lines += ['# HELP http_request_duration_seconds Request latency by endpoint.',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (endpoint, method), histogram in sorted(state['latency'].items()):
+                for bound, count in zip(LATENCY_BUCKETS, histogram):
+                    lines.append(f'http_request_duration_seconds_bucket'
+                                 f'{{{_labels(endpoint=endpoint, method=method, le=bound)}}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket'
+                             f'{{{_labels(endpoint=endpoint, method=method, le="+Inf")}}} {histogram[-2]}')
+                lines.append(f'http_request_duration_seconds_sum{{{_labels(endpoint=endpoint, method=method)}}} '
+                             f'{histogram[-1]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{_labels(endpoint=endpoint, method=method)}}} '
+                             f'{histogram[-2]}')
+
+            lines += ['# HELP http_requests_total Requests by endpoint and status.',
+                      '# TYPE http_requests_total counter']
+            for (endpoint, method, status), count in sorted(state['requests'].items()):
+                lines.append(f'http_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} '
+                             f'{count}')
+
+            lines += ['# HELP db_queries_total SQL statements issued by endpoint.',
+                      '# TYPE db_queries_total counter']
+            for endpoint, count in sorted(state['queries'].items()):
+                lines.append(f'db_queries_total{{{_labels(endpoint=endpoint)}}} {count}')
+
+            lines += ['# HELP db_seconds_total Time spent in SQL statements by endpoint.',
+                      '# TYPE db_seconds_total counter']
+            for endpoint, seconds in sorted(state['db_time'].items()):
+                lines.append(f'db_seconds_total{{{_labels(endpoint=endpoint)}}} {seconds:.6f}')
+
+            lines += ['# HELP db_slow_queries_total Statements over SLOW_QUERY_THRESHOLD by fingerprint.',
+                      '# TYPE db_slow_queries_total counter']
+            for (endpoint, digest), count in sorted(state['slow'].items()):
+                lines.append(f'db_slow_queries_total{{{_labels(endpoint=endpoint, fingerprint=digest)}}} {count}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+request_metrics = RequestMetrics()
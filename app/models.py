@@ -1,14 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import column_property
+from app.passwords import password_hasher
+from app.replicas import RoutingSession
 
 """
 Database Models for Online Bookstore
 Defines the structure of database tables and relationships
 """
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(UserMixin, db.Model):
@@ -19,6 +22,7 @@ class User(UserMixin, db.Model):
     - One-to-Many with Review
     """
     __tablename__ = 'user'
+    __table_args__ = (db.Index('ix_user_created', 'created_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
@@ -39,11 +43,19 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set user password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verify password against hash"""
-        return check_password_hash(self.password_hash, password)
+        """
+        Verify password against hash
+        A hash made with an outdated PASSWORD_HASH_METHOD is replaced after a
+        successful check; the caller commits
+        """
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -58,6 +70,14 @@ class Book(db.Model):
     - Many-to-Many with Order (through OrderItem)
     """
     __tablename__ = 'book'
+    __table_args__ = (
+        db.Index('ix_book_created', 'created_at', 'id'),
+        # Partial index holding only books below their reorder level;
+        # the low-stock queries repeat this predicate so the planner uses it
+        db.Index('ix_book_low_stock', 'stock', 'id',
+                 sqlite_where=db.text('stock < reorder_level'),
+                 postgresql_where=db.text('stock < reorder_level')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False, index=True)
@@ -67,7 +87,12 @@ class Book(db.Model):
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, default=0)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
-    cover_image = db.Column(db.String(255))
+    cover_image = db.Column(db.String(255))  # external cover URL
+    # Locally stored cover (app.covers); cover_key is the cover's content
+    # hash, set once its thumbnails exist, so pages build image URLs from
+    # the book row alone
+    cover_id = db.Column(db.Integer, db.ForeignKey('cover_image.id'), index=True)
+    cover_key = db.Column(db.String(64))
     publisher = db.Column(db.String(120))
     publication_year = db.Column(db.Integer)
     pages = db.Column(db.Integer)
@@ -75,11 +100,38 @@ class Book(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Reorder threshold: reorder_threshold is the book's own setting (None
+    # falls back to its category, then LOW_STOCK_THRESHOLD); reorder_level
+    # is the resolved value, maintained by app.inventory
+    reorder_threshold = db.Column(db.Integer)
+    reorder_level = db.Column(db.Integer, nullable=False, default=5, server_default='5')
+    
+    # Rating aggregates, maintained incrementally by app.reviews
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     category = db.relationship('Category', backref='books')
     reviews = db.relationship('Review', backref='book', lazy=True, cascade='all, delete-orphan')
     order_items = db.relationship('OrderItem', backref='book', lazy=True, cascade='all, delete-orphan')
     
+    @property
+    def avg_rating(self):
+        """Average rating from the stored aggregates (0 when unreviewed)"""
+        if not self.review_count:
+            return 0
+        return self.rating_sum / self.review_count
+    
+    @property
+    def rating_histogram(self):
+        """Review counts per star rating, as {1: n1, ..., 5: n5}"""
+        return {stars: getattr(self, f'rating_{stars}_count') or 0 for stars in range(1, 6)}
+    
     def __repr__(self):
         return f'<Book {self.title}>'
 
@@ -95,6 +147,7 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False, index=True)
     description = db.Column(db.Text)
+    reorder_threshold = db.Column(db.Integer)  # None uses LOW_STOCK_THRESHOLD
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -154,6 +207,7 @@ class Review(db.Model):
     - Many-to-One with Book
     """
     __tablename__ = 'review'
+    __table_args__ = (db.Index('ix_review_book_created', 'book_id', 'created_at', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
@@ -166,3 +220,150 @@ class Review(db.Model):
     
     def __repr__(self):
         return f'<Review {self.id}>'
+
+
+class CartItem(db.Model):
+    """
+    CartItem Model - Server-side shopping cart line
+    Carts are keyed by a short cart ID kept in the session (anonymous
+    visitors) or derived from the user ID (logged-in users)
+    """
+    __tablename__ = 'cart_item'
+    __table_args__ = (db.UniqueConstraint('cart_id', 'book_id', name='uq_cart_item_cart_book'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(32), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id', ondelete='CASCADE'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<CartItem Cart:{self.cart_id} Book:{self.book_id}>'
+
+
+class CoverImage(db.Model):
+    """
+    CoverImage Model - Uploaded or imported cover image, stored once per
+    distinct content (books with identical covers share a row)
+    Thumbnails are generated by a background job; status is 'pending',
+    'ready' or 'failed'
+    """
+    __tablename__ = 'cover_image'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of the original
+    extension = db.Column(db.String(10), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # bytes
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CoverImage {self.key[:12]} {self.status}>'
+
+
+
+class StoreStat(db.Model):
+    """
+    StoreStat Model - Running store-wide totals shown on the admin dashboard
+    One row per statistic, adjusted in the same transaction as the change it
+    counts and periodically recomputed from the source tables
+    """
+    __tablename__ = 'store_stat'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StoreStat {self.name}={self.value}>'
+
+
+class Job(db.Model):
+    """
+    Job Model - Persistent background job queue entry
+    Added in the same transaction as the change that needs it and executed
+    by app.jobs workers after commit, with retries and exponential backoff
+    """
+    __tablename__ = 'job'
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
+
+
+class SalesDay(db.Model):
+    """
+    SalesDay Model - Store-wide sales rollup for one day
+    Maintained incrementally by checkout and order cancellation, rebuildable
+    from the order tables (see app/analytics.py)
+    """
+    __tablename__ = 'sales_day'
+    
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<SalesDay {self.day}>'
+
+
+class BookSalesDay(db.Model):
+    """
+    BookSalesDay Model - Sales rollup for one book on one day
+    The book's category is copied in so category revenue needs no join; there
+    is no foreign key so history survives book deletion
+    """
+    __tablename__ = 'book_sales_day'
+    
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    category_id = db.Column(db.Integer, index=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<BookSalesDay {self.day} Book:{self.book_id}>'
+
+
+# Aggregate columns
+# Deferred correlated COUNT subqueries; listing pages undefer them through the
+# loaders in app/queries.py instead of loading whole collections to count them
+Category.book_count = column_property(
+    select(func.count(Book.id))
+    .where(Book.category_id == Category.id)
+    .correlate_except(Book)
+    .scalar_subquery(),
+    deferred=True
+)
+
+User.order_count = column_property(
+    select(func.count(Order.id))
+    .where(Order.user_id == User.id)
+    .correlate_except(Order)
+    .scalar_subquery(),
+    deferred=True
+)
+
+Order.item_count = column_property(
+    select(func.count(OrderItem.id))
+    .where(OrderItem.order_id == Order.id)
+    .correlate_except(OrderItem)
+    .scalar_subquery(),
+    deferred=True
+)
@@ -0,0 +1,213 @@
+import base64
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_
+
+"""
+Keyset (cursor) pagination
+Pages through a query by remembering the sort key of the last row shown
+instead of using OFFSET, so every page costs the same no matter how deep it
+is. Cursors are opaque URL-safe tokens; totals can be exact, cached for a
+short time, or skipped entirely.
+"""
+
+
+class KeysetPagination:
+    """
+    One page of keyset-paginated results
+    Exposes the same names the offset pagination widgets use (items, total,
+    has_next, has_prev, per_page) plus next_cursor / prev_cursor tokens;
+    page-number based attributes are absent on purpose
+    """
+    mode = 'keyset'
+
+    def __init__(self, items, per_page, next_cursor, prev_cursor, total):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    """Decode one key value, rejecting anything but a non-null scalar"""
+    if isinstance(value, dict) and list(value) == ['dt'] and isinstance(value['dt'], str):
+        return datetime.fromisoformat(value['dt'])
+    if not isinstance(value, (str, int, float)) or (isinstance(value, float) and not math.isfinite(value)):
+        raise ValueError('cursor values must be strings or numbers')
+    return value
+
+
+def encode_cursor(values, direction):
+    """
+    Build an opaque cursor token
+    Args:
+        values: Sort key values of the boundary row
+        direction: 'next' (rows after the key) or 'prev' (rows before it)
+    """
+    payload = json.dumps({'d': direction, 'k': [_encode_value(v) for v in values]},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size=None):
+    """
+    Decode a cursor token
+    Tokens come from the query string, so anything but a list of size
+    non-null scalar values is treated as no cursor at all
+    Args:
+        token: Cursor token
+        size: Number of sort key columns the values must match
+    Returns:
+        (values, direction), or None if the token is missing or malformed
+    """
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        direction, keys = payload['d'], payload['k']
+        if direction not in ('next', 'prev') or not isinstance(keys, list):
+            return None
+        if size is not None and len(keys) != size:
+            return None
+        return [_decode_value(v) for v in keys], direction
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _after(columns, values, descending):
+    """WHERE clause selecting rows strictly after `values` in sort order"""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def count_query(query, mode=None):
+    """
+    Total row count for a query according to the count mode
+    Args:
+        query: Query to count
+        mode: 'exact', 'cached' (exact count reused for PAGINATION_COUNT_TTL
+              seconds) or 'none'; defaults to PAGINATION_COUNT
+    Returns:
+        Row count, or None when mode is 'none'
+    """
+    mode = mode or current_app.config['PAGINATION_COUNT']
+    if mode == 'none':
+        return None
+
+    counted = query.order_by(None)
+    if mode != 'cached':
+        return counted.count()
+
+    compiled = counted.statement.compile()
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    total = counted.count()
+    with _count_lock:
+        if len(_count_cache) >= 1024:
+            _count_cache.clear()
+        _count_cache[key] = (now + current_app.config['PAGINATION_COUNT_TTL'], total)
+    return total
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=10, descending=False, count=None):
+    """
+    Fetch one page of a query with keyset pagination
+    Args:
+        query: Query to paginate (must not be ordered yet)
+        columns: Sort key columns, the last one unique (e.g. [Book.title, Book.id])
+        cursor: Token from a previous page's next_cursor / prev_cursor
+        per_page: Rows per page
+        descending: Sort newest/largest first
+        count: Count mode passed to count_query (None uses PAGINATION_COUNT)
+    Returns:
+        KeysetPagination
+    """
+    position = decode_cursor(cursor, len(columns))
+    total = count_query(query, count)
+
+    if position is None:
+        position = (None, 'next')
+    values, direction = position
+    backwards = direction == 'prev'
+    # Walking backwards means scanning in the opposite order and flipping
+    # the rows afterwards
+    scan_descending = descending != backwards
+
+    if values is not None:
+        query = query.filter(_after(columns, values, scan_descending))
+
+    order = [c.desc() if scan_descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return [getattr(row, column.key) for column in columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = encode_cursor(key(rows[-1]), 'next')
+        if (more and backwards) or (values is not None and not backwards):
+            prev_cursor = encode_cursor(key(rows[0]), 'prev')
+
+    return KeysetPagination(rows, per_page, next_cursor, prev_cursor, total)
+
+
+def paginate(query, columns, per_page, descending=False):
+    """
+    Paginate a listing query according to the request and PAGINATION_MODE
+    Keyset pagination is used unless PAGINATION_MODE is 'offset' or the
+    request carries an explicit ?page= number (old links keep working)
+    Args:
+        query: Unordered query to paginate
+        columns: Sort key columns, the last one unique
+        per_page: Rows per page
+        descending: Sort in descending order
+    Returns:
+        KeysetPagination or Flask-SQLAlchemy Pagination
+    """
+    page = request.args.get('page', type=int)
+    if current_app.config['PAGINATION_MODE'] == 'offset' or page is not None:
+        order = [c.desc() if descending else c.asc() for c in columns]
+        return query.order_by(*order).paginate(page=page or 1, per_page=per_page, error_out=False)
+    return keyset_paginate(query, columns, cursor=request.args.get('cursor'),
+                           per_page=per_page, descending=descending)
@@ -0,0 +1,92 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+"""
+Password hashing
+Hash algorithm and cost come from PASSWORD_HASH_METHOD (any Werkzeug method
+string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'), so each
+environment can pick its own cost. Stored hashes made with other parameters
+still verify and are replaced on the user's next successful login.
+Verification runs on a bounded thread pool: hashlib releases the GIL while
+hashing, so at most PASSWORD_HASH_WORKERS hashes run at once and a burst of
+logins cannot take every core away from the rest of the site.
+"""
+
+
+class PasswordHasher:
+    """
+    Password hashing extension
+    Settings:
+        PASSWORD_HASH_METHOD: Werkzeug hash method with its cost parameters
+        PASSWORD_HASH_SALT_LENGTH: Salt length in characters
+        PASSWORD_HASH_WORKERS: Size of the verification pool (0 hashes in
+                               the request thread)
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_HASH_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        app.extensions['password_hasher'] = {
+            'executor': ThreadPoolExecutor(workers, thread_name_prefix='password-hash') if workers else None,
+        }
+
+    @property
+    def _state(self):
+        state = current_app.extensions['password_hasher']
+        if 'dummy_hash' not in state:
+            # Hashed on first use rather than at startup (scrypt takes a while):
+            # gives the exact prefix Werkzeug stores for the configured method
+            # ('pbkdf2' is stored as 'pbkdf2:sha256:<iterations>')
+            dummy_hash = generate_password_hash(os.urandom(16).hex(), current_app.config['PASSWORD_HASH_METHOD'],
+                                                current_app.config['PASSWORD_HASH_SALT_LENGTH'])
+            state['method'] = dummy_hash.split('$', 1)[0]
+            state['dummy_hash'] = dummy_hash
+        return state
+
+    def _run(self, function, *args):
+        executor = current_app.extensions['password_hasher']['executor']
+        if executor is None:
+            return function(*args)
+        return executor.submit(function, *args).result()
+
+    def hash(self, password):
+        """
+        Hash a password with the configured method
+        Returns:
+            Werkzeug hash string ('method$salt$hash')
+        """
+        config = current_app.config
+        return self._run(generate_password_hash, password, config['PASSWORD_HASH_METHOD'],
+                         config['PASSWORD_HASH_SALT_LENGTH'])
+
+    def verify(self, password_hash, password):
+        """
+        Check a password against a stored hash
+        Args:
+            password_hash: Stored hash, or None for an unknown account (a
+                           dummy hash is checked so the response takes as
+                           long as for a real account)
+            password: Password to check
+        Returns:
+            True if the password matches
+        """
+        if password_hash is None:
+            self._run(check_password_hash, self._state['dummy_hash'], password)
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if a stored hash was made with other than the configured method"""
+        return password_hash.split('$', 1)[0] != self._state['method']
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,234 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from flask import current_app, g, request
+from flask_login import current_user
+
+"""
+Request profiling
+Profiles a sample of requests: PROFILING_SAMPLE_RATE of all requests, every
+request to an endpoint in PROFILING_ENDPOINTS, and admin requests sending the
+PROFILING_HEADER header. Results are aggregated per endpoint in the process
+and shown on the admin Profiling page.
+
+Two modes:
+    'sample'   -- a background thread records the stack of each profiled
+                  request every PROFILING_INTERVAL seconds; downloads are in
+                  collapsed-stack format for flamegraph.pl or speedscope.
+                  The request itself runs at full speed, so a low sample
+                  rate is safe in production
+    'cprofile' -- deterministic cProfile of each profiled request (much
+                  slower requests); downloads are .prof files for pstats or
+                  snakeviz
+"""
+
+PROFILING_MODES = ('sample', 'cprofile')
+
+MAX_STACK_DEPTH = 128
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def fold_stack(frame):
+    """Collapsed-stack line for a frame: outermost call first, ';'-separated"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Samples the stacks of registered threads while any are registered
+    The sampling thread starts on first use and sleeps while idle
+    """
+
+    def __init__(self, interval, max_stacks):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.active = {}    # thread id -> endpoint
+        self.stacks = {}    # endpoint -> {folded stack: samples}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self, thread_id, endpoint):
+        with self.lock:
+            self.active[thread_id] = endpoint
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def stop(self, thread_id):
+        with self.lock:
+            self.active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                active = dict(self.active)
+            if not active:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, endpoint in active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stacks = self.stacks.setdefault(endpoint, {})
+                    stack = fold_stack(frame)
+                    if stack in stacks or len(stacks) < self.max_stacks:
+                        stacks[stack] = stacks.get(stack, 0) + 1
+            del frames
+            time.sleep(self.interval)
+
+
+class RequestProfiler:
+    """
+    Profiling extension
+    Settings:
+        PROFILING_ENABLED: Master switch (nothing is registered when off)
+        PROFILING_MODE: 'sample' or 'cprofile'
+        PROFILING_SAMPLE_RATE: Fraction of requests to profile
+        PROFILING_ENDPOINTS: Endpoints to profile on every request
+        PROFILING_HEADER: Header with which an admin asks for a profile
+        PROFILING_INTERVAL: Seconds between stack samples ('sample' mode)
+        PROFILING_MAX_STACKS: Distinct stacks kept per endpoint
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILING_ENABLED', False)
+        app.config.setdefault('PROFILING_MODE', 'sample')
+        app.config.setdefault('PROFILING_SAMPLE_RATE', 0.01)
+        app.config.setdefault('PROFILING_ENDPOINTS', ())
+        app.config.setdefault('PROFILING_HEADER', 'X-Profile')
+        app.config.setdefault('PROFILING_INTERVAL', 0.005)
+        app.config.setdefault('PROFILING_MAX_STACKS', 5000)
+        if not app.config['PROFILING_ENABLED']:
+            return
+        if app.config['PROFILING_MODE'] not in PROFILING_MODES:
+            raise ValueError(f"PROFILING_MODE must be one of {', '.join(PROFILING_MODES)}")
+
+        app.extensions['request_profiler'] = {
+            'sampler': StackSampler(app.config['PROFILING_INTERVAL'], app.config['PROFILING_MAX_STACKS']),
+            'stats': {},     # endpoint -> pstats.Stats ('cprofile' mode)
+            'requests': {},  # endpoint -> profiled request count
+            'lock': threading.Lock(),
+        }
+        app.before_request(self._start)
+        app.teardown_request(self._stop)
+
+    @staticmethod
+    def enabled():
+        """True if profiling is on for the current app"""
+        return 'request_profiler' in current_app.extensions
+
+    @staticmethod
+    def _wanted():
+        config = current_app.config
+        if request.endpoint is None or request.endpoint == 'static':
+            return False
+        if request.endpoint in config['PROFILING_ENDPOINTS']:
+            return True
+        if config['PROFILING_HEADER'] and config['PROFILING_HEADER'] in request.headers:
+            return current_user.is_authenticated and current_user.is_admin
+        return random.random() < config['PROFILING_SAMPLE_RATE']
+
+    def _start(self):
+        if not self._wanted():
+            return
+        state = current_app.extensions['request_profiler']
+        g.profiled_endpoint = request.endpoint
+        if current_app.config['PROFILING_MODE'] == 'cprofile':
+            g.request_profile = cProfile.Profile()
+            g.request_profile.enable()
+        else:
+            state['sampler'].start(threading.get_ident(), request.endpoint)
+
+    def _stop(self, error=None):
+        endpoint = g.pop('profiled_endpoint', None)
+        if endpoint is None:
+            return
+        state = current_app.extensions['request_profiler']
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            profile.disable()
+        else:
+            state['sampler'].stop(threading.get_ident())
+
+        with state['lock']:
+            state['requests'][endpoint] = state['requests'].get(endpoint, 0) + 1
+            if profile is not None:
+                if endpoint in state['stats']:
+                    state['stats'][endpoint].add(profile)
+                else:
+                    state['stats'][endpoint] = pstats.Stats(profile)
+
+    def summary(self):
+        """
+        Profiled endpoints of this process
+        Returns:
+            List of dicts with 'endpoint', 'requests' and 'samples', busiest first
+        """
+        state = current_app.extensions['request_profiler']
+        sampler = state['sampler']
+        with state['lock'], sampler.lock:
+            rows = [{'endpoint': endpoint,
+                     'requests': count,
+                     'samples': sum(sampler.stacks.get(endpoint, {}).values())}
+                    for endpoint, count in state['requests'].items()]
+        return sorted(rows, key=lambda row: (row['samples'], row['requests']), reverse=True)
+
+    def folded(self, endpoint):
+        """Collapsed stacks of an endpoint ('sample' mode), one 'stack count' per line"""
+        sampler = current_app.extensions['request_profiler']['sampler']
+        with sampler.lock:
+            stacks = dict(sampler.stacks.get(endpoint, {}))
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+
+    def report(self, endpoint, limit=40):
+        """Text table of the slowest functions of an endpoint ('cprofile' mode)"""
+        state = current_app.extensions['request_profiler']
+        with state['lock']:
+            stats = state['stats'].get(endpoint)
+            if stats is None:
+                return ''
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self, endpoint):
+        """Aggregated cProfile data of an endpoint as a .prof file body ('cprofile' mode)"""
+        state = current_app.extensions['request_profiler']
+        with state['lock']:
+            stats = state['stats'].get(endpoint)
+            return marshal.dumps(stats.stats) if stats is not None else None
+
+    def reset(self):
+        """Drop all collected profiles"""
+        state = current_app.extensions['request_profiler']
+        with state['lock'], state['sampler'].lock:
+            state['stats'].clear()
+            state['requests'].clear()
+            state['sampler'].stacks.clear()
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,121 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload, undefer
+from app.models import db, Book, Category, Order, OrderItem, User
+
+"""
+Query shaping for listing pages
+Each route builds its queries through these helpers so related rows are
+eager-loaded and counts come from aggregate subqueries, keeping the number of
+SQL statements per page constant regardless of page size
+"""
+
+
+def books_with_category(query=None):
+    """
+    Book query with the category joined in (for book cards and tables)
+    Args:
+        query: Existing Book query to extend (defaults to Book.query)
+    Returns:
+        Query with Book.category eager-loaded
+    """
+    query = query if query is not None else Book.query
+    return query.options(joinedload(Book.category))
+
+
+def categories_with_counts():
+    """Category query with Category.book_count loaded in the same statement"""
+    return Category.query.options(undefer(Category.book_count)).order_by(Category.id)
+
+
+def orders_with_summary(query=None):
+    """
+    Order query for order tables: customer and item count loaded up front
+    Args:
+        query: Existing Order query to extend (defaults to Order.query)
+    Returns:
+        Query with Order.user joined and Order.item_count undeferred
+    """
+    query = query if query is not None else Order.query
+    return query.options(joinedload(Order.user), undefer(Order.item_count))
+
+
+def users_with_counts(query=None):
+    """User query for the admin user table with User.order_count loaded"""
+    query = query if query is not None else User.query
+    return query.options(undefer(User.order_count))
+
+
+def order_with_items(order_id):
+    """Load one order with its items and their books (order detail page)"""
+    return (Order.query
+            .options(selectinload(Order.order_items).joinedload(OrderItem.book))
+            .get_or_404(order_id))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request issues more SQL statements than its budget"""
+
+
+def query_budget(limit):
+    """
+    Decorator overriding QUERY_BUDGET for a single view
+    Args:
+        limit: Maximum number of statements the view may issue
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+class QueryBudget:
+    """
+    Per-request SQL statement counter
+    Always counts statements into g.query_count; when QUERY_BUDGET is set and
+    the app is in testing mode, a request that exceeds the budget fails with
+    QueryBudgetExceeded so N+1 regressions break the test suite
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_BUDGET', None)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._count_statement)
+
+        app.before_request(self._reset_count)
+        app.after_request(self._check_budget)
+
+    @staticmethod
+    def _reset_count():
+        # g outlives a request when an app context was already pushed (tests)
+        g.query_count = 0
+
+    @staticmethod
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+    @staticmethod
+    def _budget_for_request(app):
+        view = app.view_functions.get(request.endpoint)
+        return getattr(view, 'query_budget', app.config['QUERY_BUDGET'])
+
+    def _check_budget(self, response):
+        app = current_app._get_current_object()
+        budget = self._budget_for_request(app)
+        count = g.get('query_count', 0)
+        if app.testing and budget is not None and count > budget:
+            raise QueryBudgetExceeded(
+                f'{request.endpoint} issued {count} SQL statements '
+                f'(budget {budget})'
+            )
+        return response
+
+
+query_counter = QueryBudget()
@@ -0,0 +1,92 @@
+import random
+import time
+import click
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+"""
+Read replica routing
+Each URI in DB_REPLICA_URIS becomes a 'replica_<n>' bind. Views marked with
+@read_replica send their SELECTs to one replica picked per request; every
+write, and every statement of other views, goes to the primary. A browser
+session that wrote anything is pinned to the primary for DB_REPLICA_LAG
+seconds, so users read their own writes (a placed order, an edited profile,
+a new review) even while the replicas catch up.
+"""
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+def read_replica(f):
+    """
+    Decorator letting a view read from a replica
+    Place it directly below @route, like query_budget
+    """
+    f.read_replica = True
+    return f
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that sends SELECTs to the request's replica
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary and
+    mark the request as having written; its later SELECTs then use the
+    primary as well
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.db_wrote = True
+            elif (getattr(clause, 'is_select', False) and g.get('db_replica') is not None
+                  and not g.get('db_wrote')):
+                # Once the request has written, it reads its own writes too
+                return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_engines(app=None):
+    """Engines of the configured replica binds"""
+    app = app or current_app
+    engines = app.extensions['sqlalchemy'].engines
+    return [engine for key, engine in engines.items()
+            if key is not None and key.startswith(REPLICA_BIND_PREFIX)]
+
+
+def init_app(app):
+    """Route @read_replica views and register `flask sync-replicas`"""
+    app.config.setdefault('DB_REPLICA_LAG', 5)
+    with app.app_context():
+        replicas = replica_engines(app)
+
+    if replicas:
+        @app.before_request
+        def choose_replica():
+            view = app.view_functions.get(request.endpoint)
+            if getattr(view, 'read_replica', False) and session.get('db_primary_until', 0) < time.time():
+                g.db_replica = random.choice(replicas)
+
+        @app.after_request
+        def pin_writer_to_primary(response):
+            if g.get('db_wrote'):
+                session['db_primary_until'] = time.time() + app.config['DB_REPLICA_LAG']
+            return response
+
+    @app.cli.command('sync-replicas')
+    def sync_replicas_command():
+        """Copy the primary SQLite database to each SQLite replica (local testing)."""
+        primary = app.extensions['sqlalchemy'].engine
+        if primary.dialect.name != 'sqlite':
+            raise click.ClickException('sync-replicas only copies SQLite databases; '
+                                       'use the database server\'s replication instead.')
+        for replica in replica_engines():
+            if replica.dialect.name != 'sqlite':
+                continue
+            source = primary.raw_connection()
+            target = replica.raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+                source.close()
+            print(f'Copied to {replica.url.database}')
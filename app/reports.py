@@ -0,0 +1,134 @@
+from datetime import timedelta
+import click
+from sqlalchemy import func, select
+from app.models import db, Book, Order, OrderItem, User
+from app.bulk import encode_records, FORMATS
+
+"""
+Streaming order and revenue reports
+Each report is a single SELECT executed with yield_per, so rows are fetched
+from a server-side cursor (where the driver supports one) in fixed-size
+batches and encoded to CSV / JSON Lines as they arrive. Memory use does not
+depend on the number of orders.
+"""
+
+BATCH_SIZE = 2000
+
+REPORT_STATUSES = ['Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled']
+
+
+def _orders_report():
+    """One row per order with the customer's details"""
+    return (select(Order.id.label('order_id'),
+                   Order.created_at,
+                   Order.status,
+                   Order.total_price,
+                   Order.item_count.label('item_count'),
+                   User.id.label('user_id'),
+                   User.username,
+                   User.email,
+                   User.full_name,
+                   Order.shipping_city,
+                   Order.shipping_postal)
+            .join(User, Order.user_id == User.id)
+            .order_by(Order.id))
+
+
+def _order_items_report():
+    """One row per order line with the order, customer and book details"""
+    return (select(OrderItem.order_id,
+                   Order.created_at,
+                   Order.status,
+                   User.email,
+                   Book.isbn,
+                   Book.title,
+                   Book.author,
+                   OrderItem.quantity,
+                   OrderItem.price_at_purchase,
+                   (OrderItem.quantity * OrderItem.price_at_purchase).label('line_total'))
+            .join(Order, OrderItem.order_id == Order.id)
+            .join(User, Order.user_id == User.id)
+            .join(Book, OrderItem.book_id == Book.id)
+            .order_by(OrderItem.order_id, OrderItem.id))
+
+
+def _revenue_report():
+    """Orders and revenue per day; cancelled orders are left out unless a status is given"""
+    day = func.date(Order.created_at)
+    return (select(day.label('day'),
+                   func.count(Order.id).label('orders'),
+                   func.sum(Order.total_price).label('revenue'))
+            .group_by(day)
+            .order_by(day))
+
+
+REPORTS = {
+    'orders': _orders_report,
+    'order-items': _order_items_report,
+    'revenue': _revenue_report,
+}
+
+
+def report_statement(name, start=None, end=None, status=None):
+    """
+    Build the SELECT for a report
+    Args:
+        name: Key of REPORTS
+        start: First day to include (date or datetime, optional)
+        end: Last day to include, inclusive (optional)
+        status: Only include orders with this status (optional)
+    Returns:
+        Select statement
+    """
+    statement = REPORTS[name]()
+    if start is not None:
+        statement = statement.where(Order.created_at >= start)
+    if end is not None:
+        statement = statement.where(Order.created_at < end + timedelta(days=1))
+    if status:
+        statement = statement.where(Order.status == status)
+    elif name == 'revenue':
+        statement = statement.where(Order.status != 'Cancelled')
+    return statement
+
+
+def stream_report(name, fmt='csv', start=None, end=None, status=None, batch_size=BATCH_SIZE):
+    """
+    Run a report and encode it as it is read
+    Args:
+        name: Key of REPORTS
+        fmt: 'csv' or 'jsonl'
+        start, end, status: Filters passed to report_statement()
+        batch_size: Rows fetched from the cursor at a time
+    Yields:
+        Text chunks
+    """
+    statement = report_statement(name, start, end, status)
+    fieldnames = [column.name for column in statement.selected_columns]
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        yield from encode_records((row._asdict() for row in result), fieldnames, fmt, batch_size)
+    finally:
+        result.close()
+
+
+def init_app(app):
+    """Register the `flask export-report` command"""
+
+    @app.cli.command('export-report')
+    @click.argument('name', type=click.Choice(list(REPORTS)))
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True), required=False)
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day (YYYY-MM-DD).')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day, inclusive (YYYY-MM-DD).')
+    @click.option('--status', type=click.Choice(REPORT_STATUSES))
+    def export_report_command(name, path, fmt, start, end, status):
+        """Stream an order report to a file (stdout without a path)."""
+        chunks = stream_report(name, fmt, start, end, status)
+        if path is None:
+            for text in chunks:
+                click.echo(text, nl=False)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            for text in chunks:
+                stream.write(text)
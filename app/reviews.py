@@ -0,0 +1,111 @@
+from sqlalchemy import func, inspect, text, update
+from sqlalchemy.orm import joinedload
+from app.models import db, Book, Review
+from app.pagination import keyset_paginate
+
+"""
+Review aggregates and review loading
+Keeps the review_count / rating_sum / rating_N_count columns on Book up to
+date as reviews are added and deleted, and loads reviews a page at a time
+with keyset pagination
+"""
+
+RATING_COLUMNS = ['review_count', 'rating_sum'] + [f'rating_{stars}_count' for stars in range(1, 6)]
+
+REVIEWS_PER_PAGE = 10
+
+
+def apply_review(book_id, rating, delta=1):
+    """
+    Add (delta=1) or remove (delta=-1) one review from a book's aggregates
+    Runs a single UPDATE in the current transaction so the aggregates commit
+    or roll back together with the review itself
+    Args:
+        book_id: ID of the reviewed book
+        rating: Star rating of the review (1-5)
+        delta: +1 when a review is added, -1 when it is deleted
+    """
+    star_column = getattr(Book, f'rating_{int(rating)}_count')
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values({
+            Book.review_count: Book.review_count + delta,
+            Book.rating_sum: Book.rating_sum + delta * int(rating),
+            star_column: star_column + delta,
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reviews_page(book_id, cursor=None, per_page=REVIEWS_PER_PAGE):
+    """
+    Load one page of a book's reviews, newest first
+    Uses keyset pagination on (created_at, id), served by ix_review_book_created,
+    so deep pages cost the same as the first one; the total comes from
+    Book.review_count, so no COUNT is issued
+    Args:
+        book_id: ID of the book
+        cursor: Cursor from a previous page (None for the newest reviews)
+        per_page: Number of reviews per page
+    Returns:
+        KeysetPagination
+    """
+    query = (Review.query
+             .options(joinedload(Review.user))
+             .filter(Review.book_id == book_id))
+    return keyset_paginate(query, [Review.created_at, Review.id], cursor=cursor,
+                           per_page=per_page, descending=True, count='none')
+
+
+def _ensure_rating_columns():
+    """Add the aggregate columns to a book table created before they existed"""
+    existing = {c['name'] for c in inspect(db.engine).get_columns('book')}
+    for name in RATING_COLUMNS:
+        if name not in existing:
+            db.session.execute(text(
+                f'ALTER TABLE book ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0'
+            ))
+    db.session.commit()
+
+
+def backfill_ratings():
+    """
+    Recompute every book's rating aggregates from the review table
+    One GROUP BY over review plus one batched UPDATE
+    Returns:
+        Number of books updated
+    """
+    _ensure_rating_columns()
+
+    totals = {}
+    rows = (db.session.query(Review.book_id, Review.rating, func.count(Review.id))
+            .group_by(Review.book_id, Review.rating)
+            .all())
+    for book_id, rating, count in rows:
+        entry = totals.setdefault(book_id, {name: 0 for name in RATING_COLUMNS})
+        entry['review_count'] += count
+        entry['rating_sum'] += rating * count
+        if 1 <= rating <= 5:
+            entry[f'rating_{rating}_count'] += count
+
+    db.session.execute(
+        update(Book).values({name: 0 for name in RATING_COLUMNS})
+        .execution_options(synchronize_session=False)
+    )
+    if totals:
+        db.session.execute(
+            update(Book),
+            [dict(id=book_id, **values) for book_id, values in totals.items()]
+        )
+    db.session.commit()
+    return len(totals)
+
+
+def init_app(app):
+    """Register the `flask backfill-ratings` command"""
+
+    @app.cli.command('backfill-ratings')
+    def backfill_ratings_command():
+        """Recompute book rating aggregates from existing reviews."""
+        print(f'Rating aggregates rebuilt for {backfill_ratings()} books.')
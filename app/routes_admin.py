@@ -1,7 +1,21 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import (Blueprint, render_template, request, flash, redirect, url_for, jsonify,
+                   Response, stream_with_context, current_app)
 from flask_login import current_user, login_required
 from app.models import db, Book, Category, Order, User, Review
+from app.queries import (books_with_category, categories_with_counts, orders_with_summary,
+                         users_with_counts, query_budget)
+from app.pagination import paginate
+from app.stats import bump, get_stats
+from app.cache import fragment_cache
+from app.auth import identity_cache
+from app.replicas import read_replica
+from app.profiling import request_profiler
+from app.bulk import import_books as run_import, export_books as run_export, detect_format, FORMATS
+from app.reports import REPORTS, REPORT_STATUSES, stream_report
+from app import analytics, inventory, covers
 from functools import wraps
+from datetime import datetime, timedelta
+import io
 
 """
 Admin Blueprint
@@ -29,16 +43,18 @@ def dashboard():
     """
     Admin dashboard with statistics
     """
-    total_users = User.query.count()
-    total_books = Book.query.count()
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(db.func.sum(Order.total_price)).scalar() or 0
+    # Running totals from the store_stat table (see app/stats.py)
+    stats = get_stats()
+    total_users = int(stats['total_users'])
+    total_books = int(stats['total_books'])
+    total_orders = int(stats['total_orders'])
+    total_revenue = stats['total_revenue']
     
     # Recent orders
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+    recent_orders = orders_with_summary().order_by(Order.created_at.desc()).limit(10).all()
     
-    # Low stock books
-    low_stock_books = Book.query.filter(Book.stock < 5).all()
+    # Books below their reorder level (read from the low-stock partial index)
+    low_stock_books = inventory.low_stock_books().order_by(Book.stock, Book.id).limit(10).all()
     
     return render_template('admin/dashboard.html',
                          total_users=total_users,
@@ -49,6 +65,37 @@ def dashboard():
                          low_stock_books=low_stock_books)
 
 
+@admin_bp.route('/analytics')
+@read_replica
+@login_required
+@admin_required
+def analytics_dashboard():
+    """
+    Sales charts: revenue time series, top sellers and category revenue
+    Answered from the daily rollup tables (see app/analytics.py)
+    """
+    days = request.args.get('days', 30, type=int)
+    days = max(1, min(days, 366))
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    
+    series = analytics.daily_series(start, end)
+    top_sellers = analytics.top_sellers(start, end)
+    categories = analytics.category_revenue(start, end)
+    
+    return render_template('admin/analytics.html',
+                         days=days,
+                         start=start,
+                         end=end,
+                         series=series,
+                         top_sellers=top_sellers,
+                         categories=categories,
+                         max_revenue=max([day['revenue'] for day in series] + [0]),
+                         total_revenue=sum(day['revenue'] for day in series),
+                         total_orders=sum(day['orders'] for day in series),
+                         total_units=sum(day['units'] for day in series))
+
+
 @admin_bp.route('/books')
 @login_required
 @admin_required
@@ -56,12 +103,23 @@ def manage_books():
     """
     Manage books
     """
-    page = request.args.get('page', 1, type=int)
-    books = Book.query.paginate(page=page, per_page=10, error_out=False)
+    books = paginate(books_with_category(), [Book.created_at, Book.id], per_page=10, descending=True)
     
     return render_template('admin/manage_books.html', books=books)
 
 
+@admin_bp.route('/inventory/low-stock')
+@login_required
+@admin_required
+def low_stock():
+    """
+    Books below their reorder level, lowest stock first
+    """
+    books = paginate(inventory.low_stock_books(), [Book.stock, Book.id], per_page=20)
+    
+    return render_template('admin/low_stock.html', books=books)
+
+
 @admin_bp.route('/books/add', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -77,6 +135,15 @@ def add_book():
             flash('Title and author are required.', 'danger')
             return render_template('admin/add_book.html', categories=categories)
         
+        cover = None
+        cover_file = request.files.get('cover_file')
+        if cover_file and cover_file.filename:
+            try:
+                cover = covers.ingest(cover_file.read())
+            except covers.InvalidCover as e:
+                flash(str(e), 'danger')
+                return render_template('admin/add_book.html', categories=categories)
+        
         book = Book(
             title=request.form.get('title'),
             author=request.form.get('author'),
@@ -88,12 +155,20 @@ def add_book():
             publisher=request.form.get('publisher'),
             publication_year=int(request.form.get('publication_year', 2024)) if request.form.get('publication_year') else 2024,
             pages=int(request.form.get('pages', 0)) if request.form.get('pages') else 0,
-            language=request.form.get('language', 'English')
+            language=request.form.get('language', 'English'),
+            reorder_threshold=request.form.get('reorder_threshold', type=int)
         )
         
+        if cover is not None:
+            covers.assign_cover(book, cover)
+        
         db.session.add(book)
         try:
+            db.session.flush()
+            inventory.refresh_reorder_levels(Book.id == book.id)
+            bump(total_books=1)
             db.session.commit()
+            fragment_cache.invalidate('catalog')
             flash('Book added successfully!', 'success')
             return redirect(url_for('admin.manage_books'))
         except Exception as e:
@@ -104,6 +179,7 @@ def add_book():
 
 
 @admin_bp.route('/books/<int:book_id>/edit', methods=['GET', 'POST'])
+@query_budget(14)  # a cover, its job and the reorder refresh, or a re-render after a failed save
 @login_required
 @admin_required
 def edit_book(book_id):
@@ -114,20 +190,38 @@ def edit_book(book_id):
     categories = Category.query.all()
     
     if request.method == 'POST':
-        book.title = request.form.get('title', book.title)
-        book.author = request.form.get('author', book.author)
-        book.isbn = request.form.get('isbn', book.isbn)
-        book.description = request.form.get('description', book.description)
-        book.price = float(request.form.get('price', book.price))
-        book.stock = int(request.form.get('stock', book.stock))
-        book.category_id = int(request.form.get('category_id', book.category_id))
-        book.publisher = request.form.get('publisher', book.publisher)
-        book.publication_year = int(request.form.get('publication_year', book.publication_year)) if request.form.get('publication_year') else book.publication_year
-        book.pages = int(request.form.get('pages', book.pages)) if request.form.get('pages') else book.pages
-        book.language = request.form.get('language', book.language)
+        # The cover is stored before the book changes, so its flush cannot
+        # flush a conflicting ISBN outside the try below
+        cover = None
+        cover_file = request.files.get('cover_file')
+        if cover_file and cover_file.filename:
+            try:
+                cover = covers.ingest(cover_file.read())
+            except covers.InvalidCover as e:
+                flash(str(e), 'danger')
+                return render_template('admin/edit_book.html', book=book, categories=categories)
+        
+        with db.session.no_autoflush:
+            book.title = request.form.get('title', book.title)
+            book.author = request.form.get('author', book.author)
+            book.isbn = request.form.get('isbn', book.isbn)
+            book.description = request.form.get('description', book.description)
+            book.price = float(request.form.get('price', book.price))
+            book.stock = int(request.form.get('stock', book.stock))
+            book.category_id = int(request.form.get('category_id', book.category_id))
+            book.publisher = request.form.get('publisher', book.publisher)
+            book.publication_year = int(request.form.get('publication_year', book.publication_year)) if request.form.get('publication_year') else book.publication_year
+            book.pages = int(request.form.get('pages', book.pages)) if request.form.get('pages') else book.pages
+            book.language = request.form.get('language', book.language)
+            book.reorder_threshold = request.form.get('reorder_threshold', type=int)
+            if cover is not None:
+                covers.assign_cover(book, cover)
         
         try:
+            db.session.flush()
+            inventory.refresh_reorder_levels(Book.id == book.id)
             db.session.commit()
+            fragment_cache.invalidate('catalog')
             flash('Book updated successfully!', 'success')
             return redirect(url_for('admin.manage_books'))
         except Exception as e:
@@ -148,7 +242,9 @@ def delete_book(book_id):
     
     try:
         db.session.delete(book)
+        bump(total_books=-1)
         db.session.commit()
+        fragment_cache.invalidate('catalog')
         flash('Book deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -157,6 +253,56 @@ def delete_book(book_id):
     return redirect(url_for('admin.manage_books'))
 
 
+@admin_bp.route('/books/import', methods=['GET', 'POST'])
+@query_budget(None)  # a few statements per chunk, unbounded by design
+@login_required
+@admin_required
+def import_books():
+    """
+    Bulk import books from an uploaded CSV or JSON Lines file
+    The upload is parsed as a stream and written in chunks (see app/bulk.py)
+    """
+    report = None
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import.', 'danger')
+            return render_template('admin/import_books.html', report=report)
+        
+        fmt = request.form.get('format') or detect_format(upload.filename)
+        if fmt not in FORMATS:
+            fmt = 'csv'
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = run_import(stream, fmt)
+        
+        category = 'success' if not report.error_count else 'warning'
+        flash(f'Import finished: {report}.', category)
+    
+    return render_template('admin/import_books.html', report=report)
+
+
+@admin_bp.route('/books/export')
+@read_replica
+@login_required
+@admin_required
+def export_books():
+    """
+    Download the whole catalog as CSV or JSON Lines
+    The file is streamed in chunks, never built in memory
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(run_export(fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=books.{fmt}'}
+    )
+
+
 @admin_bp.route('/categories')
 @login_required
 @admin_required
@@ -164,7 +310,7 @@ def manage_categories():
     """
     Manage categories
     """
-    categories = Category.query.all()
+    categories = categories_with_counts().all()
     return render_template('admin/manage_categories.html', categories=categories)
 
 
@@ -187,11 +333,13 @@ def add_category():
         flash('Category already exists.', 'warning')
         return redirect(url_for('admin.manage_categories'))
     
-    category = Category(name=name, description=description)
+    category = Category(name=name, description=description,
+                        reorder_threshold=request.form.get('reorder_threshold', type=int))
     db.session.add(category)
     
     try:
         db.session.commit()
+        fragment_cache.invalidate('catalog')
         flash('Category added successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -200,6 +348,27 @@ def add_category():
     return redirect(url_for('admin.manage_categories'))
 
 
+@admin_bp.route('/categories/<int:cat_id>/threshold', methods=['POST'])
+@login_required
+@admin_required
+def update_category_threshold(cat_id):
+    """
+    Set a category's reorder threshold and re-resolve its books' reorder levels
+    """
+    category = Category.query.get_or_404(cat_id)
+    category.reorder_threshold = request.form.get('reorder_threshold', type=int)
+    inventory.refresh_reorder_levels(Book.category_id == category.id)
+    
+    try:
+        db.session.commit()
+        flash(f'Reorder threshold for {category.name} updated.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while updating the threshold. Please try again.', 'danger')
+    
+    return redirect(url_for('admin.manage_categories'))
+
+
 @admin_bp.route('/categories/<int:cat_id>/delete', methods=['POST'])
 @login_required
 @admin_required
@@ -210,13 +379,14 @@ def delete_category(cat_id):
     category = Category.query.get_or_404(cat_id)
     
     # Check if category has books
-    if category.books:
+    if Book.query.filter_by(category_id=category.id).first() is not None:
         flash('Cannot delete category with existing books.', 'warning')
         return redirect(url_for('admin.manage_categories'))
     
     try:
         db.session.delete(category)
         db.session.commit()
+        fragment_cache.invalidate('catalog')
         flash('Category deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -232,8 +402,7 @@ def manage_orders():
     """
     Manage orders
     """
-    page = request.args.get('page', 1, type=int)
-    orders = Order.query.order_by(Order.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    orders = paginate(orders_with_summary(), [Order.created_at, Order.id], per_page=10, descending=True)
     
     return render_template('admin/manage_orders.html', orders=orders)
 
@@ -252,7 +421,9 @@ def update_order_status(order_id):
         flash('Invalid status.', 'danger')
         return redirect(url_for('admin.manage_orders'))
     
+    old_status = order.status
     order.status = status
+    analytics.record_order_status_change(order, old_status)
     try:
         db.session.commit()
         flash(f'Order status updated to {status}.', 'success')
@@ -263,6 +434,96 @@ def update_order_status(order_id):
     return redirect(url_for('admin.manage_orders'))
 
 
+@admin_bp.route('/reports/<name>')
+@read_replica
+@login_required
+@admin_required
+def export_report(name):
+    """
+    Download an order report (orders, order-items or revenue)
+    Query args: format (csv / jsonl), start and end (YYYY-MM-DD), status
+    The report is streamed from a database cursor as it is generated
+    """
+    if name not in REPORTS:
+        return redirect(url_for('admin.manage_orders'))
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    status = request.args.get('status') or None
+    if status is not None and status not in REPORT_STATUSES:
+        flash('Invalid status.', 'danger')
+        return redirect(url_for('admin.manage_orders'))
+    try:
+        start, end = [datetime.strptime(request.args[key], '%Y-%m-%d') if request.args.get(key) else None
+                      for key in ('start', 'end')]
+    except ValueError:
+        flash('Dates must be given as YYYY-MM-DD.', 'danger')
+        return redirect(url_for('admin.manage_orders'))
+    
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(stream_report(name, fmt, start, end, status)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+    )
+
+
+@admin_bp.route('/profiling')
+@login_required
+@admin_required
+def profiling():
+    """
+    Request profiles collected by this worker process (see app/profiling.py)
+    """
+    enabled = request_profiler.enabled()
+    name = request.args.get('name')
+    report = request_profiler.report(name) if enabled and name else ''
+    
+    return render_template('admin/profiling.html',
+                         enabled=enabled,
+                         mode=current_app.config['PROFILING_MODE'],
+                         endpoints=request_profiler.summary() if enabled else [],
+                         name=name,
+                         report=report)
+
+
+@admin_bp.route('/profiling/<name>.<fmt>')
+@login_required
+@admin_required
+def download_profile(name, fmt):
+    """
+    Download an endpoint's profile: collapsed stacks (.folded) for flame
+    graphs in 'sample' mode, or a pstats file (.prof) in 'cprofile' mode
+    """
+    body = None
+    if request_profiler.enabled() and fmt in ('folded', 'prof'):
+        body = request_profiler.folded(name) if fmt == 'folded' else request_profiler.dump(name)
+    if not body:
+        flash('No profile of that kind has been collected for this endpoint.', 'warning')
+        return redirect(url_for('admin.profiling'))
+    
+    return Response(
+        body,
+        mimetype='text/plain' if fmt == 'folded' else 'application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+    )
+
+
+@admin_bp.route('/profiling/reset', methods=['POST'])
+@login_required
+@admin_required
+def reset_profiles():
+    """
+    Discard the collected profiles
+    """
+    if request_profiler.enabled():
+        request_profiler.reset()
+        flash('Profiles cleared.', 'success')
+    
+    return redirect(url_for('admin.profiling'))
+
+
 @admin_bp.route('/users')
 @login_required
 @admin_required
@@ -270,8 +531,7 @@ def manage_users():
     """
     Manage users
     """
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(page=page, per_page=10, error_out=False)
+    users = paginate(users_with_counts(), [User.created_at, User.id], per_page=10)
     
     return render_template('admin/manage_users.html', users=users)
 
@@ -292,6 +552,7 @@ def toggle_admin(user_id):
     user.is_admin = not user.is_admin
     try:
         db.session.commit()
+        identity_cache.invalidate(user.id)
         flash(f'User admin status updated.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,308 @@
+import json
+from datetime import datetime
+from flask import Blueprint, current_app, request, abort
+from flask_login import current_user
+from sqlalchemy import case
+from app.models import db, Book, Category, Order, OrderItem, Review, User
+from app.search import book_search
+from app.pagination import keyset_paginate
+
+"""
+JSON API Blueprint (version 1)
+Read-only catalog, review and order endpoints for the mobile app and partner
+feeds. Every endpoint selects only the requested columns (?fields=id,title)
+instead of loading ORM objects, returns compact JSON and supports
+conditional requests through ETag / If-None-Match (single resources also
+through Last-Modified / If-Modified-Since)
+"""
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MAX_PER_PAGE = 100
+
+# Field name -> column expression for every resource; only these can be
+# requested with ?fields=
+BOOK_FIELDS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'isbn': Book.isbn,
+    'description': Book.description,
+    'price': Book.price,
+    'stock': Book.stock,
+    'category_id': Book.category_id,
+    'category': Category.name,
+    'cover_image': Book.cover_image,
+    'publisher': Book.publisher,
+    'publication_year': Book.publication_year,
+    'pages': Book.pages,
+    'language': Book.language,
+    'review_count': Book.review_count,
+    'avg_rating': case((Book.review_count > 0, Book.rating_sum * 1.0 / Book.review_count), else_=0),
+    'created_at': Book.created_at,
+    'updated_at': Book.updated_at,
+}
+BOOK_DEFAULT_FIELDS = ['id', 'title', 'author', 'price', 'stock', 'category_id',
+                       'cover_image', 'avg_rating', 'review_count']
+
+CATEGORY_FIELDS = {
+    'id': Category.id,
+    'name': Category.name,
+    'description': Category.description,
+    'book_count': Category.book_count,
+}
+CATEGORY_DEFAULT_FIELDS = ['id', 'name', 'book_count']
+
+REVIEW_FIELDS = {
+    'id': Review.id,
+    'book_id': Review.book_id,
+    'user': User.username,
+    'rating': Review.rating,
+    'title': Review.title,
+    'content': Review.content,
+    'created_at': Review.created_at,
+    'updated_at': Review.updated_at,
+}
+REVIEW_DEFAULT_FIELDS = ['id', 'user', 'rating', 'title', 'content', 'created_at']
+
+ORDER_FIELDS = {
+    'id': Order.id,
+    'user_id': Order.user_id,
+    'status': Order.status,
+    'total_price': Order.total_price,
+    'item_count': Order.item_count,
+    'shipping_address': Order.shipping_address,
+    'shipping_city': Order.shipping_city,
+    'shipping_postal': Order.shipping_postal,
+    'created_at': Order.created_at,
+    'updated_at': Order.updated_at,
+}
+ORDER_DEFAULT_FIELDS = ['id', 'status', 'total_price', 'item_count', 'created_at']
+
+
+def requested_fields(available, default):
+    """
+    Field names selected by the ?fields= query argument
+    Args:
+        available: Mapping of field name to column for the resource
+        default: Fields returned when ?fields= is absent
+    Returns:
+        List of field names in request order
+    """
+    raw = request.args.get('fields', '')
+    if not raw:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        abort(400, description=f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def projection(available, fields, *required):
+    """
+    Labelled columns to select: the requested fields plus any columns the
+    endpoint needs itself (sort keys, updated_at)
+    """
+    names = list(dict.fromkeys(list(fields) + list(required)))
+    return [available[name].label(name) for name in names]
+
+
+def serialize(row, fields):
+    """Turn a result row into a dict holding only the requested fields"""
+    item = {}
+    for name in fields:
+        value = getattr(row, name)
+        if isinstance(value, datetime):
+            value = value.isoformat() + 'Z'
+        elif isinstance(value, float):
+            value = round(value, 2)
+        item[name] = value
+    return item
+
+
+def per_page_arg(default=20):
+    """?per_page= clamped to 1..MAX_PER_PAGE"""
+    return max(1, min(request.args.get('per_page', default, type=int), MAX_PER_PAGE))
+
+
+def json_response(payload, last_modified=None, private=False):
+    """
+    Compact JSON response with validators for conditional requests
+    The ETag is a hash of the body; a matching If-None-Match (or
+    If-Modified-Since, when last_modified is given) turns the response into
+    a bodiless 304
+    Args:
+        payload: Data to serialize
+        last_modified: updated_at of a single resource. Listings leave it
+                       out: the newest row does not change when rows are
+                       deleted or joined values are edited
+        private: Per-user data that shared caches must not store
+    Returns:
+        Response object
+    """
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.add_etag()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if private:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    else:
+        response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+
+def keyset_payload(pagination, fields):
+    """Listing payload for a KeysetPagination of result rows"""
+    return {
+        'items': [serialize(row, fields) for row in pagination.items],
+        'total': pagination.total,
+        'next_cursor': pagination.next_cursor,
+        'prev_cursor': pagination.prev_cursor,
+    }
+
+
+def require_login():
+    """Abort with 401 unless a user is logged in (no login page redirect)"""
+    if not current_user.is_authenticated:
+        abort(401, description='Login required')
+
+
+def api_error(error):
+    """Report errors raised in API views as JSON"""
+    return current_app.response_class(
+        json.dumps({'error': {'status': error.code, 'message': error.description}},
+                   separators=(',', ':')),
+        status=error.code,
+        mimetype='application/json'
+    )
+
+
+# Registered per status code so they take precedence over the app's HTML
+# error pages for requests handled by this blueprint
+for code in (400, 401, 403, 404):
+    api_bp.register_error_handler(code, api_error)
+
+
+@api_bp.route('/books')
+def books():
+    """
+    Book listing
+    Query args: fields, category, search, per_page, cursor (keyset paging by
+    title) or page (search results, ordered by relevance)
+    """
+    fields = requested_fields(BOOK_FIELDS, BOOK_DEFAULT_FIELDS)
+    category_id = request.args.get('category', 0, type=int)
+    search = request.args.get('search', '', type=str)
+    per_page = per_page_arg()
+
+    query = (db.session.query(*projection(BOOK_FIELDS, fields, 'id', 'title'))
+             .select_from(Book)
+             .join(Category, Book.category_id == Category.id))
+    if category_id:
+        query = query.filter(Book.category_id == category_id)
+
+    if search:
+        page = max(request.args.get('page', 1, type=int), 1)
+        results = book_search.search(query, search).paginate(page=page, per_page=per_page,
+                                                             error_out=False)
+        payload = {
+            'items': [serialize(row, fields) for row in results.items],
+            'total': results.total,
+            'page': results.page,
+            'pages': results.pages,
+        }
+        return json_response(payload)
+
+    pagination = keyset_paginate(query, [Book.title, Book.id], cursor=request.args.get('cursor'),
+                                 per_page=per_page)
+    return json_response(keyset_payload(pagination, fields))
+
+
+@api_bp.route('/books/<int:book_id>')
+def book(book_id):
+    """Single book"""
+    fields = requested_fields(BOOK_FIELDS, BOOK_DEFAULT_FIELDS + ['description', 'isbn'])
+    row = (db.session.query(*projection(BOOK_FIELDS, fields, 'updated_at'))
+           .select_from(Book)
+           .join(Category, Book.category_id == Category.id)
+           .filter(Book.id == book_id)
+           .first())
+    if row is None:
+        abort(404, description='Book not found')
+    return json_response(serialize(row, fields), row.updated_at)
+
+
+@api_bp.route('/books/<int:book_id>/reviews')
+def book_reviews(book_id):
+    """A book's reviews, newest first (keyset paging by created_at)"""
+    fields = requested_fields(REVIEW_FIELDS, REVIEW_DEFAULT_FIELDS)
+    query = (db.session.query(*projection(REVIEW_FIELDS, fields, 'id', 'created_at'))
+             .select_from(Review)
+             .join(User, Review.user_id == User.id)
+             .filter(Review.book_id == book_id))
+    pagination = keyset_paginate(query, [Review.created_at, Review.id],
+                                 cursor=request.args.get('cursor'), per_page=per_page_arg(),
+                                 descending=True, count='none')
+    if not pagination.items and db.session.get(Book, book_id) is None:
+        abort(404, description='Book not found')
+    return json_response(keyset_payload(pagination, fields))
+
+
+@api_bp.route('/categories')
+def categories():
+    """All categories"""
+    fields = requested_fields(CATEGORY_FIELDS, CATEGORY_DEFAULT_FIELDS)
+    rows = (db.session.query(*projection(CATEGORY_FIELDS, fields))
+            .order_by(Category.name)
+            .all())
+    return json_response({'items': [serialize(row, fields) for row in rows]})
+
+
+@api_bp.route('/orders')
+def orders():
+    """
+    The current user's orders, newest first (all orders for admins)
+    Requires a logged-in session
+    """
+    require_login()
+    fields = requested_fields(ORDER_FIELDS, ORDER_DEFAULT_FIELDS)
+    query = db.session.query(*projection(ORDER_FIELDS, fields, 'id', 'created_at'))
+    if not current_user.is_admin:
+        query = query.filter(Order.user_id == current_user.id)
+    pagination = keyset_paginate(query, [Order.created_at, Order.id],
+                                 cursor=request.args.get('cursor'), per_page=per_page_arg(),
+                                 descending=True)
+    return json_response(keyset_payload(pagination, fields), private=True)
+
+
+@api_bp.route('/orders/<int:order_id>')
+def order(order_id):
+    """Single order with its line items"""
+    require_login()
+    fields = requested_fields(ORDER_FIELDS, ORDER_DEFAULT_FIELDS + ['shipping_address', 'shipping_city',
+                                                                    'shipping_postal'])
+    row = (db.session.query(*projection(ORDER_FIELDS, fields, 'user_id', 'updated_at'))
+           .filter(Order.id == order_id)
+           .first())
+    # Other users' orders are reported as missing rather than forbidden
+    if row is None or (row.user_id != current_user.id and not current_user.is_admin):
+        abort(404, description='Order not found')
+
+    items = (db.session.query(OrderItem.book_id, Book.title, OrderItem.quantity,
+                              OrderItem.price_at_purchase)
+             .join(Book, OrderItem.book_id == Book.id)
+             .filter(OrderItem.order_id == order_id)
+             .order_by(OrderItem.id)
+             .all())
+    payload = serialize(row, fields)
+    payload['items'] = [
+        {'book_id': item.book_id, 'title': item.title, 'quantity': item.quantity,
+         'price': item.price_at_purchase}
+        for item in items
+    ]
+    return json_response(payload, row.updated_at, private=True)
@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session
 from flask_login import login_user, logout_user, current_user, login_required
-from app.models import db, User, Book, Category
+from app.models import db, User, Book, Category, Order, Review
 from app.forms import RegistrationForm, LoginForm, UpdateProfileForm
+from app.stats import bump
+from app.passwords import password_hasher
+from app.auth import identity_cache
 
 """
 Authentication Blueprint
@@ -33,6 +36,7 @@ def register():
         
         # Add user to database
         db.session.add(user)
+        bump(total_users=1)
         try:
             db.session.commit()
             flash('Registration successful! You can now log in.', 'success')
@@ -57,10 +61,21 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        # Find user by email
+        # Find user by email; unknown emails are checked against a dummy hash
+        # so they take as long to reject as a wrong password
         user = User.query.filter_by(email=form.email.data).first()
+        if user:
+            password_ok = user.check_password(form.password.data)
+        else:
+            password_ok = password_hasher.verify(None, form.password.data)
         
-        if user and user.check_password(form.password.data):
+        if password_ok:
+            # Save a hash upgraded to the current PASSWORD_HASH_METHOD
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+            
             # Login user and create session
             login_user(user, remember=form.remember_me.data)
             flash(f'Welcome back, {user.full_name}!', 'success')
@@ -83,6 +98,7 @@ def logout():
     User logout route
     Clears session and logs out user
     """
+    identity_cache.invalidate(current_user.id)
     logout_user()
     session.clear()
     flash('You have been logged out successfully.', 'info')
@@ -95,7 +111,10 @@ def profile():
     """
     View user profile
     """
-    return render_template('auth/profile.html', user=current_user)
+    order_count = Order.query.filter_by(user_id=current_user.id).count()
+    review_count = Review.query.filter_by(user_id=current_user.id).count()
+    return render_template('auth/profile.html', user=current_user,
+                           order_count=order_count, review_count=review_count)
 
 
 @auth_bp.route('/profile/edit', methods=['GET', 'POST'])
@@ -109,15 +128,18 @@ def edit_profile():
     form = UpdateProfileForm()
     
     if form.validate_on_submit():
-        current_user.full_name = form.full_name.data
-        current_user.email = form.email.data
-        current_user.phone = form.phone.data
-        current_user.address = form.address.data
-        current_user.city = form.city.data
-        current_user.postal_code = form.postal_code.data
+        # current_user is a read-only snapshot; change the User row itself
+        user = db.session.get(User, current_user.id)
+        user.full_name = form.full_name.data
+        user.email = form.email.data
+        user.phone = form.phone.data
+        user.address = form.address.data
+        user.city = form.city.data
+        user.postal_code = form.postal_code.data
         
         try:
             db.session.commit()
+            identity_cache.invalidate(user.id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('auth.profile'))
         except Exception as e:
@@ -1,7 +1,19 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session
 from flask_login import current_user, login_required
+from sqlalchemy import insert
 from app.models import db, Book, Category, Order, OrderItem, Review
 from app.forms import ReviewForm, ContactForm
+from app.search import book_search
+from app.queries import (books_with_category, categories_with_counts,
+                         orders_with_summary, order_with_items, query_budget)
+from app.cart import price_cart, cart_store
+from app.inventory import reserve_stock, notify_low_stock, InsufficientStock
+from app.reviews import apply_review, reviews_page
+from app.pagination import decode_cursor, paginate
+from app.stats import bump
+from app.analytics import record_sale
+from app.jobs import job_queue
+from app.replicas import read_replica
 
 """
 Main Blueprint
@@ -12,15 +24,19 @@ main_bp = Blueprint('main', __name__)
 
 
 @main_bp.route('/')
+@read_replica
 def home():
     """
     Home page route
     Displays featured books and categories
+    Data is passed as loaders so cached fragments skip the queries entirely
     """
-    # Get featured books (limit to 8)
-    featured_books = Book.query.order_by(Book.created_at.desc()).limit(8).all()
-    # Get all categories
-    categories = Category.query.all()
+    def featured_books():
+        # Newest 8 books
+        return books_with_category().order_by(Book.created_at.desc()).limit(8).all()
+    
+    def categories():
+        return categories_with_counts().all()
     
     return render_template('main/home.html', 
                          featured_books=featured_books, 
@@ -28,60 +44,64 @@ def home():
 
 
 @main_bp.route('/books')
+@read_replica
 def books():
     """
     Books listing page route
     Displays all books with pagination and filtering
     """
-    page = request.args.get('page', 1, type=int)
     category_id = request.args.get('category', 0, type=int)
     search = request.args.get('search', '', type=str)
+    page = request.args.get('page', type=int)
+    order = [Book.title, Book.id]
+    cursor = decode_cursor(request.args.get('cursor'), len(order))
     
-    query = Book.query
-    
-    # Filter by category if specified
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    # Search by title or author
-    if search:
-        query = query.filter(
-            (Book.title.ilike(f'%{search}%')) |
-            (Book.author.ilike(f'%{search}%'))
-        )
+    def load_results():
+        query = books_with_category()
+        
+        # Filter by category if specified
+        if category_id:
+            query = query.filter_by(category_id=category_id)
+        
+        # Paginate results (12 books per page)
+        if search:
+            # Full-text search over title, author, description, publisher and
+            # ISBN, ordered by relevance (rank cannot be keyset-paginated)
+            query = book_search.search(query, search)
+            return query.paginate(page=page or 1, per_page=12, error_out=False)
+        return paginate(query, order, per_page=12)
     
-    # Paginate results (12 books per page)
-    pagination = query.paginate(page=page, per_page=12, error_out=False)
-    books = pagination.items
-    categories = Category.query.all()
+    def categories():
+        return categories_with_counts().all()
     
+    # Results and sidebar are cached fragments keyed by the parsed query
+    # args; the loaders only run on a cache miss
     return render_template('main/books.html',
-                         books=books,
-                         pagination=pagination,
+                         load_results=load_results,
                          categories=categories,
                          search=search,
-                         category_id=category_id)
+                         category_id=category_id,
+                         page=page,
+                         cursor=cursor)
 
 
 @main_bp.route('/book/<int:book_id>')
+@read_replica
 def book_detail(book_id):
     """
     Book detail page route
     Displays book information and reviews
     """
     book = Book.query.get_or_404(book_id)
-    reviews = Review.query.filter_by(book_id=book_id).order_by(Review.created_at.desc()).all()
+    reviews = reviews_page(book_id, cursor=request.args.get('cursor'))
     form = ReviewForm()
     
-    # Calculate average rating
-    avg_rating = 0
-    if reviews:
-        avg_rating = sum(r.rating for r in reviews) / len(reviews)
-    
+    # Average rating comes from the aggregates stored on the book
     return render_template('main/book_detail.html',
                          book=book,
-                         reviews=reviews,
-                         avg_rating=avg_rating,
+                         reviews=reviews.items,
+                         review_pagination=reviews,
+                         avg_rating=book.avg_rating,
                          form=form)
 
 
@@ -115,6 +135,7 @@ def add_review(book_id):
         )
         
         db.session.add(review)
+        apply_review(book_id, review.rating)
         try:
             db.session.commit()
             flash('Your review has been posted successfully!', 'success')
@@ -125,30 +146,38 @@ def add_review(book_id):
     return redirect(url_for('main.book_detail', book_id=book_id))
 
 
-@main_bp.route('/cart')
-def view_cart():
+@main_bp.route('/review/<int:review_id>/delete', methods=['POST'])
+@login_required
+def delete_review(review_id):
     """
-    View shopping cart
+    Delete a review (its author or an admin)
     """
-    cart = session.get('cart', {})
-    books = []
-    total_price = 0
+    review = Review.query.get_or_404(review_id)
+    book_id = review.book_id
     
-    if not cart:
-        return render_template('main/cart.html', books=[], total_price=0)
+    if review.user_id != current_user.id and not current_user.is_admin:
+        flash('You do not have permission to delete this review.', 'danger')
+        return redirect(url_for('main.book_detail', book_id=book_id))
     
-    for book_id, quantity in cart.items():
-        book = Book.query.get(book_id)
-        if book:
-            item_total = book.price * quantity
-            books.append({
-                'book': book,
-                'quantity': quantity,
-                'item_total': item_total
-            })
-            total_price += item_total
+    apply_review(book_id, review.rating, delta=-1)
+    db.session.delete(review)
+    try:
+        db.session.commit()
+        flash('Review deleted.', 'info')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while deleting the review. Please try again.', 'danger')
     
-    return render_template('main/cart.html', books=books, total_price=total_price)
+    return redirect(url_for('main.book_detail', book_id=book_id))
+
+
+@main_bp.route('/cart')
+def view_cart():
+    """
+    View shopping cart
+    """
+    priced = price_cart(cart_store.get())
+    return render_template('main/cart.html', books=priced.lines, total_price=priced.total_price)
 
 
 @main_bp.route('/cart/add/<int:book_id>', methods=['POST'])
@@ -158,17 +187,7 @@ def add_to_cart(book_id):
     """
     book = Book.query.get_or_404(book_id)
     
-    if 'cart' not in session:
-        session['cart'] = {}
-    
-    cart = session['cart']
-    
-    if str(book_id) in cart:
-        cart[str(book_id)] += 1
-    else:
-        cart[str(book_id)] = 1
-    
-    session.modified = True
+    cart_store.add(book.id)
     flash(f'"{book.title}" added to cart!', 'success')
     return redirect(request.referrer or url_for('main.books'))
 
@@ -178,45 +197,61 @@ def remove_from_cart(book_id):
     """
     Remove book from shopping cart
     """
-    if 'cart' in session and str(book_id) in session['cart']:
-        del session['cart'][str(book_id)]
-        session.modified = True
-        flash('Item removed from cart.', 'info')
+    cart_store.remove(book_id)
+    flash('Item removed from cart.', 'info')
+    
+    return redirect(url_for('main.view_cart'))
+
+
+@main_bp.route('/cart/update', methods=['POST'])
+def update_cart():
+    """
+    Bulk update cart quantities
+    Expects one quantity-<book_id> field per cart line; 0 removes the line
+    """
+    quantities = {}
+    for field, value in request.form.items():
+        if field.startswith('quantity-'):
+            try:
+                quantities[int(field[len('quantity-'):])] = int(value)
+            except ValueError:
+                continue
     
+    cart_store.set_quantities(quantities)
+    flash('Cart updated.', 'info')
     return redirect(url_for('main.view_cart'))
 
 
 @main_bp.route('/checkout', methods=['GET', 'POST'])
+@query_budget(12)  # order, items, stats, two sales rollups and a job are all written
 @login_required
 def checkout():
     """
     Checkout and place order
     """
-    cart = session.get('cart', {})
+    cart = cart_store.get()
     
     if not cart:
         flash('Your cart is empty.', 'warning')
         return redirect(url_for('main.books'))
     
+    priced = price_cart(cart)
+    
     if request.method == 'POST':
-        # Calculate total price
-        total_price = 0
-        order_items = []
-        
-        for book_id, quantity in cart.items():
-            book = Book.query.get(book_id)
-            if book:
-                total_price += book.price * quantity
-                order_items.append({
-                    'book_id': book_id,
-                    'quantity': quantity,
-                    'price': book.price
-                })
+        # Reserve stock atomically for every line before creating the order
+        try:
+            low_stock = reserve_stock({line['book'].id: line['quantity'] for line in priced.lines})
+        except InsufficientStock as e:
+            db.session.rollback()
+            for shortage in e.shortages:
+                flash(f'Insufficient stock for {shortage["title"]}: '
+                      f'{shortage["available"]} available, {shortage["requested"]} requested.', 'danger')
+            return redirect(url_for('main.view_cart'))
         
         # Create order
         order = Order(
             user_id=current_user.id,
-            total_price=total_price,
+            total_price=priced.total_price,
             status='Pending',
             shipping_address=current_user.address,
             shipping_city=current_user.city,
@@ -226,42 +261,46 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # Get order ID without committing
         
-        # Add order items
-        for item in order_items:
-            book = Book.query.get(item['book_id'])
-            if book and book.stock >= item['quantity']:
-                order_item = OrderItem(
-                    order_id=order.id,
-                    book_id=item['book_id'],
-                    quantity=item['quantity'],
-                    price_at_purchase=item['price']
-                )
-                book.stock -= item['quantity']
-                db.session.add(order_item)
-            else:
-                db.session.rollback()
-                flash(f'Insufficient stock for {book.title if book else "this book"}.', 'danger')
-                return redirect(url_for('main.view_cart'))
+        # Add order items in one batched INSERT (books were already loaded
+        # by price_cart)
+        db.session.execute(insert(OrderItem), [
+            {
+                'order_id': order.id,
+                'book_id': line['book'].id,
+                'quantity': line['quantity'],
+                'price_at_purchase': line['book'].price
+            }
+            for line in priced.lines
+        ])
+        bump(total_orders=1, total_revenue=priced.total_price)
+        record_sale(order.created_at.date(), [
+            {
+                'book_id': line['book'].id,
+                'category_id': line['book'].category_id,
+                'quantity': line['quantity'],
+                'price': line['book'].price
+            }
+            for line in priced.lines
+        ])
+        
+        job_queue.enqueue('send_order_confirmation', order_id=order.id)
+        
+        # Read these before commit expires the loaded objects
+        order_id = order.id
+        cart_id = cart_store.cart_id()
         
         try:
             db.session.commit()
-            session['cart'] = {}
-            session.modified = True
+            notify_low_stock(low_stock)
+            cart_store.clear(cart_id)
             flash('Order placed successfully!', 'success')
-            return redirect(url_for('main.order_detail', order_id=order.id))
+            return redirect(url_for('main.order_detail', order_id=order_id))
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while placing your order. Please try again.', 'danger')
             return redirect(url_for('main.view_cart'))
     
-    # Calculate cart total
-    total_price = 0
-    for book_id, quantity in cart.items():
-        book = Book.query.get(book_id)
-        if book:
-            total_price += book.price * quantity
-    
-    return render_template('main/checkout.html', total_price=total_price)
+    return render_template('main/checkout.html', total_price=priced.total_price)
 
 
 @main_bp.route('/dashboard')
@@ -270,7 +309,8 @@ def dashboard():
     """
     User dashboard
     """
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
+    orders = (orders_with_summary(Order.query.filter_by(user_id=current_user.id))
+              .order_by(Order.created_at.desc()).all())
     return render_template('main/dashboard.html', orders=orders)
 
 
@@ -280,7 +320,7 @@ def order_detail(order_id):
     """
     View order details
     """
-    order = Order.query.get_or_404(order_id)
+    order = order_with_items(order_id)
     
     # Check if order belongs to current user
     if order.user_id != current_user.id and not current_user.is_admin:
@@ -298,8 +338,18 @@ def contact():
     form = ContactForm()
     
     if form.validate_on_submit():
-        # In a real application, you would send an email here
-        flash('Thank you for your message. We will get back to you soon!', 'success')
-        return redirect(url_for('main.home'))
+        # Delivered by a background job (see app/mailer.py)
+        job_queue.enqueue('deliver_contact_message',
+                          name=form.name.data,
+                          email=form.email.data,
+                          subject=form.subject.data,
+                          message=form.message.data)
+        try:
+            db.session.commit()
+            flash('Thank you for your message. We will get back to you soon!', 'success')
+            return redirect(url_for('main.home'))
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while sending your message. Please try again.', 'danger')
     
     return render_template('main/contact.html', form=form)
@@ -0,0 +1,263 @@
+import re
+from flask import current_app
+from sqlalchemy import text, func, literal_column, table, column, Integer
+from app.models import db, Book
+
+"""
+Full-text search for the book catalog
+Keeps a search index of title, author, description, publisher and ISBN in sync
+with the book table and returns relevance-ranked Book queries
+"""
+
+# Columns covered by the search index, in index order
+SEARCHABLE_FIELDS = ('title', 'author', 'description', 'publisher', 'isbn')
+
+# Relevance weight per indexed column (same order as SEARCHABLE_FIELDS)
+FIELD_WEIGHTS = (10.0, 6.0, 1.0, 2.0, 10.0)
+
+_TOKEN_RE = re.compile(r'[\w-]+', re.UNICODE)
+
+
+def tokenize(search):
+    """
+    Split a raw search string into normalized search terms
+    Hyphens inside ISBN-like terms are dropped so '978-0743273565'
+    and '9780743273565' find the same book
+    Args:
+        search: Raw search string from the user
+    Returns:
+        List of lowercase terms
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(search.lower()):
+        if token.replace('-', '').isdigit():
+            token = token.replace('-', '')
+        else:
+            token = token.replace('-', ' ')
+        terms.extend(t for t in token.split() if t)
+    return terms
+
+
+class LikeSearchBackend:
+    """
+    Fallback backend for databases without full-text support
+    Matches every term against all searchable columns with ILIKE
+    """
+    name = 'like'
+
+    def create_index(self):
+        """Nothing to create for LIKE matching"""
+
+    def rebuild_index(self):
+        """Nothing to rebuild for LIKE matching"""
+
+    def search(self, query, terms):
+        for term in terms:
+            pattern = f'%{term}%'
+            query = query.filter(
+                Book.title.ilike(pattern) |
+                Book.author.ilike(pattern) |
+                Book.description.ilike(pattern) |
+                Book.publisher.ilike(pattern) |
+                func.replace(Book.isbn, '-', '').ilike(pattern)
+            )
+        return query.order_by(Book.title, Book.id)
+
+
+class SQLiteFTSBackend:
+    """
+    SQLite FTS5 backend
+    The book_fts virtual table is maintained by triggers on the book table,
+    so inserts, updates and deletes from any code path keep it in sync
+    """
+    name = 'sqlite_fts5'
+
+    fts = table('book_fts', column('rowid', Integer))
+
+    _index_row = (
+        "new.id, new.title, new.author, coalesce(new.description, ''), "
+        "coalesce(new.publisher, ''), new.isbn || ' ' || replace(new.isbn, '-', '')"
+    )
+
+    def create_index(self):
+        """Create the FTS5 table and sync triggers, populating it on first run"""
+        exists = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_fts'"
+        )).first()
+
+        statements = [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5("
+            "title, author, description, publisher, isbn, "
+            "tokenize = 'unicode61 remove_diacritics 2')",
+            "CREATE TRIGGER IF NOT EXISTS book_fts_ai AFTER INSERT ON book BEGIN "
+            f"INSERT INTO book_fts (rowid, {', '.join(SEARCHABLE_FIELDS)}) VALUES ({self._index_row}); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS book_fts_ad AFTER DELETE ON book BEGIN "
+            "DELETE FROM book_fts WHERE rowid = old.id; "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS book_fts_au AFTER UPDATE OF "
+            f"{', '.join(SEARCHABLE_FIELDS)} ON book BEGIN "
+            "DELETE FROM book_fts WHERE rowid = old.id; "
+            f"INSERT INTO book_fts (rowid, {', '.join(SEARCHABLE_FIELDS)}) VALUES ({self._index_row}); "
+            "END",
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+        if not exists:
+            self.rebuild_index()
+
+    def rebuild_index(self):
+        """Repopulate book_fts from the book table"""
+        db.session.execute(text("DELETE FROM book_fts"))
+        db.session.execute(text(
+            f"INSERT INTO book_fts (rowid, {', '.join(SEARCHABLE_FIELDS)}) "
+            f"SELECT {self._index_row.replace('new.', '')} FROM book"
+        ))
+        db.session.commit()
+
+    def search(self, query, terms):
+        # Every term is quoted (so FTS5 operators in user input are inert)
+        # and prefix-matched so results appear while the user is still typing
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        rank = func.bm25(literal_column('book_fts'), *FIELD_WEIGHTS)
+        return (query
+                .join(self.fts, self.fts.c.rowid == Book.id)
+                .filter(literal_column('book_fts').op('MATCH')(match))
+                .order_by(rank, Book.id))
+
+
+class PostgresSearchBackend:
+    """
+    PostgreSQL tsvector backend
+    Ranks with ts_rank over a weighted document vector that is backed by a
+    GIN expression index, so no extra column has to be kept in sync
+    """
+    name = 'postgres_tsvector'
+
+    # Constants in the document expression are inlined rather than bound so
+    # the query expression matches the index expression exactly
+    config = literal_column("'simple'::regconfig")
+
+    def _document(self):
+        def literal(value):
+            return literal_column(f"'{value}'")
+
+        def weighted(expression, weight):
+            return func.setweight(
+                func.to_tsvector(self.config, func.coalesce(expression, literal(''))),
+                literal(weight)
+            )
+
+        isbn = Book.isbn.op('||')(literal(' ')).op('||')(
+            func.replace(Book.isbn, literal('-'), literal(''))
+        )
+        return (weighted(Book.title, 'A')
+                .op('||')(weighted(isbn, 'A'))
+                .op('||')(weighted(Book.author, 'B'))
+                .op('||')(weighted(Book.publisher, 'C'))
+                .op('||')(weighted(Book.description, 'D')))
+
+    def create_index(self):
+        """Create the GIN expression index used by search()"""
+        document = self._document().compile(dialect=db.engine.dialect)
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_book_search_document ON book USING gin (({document}))"
+        ))
+        db.session.commit()
+
+    def rebuild_index(self):
+        """Rebuild the GIN expression index"""
+        db.session.execute(text("REINDEX INDEX ix_book_search_document"))
+        db.session.commit()
+
+    def search(self, query, terms):
+        tsquery = func.to_tsquery(self.config, ' & '.join(
+            "'{}':*".format(term.replace("'", "''")) for term in terms
+        ))
+        document = self._document()
+        return (query
+                .filter(document.op('@@')(tsquery))
+                .order_by(func.ts_rank(document, tsquery).desc(), Book.id))
+
+
+BACKENDS = {
+    'like': LikeSearchBackend,
+    'sqlite_fts5': SQLiteFTSBackend,
+    'postgres_tsvector': PostgresSearchBackend,
+}
+
+
+def _sqlite_has_fts5():
+    """Check whether the SQLite library was compiled with FTS5"""
+    options = db.session.execute(text("PRAGMA compile_options")).scalars().all()
+    return 'ENABLE_FTS5' in options
+
+
+class BookSearch:
+    """
+    Book search extension
+    Picks a backend from the SEARCH_BACKEND setting ('auto' selects one from
+    the database dialect) and exposes search(), create_index() and a
+    `flask rebuild-search-index` command
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.extensions['book_search'] = {}
+
+        @app.cli.command('rebuild-search-index')
+        def rebuild_search_index():
+            """Rebuild the book full-text search index."""
+            self.create_index()
+            self.rebuild_index()
+            print(f'Search index rebuilt ({self.backend.name}).')
+
+    @property
+    def backend(self):
+        """Backend instance for the current application"""
+        state = current_app.extensions['book_search']
+        if 'backend' not in state:
+            state['backend'] = BACKENDS[self._backend_name()]()
+        return state['backend']
+
+    def _backend_name(self):
+        name = current_app.config['SEARCH_BACKEND']
+        if name != 'auto':
+            return name
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite' and _sqlite_has_fts5():
+            return 'sqlite_fts5'
+        if dialect == 'postgresql':
+            return 'postgres_tsvector'
+        return 'like'
+
+    def create_index(self):
+        """Create the search index structures if they do not exist yet"""
+        self.backend.create_index()
+
+    def rebuild_index(self):
+        """Rebuild the search index from the book table"""
+        self.backend.rebuild_index()
+
+    def search(self, query, search):
+        """
+        Restrict a Book query to books matching the search string
+        Args:
+            query: Book query (may already carry filters such as category)
+            search: Raw search string
+        Returns:
+            Query ordered by relevance, ready for paginate()
+        """
+        terms = tokenize(search)
+        if not terms:
+            return query
+        return self.backend.search(query, terms)
+
+
+book_search = BookSearch()
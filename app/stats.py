@@ -0,0 +1,107 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, select, update
+from app.models import db, User, Book, Order, StoreStat
+from app.jobs import job_queue
+
+"""
+Store statistics
+Keeps the admin dashboard totals in the store_stat table. Code paths that
+create or remove users, books and orders adjust the totals in their own
+transaction; reconcile() recomputes them from the source tables, either on a
+schedule (`flask reconcile-stats`) or when they are older than
+STATS_MAX_STALENESS.
+"""
+
+# Statistic name -> scalar subquery computing it from the source tables
+STATISTICS = {
+    'total_users': select(func.count(User.id)).scalar_subquery(),
+    'total_books': select(func.count(Book.id)).scalar_subquery(),
+    'total_orders': select(func.count(Order.id)).scalar_subquery(),
+    'total_revenue': select(func.coalesce(func.sum(Order.total_price), 0)).scalar_subquery(),
+}
+
+
+def bump(**deltas):
+    """
+    Adjust running totals in the current transaction
+    All deltas are applied with a single UPDATE; the caller commits
+    Example:
+        bump(total_orders=1, total_revenue=order.total_price)
+    Args:
+        **deltas: Statistic name to amount added (negative to subtract)
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    unknown = set(deltas) - set(STATISTICS)
+    if unknown:
+        raise KeyError(f'Unknown statistics: {", ".join(sorted(unknown))}')
+
+    db.session.execute(
+        update(StoreStat)
+        .where(StoreStat.name.in_(deltas))
+        .values(value=StoreStat.value + case(deltas, value=StoreStat.name, else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile():
+    """
+    Recompute every statistic from the source tables
+    All aggregates are computed by one SELECT and written back in one batch
+    Returns:
+        Dict of statistic name to value
+    """
+    now = datetime.utcnow()
+    row = db.session.execute(
+        select(*[expression.label(name) for name, expression in STATISTICS.items()])
+    ).one()
+    values = dict(row._mapping)
+
+    db.session.execute(delete(StoreStat).where(StoreStat.name.in_(STATISTICS)))
+    db.session.execute(insert(StoreStat), [
+        {'name': name, 'value': value, 'reconciled_at': now} for name, value in values.items()
+    ])
+    db.session.commit()
+    return values
+
+
+def get_stats():
+    """
+    Current statistics in one query
+    Falls back to reconcile() when a statistic is missing; when they were
+    last reconciled longer ago than STATS_MAX_STALENESS a background
+    reconcile is queued and the current values are returned meanwhile
+    Returns:
+        Dict of statistic name to value
+    """
+    rows = StoreStat.query.filter(StoreStat.name.in_(STATISTICS)).all()
+    if len(rows) < len(STATISTICS):
+        return reconcile()
+
+    stats = {row.name: row.value for row in rows}
+    max_staleness = current_app.config['STATS_MAX_STALENESS']
+    oldest = min(row.reconciled_at or datetime.min for row in rows)
+    if max_staleness is not None and datetime.utcnow() - oldest > max_staleness:
+        if job_queue.enqueue('reconcile_stats', unique=True):
+            db.session.commit()
+
+    return stats
+
+
+@job_queue.task('reconcile_stats', max_attempts=3)
+def reconcile_stats():
+    """Background job wrapper around reconcile()"""
+    reconcile()
+
+
+def init_app(app):
+    """Register the `flask reconcile-stats` command"""
+    app.config.setdefault('STATS_MAX_STALENESS', None)
+
+    @app.cli.command('reconcile-stats')
+    def reconcile_stats_command():
+        """Recompute the admin dashboard statistics (run periodically)."""
+        for name, value in reconcile().items():
+            print(f'{name}: {value:g}')
@@ -0,0 +1,90 @@
+"""
+Concurrent checkout benchmark
+Many workers reserve the same hot title at once through app.inventory and the
+run verifies that stock is never oversold
+
+Usage:
+    python benchmarks/checkout_concurrency.py [--workers 16] [--orders 2000] [--stock 1000]
+
+Set DATABASE_URL to benchmark against PostgreSQL/MySQL instead of a
+temporary SQLite file.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import create_benchmark_app, database_uri
+from sqlalchemy.exc import OperationalError
+from app.bootstrap import bootstrap
+from app.models import db, Book
+from app.inventory import reserve_stock, InsufficientStock
+
+
+def run(workers, orders, stock, quantity):
+    uri, db_file = database_uri()
+    app = create_benchmark_app(uri)
+    with app.app_context():
+        bootstrap()
+        book = db.session.get(Book, 1)
+        book.stock = stock
+        db.session.commit()
+
+    counts = {'reserved': 0, 'short': 0, 'errors': 0}
+    lock = threading.Lock()
+    remaining = iter(range(orders))
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                try:
+                    reserve_stock({1: quantity})
+                    db.session.commit()
+                    outcome = 'reserved'
+                except InsufficientStock:
+                    db.session.rollback()
+                    outcome = 'short'
+                except OperationalError:
+                    db.session.rollback()
+                    outcome = 'errors'
+                with lock:
+                    counts[outcome] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        final_stock = db.session.get(Book, 1).stock
+        db.engine.dispose()
+    if db_file:
+        os.remove(db_file)
+
+    expected = stock - counts['reserved'] * quantity
+    print(f'workers={workers} attempts={orders} elapsed={elapsed:.2f}s '
+          f'throughput={orders / elapsed:.0f} checkouts/s')
+    print(f"reserved={counts['reserved']} short={counts['short']} errors={counts['errors']}")
+    print(f'final stock={final_stock} expected={expected} '
+          f"{'OK' if final_stock == expected and final_stock >= 0 else 'OVERSOLD'}")
+    return final_stock == expected and final_stock >= 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--stock', type=int, default=1000)
+    parser.add_argument('--quantity', type=int, default=1)
+    args = parser.parse_args()
+    ok = run(args.workers, args.orders, args.stock, args.quantity)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,280 @@
+"""
+Synthetic data generator
+Fills a bookstore database with a reproducible catalog, customers, orders
+and reviews at any scale (millions of rows), then rebuilds the derived data
+(rating aggregates, reorder levels, sales rollups and dashboard totals) the
+way the running app would have maintained it
+
+Usage:
+    python benchmarks/datagen.py [--books 100000] [--users 20000] [--orders 200000] [--reviews 100000]
+                                 [--database instance/benchmark.db] [--seed 42]
+
+Rows are written with batched Core INSERTs of --batch-size rows against the
+model tables. The same seed always produces the same data. Generated users
+are named bench<id> and share the password BENCHMARK_PASSWORD. Set
+DATABASE_URL to fill PostgreSQL/MySQL instead of a SQLite file.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import ROOT, create_benchmark_app
+from sqlalchemy import func, insert, select
+from app import analytics, stats
+from app.bootstrap import bootstrap
+from app.inventory import refresh_reorder_levels
+from app.models import db, Book, Category, Order, OrderItem, Review, User
+from app.passwords import password_hasher
+from app.reviews import backfill_ratings
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+CATEGORIES = ['Fiction', 'Science Fiction', 'Mystery', 'Self-Help', 'Technology', 'History',
+              'Biography', 'Fantasy', 'Romance', 'Poetry', 'Travel', 'Cooking', 'Children',
+              'Business', 'Science', 'Philosophy', 'Art', 'Health', 'Religion', 'Sports']
+
+# Small vocabulary so searches for these words match many books
+WORDS = ['river', 'shadow', 'garden', 'python', 'empire', 'silent', 'winter', 'machine',
+         'journey', 'secret', 'ocean', 'kingdom', 'data', 'night', 'light', 'city', 'stone',
+         'history', 'dream', 'code', 'war', 'peace', 'mountain', 'glass', 'fire', 'letters',
+         'forest', 'star', 'island', 'memory', 'science', 'house', 'road', 'storm', 'design']
+FIRST_NAMES = ['Ada', 'Alan', 'Grace', 'Linus', 'Mary', 'James', 'Toni', 'Jorge', 'Ursula',
+               'Haruki', 'Chinua', 'Zadie', 'Isaac', 'Octavia', 'Gabriel', 'Virginia']
+LAST_NAMES = ['Lovelace', 'Turing', 'Hopper', 'Shelley', 'Baldwin', 'Morrison', 'Borges',
+              'Le Guin', 'Murakami', 'Achebe', 'Smith', 'Asimov', 'Butler', 'Marquez', 'Woolf']
+CITIES = ['Springfield', 'Riverton', 'Lakeside', 'Hillview', 'Fairport', 'Oakdale']
+LANGUAGES = ['English'] * 8 + ['Spanish', 'French']
+ORDER_STATUSES = ['Delivered'] * 10 + ['Shipped'] * 3 + ['Processing'] * 2 + ['Pending'] * 3 + ['Cancelled'] * 2
+REVIEW_RATINGS = [5] * 4 + [4] * 3 + [3] * 2 + [2, 1]
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _insert_batches(table, rows, batch_size, progress=None):
+    """Insert an iterable of row dicts in batches, committing each batch"""
+    batch = []
+    written = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(table), batch)
+            db.session.commit()
+            written += len(batch)
+            batch = []
+            if progress:
+                progress(table.name, written)
+    if batch:
+        db.session.execute(insert(table), batch)
+        db.session.commit()
+        written += len(batch)
+    return written
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _popular(rng, count):
+    """Index in range(count) skewed towards the start (popular items)"""
+    return int(count * rng.random() ** 2)
+
+
+def generate(books, users, orders, reviews, seed=42, batch_size=10000, days=365, progress=None):
+    """
+    Add synthetic rows to the current app's database
+    Existing rows are kept; new IDs continue after the current maximum
+    Args:
+        books, users, orders, reviews: Number of rows to add
+        seed: Random seed (same seed, same data)
+        batch_size: Rows per INSERT batch
+        days: Orders and reviews are spread over this many past days
+        progress: Optional callable(table name, rows written so far)
+    Returns:
+        Dict of table name to rows added
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+
+    def past():
+        return now - timedelta(seconds=rng.randrange(days * 86400))
+
+    existing = {name for (name,) in db.session.execute(select(Category.name))}
+    missing = [name for name in CATEGORIES if name not in existing]
+    if missing:
+        db.session.execute(insert(Category.__table__),
+                           [{'name': name, 'description': f'{name} books', 'created_at': now}
+                            for name in missing])
+        db.session.commit()
+    category_ids = [category_id for (category_id,) in db.session.execute(select(Category.id))]
+
+    first_book = _next_id(Book)
+    added = {'book': _insert_batches(Book.__table__, (
+        {
+            'id': book_id,
+            'title': _phrase(rng, rng.randint(2, 5)).title(),
+            'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'isbn': f'BENCH-{book_id:013d}',
+            'description': _phrase(rng, rng.randint(20, 60)).capitalize() + '.',
+            'price': round(rng.uniform(4.99, 79.99), 2),
+            'stock': rng.randint(0, 300),
+            'category_id': rng.choice(category_ids),
+            'publisher': f'{rng.choice(LAST_NAMES)} Press',
+            'publication_year': rng.randint(1850, now.year),
+            'pages': rng.randint(80, 1200),
+            'language': rng.choice(LANGUAGES),
+            'created_at': past(),
+            'updated_at': now,
+        }
+        for book_id in range(first_book, first_book + books)
+    ), batch_size, progress)}
+
+    # Hashed once: every generated user shares the password
+    password_hash = password_hasher.hash(BENCHMARK_PASSWORD)
+    first_user = _next_id(User)
+    added['user'] = _insert_batches(User.__table__, (
+        {
+            'id': user_id,
+            'username': f'bench{user_id}',
+            'email': f'bench{user_id}@example.com',
+            'password_hash': password_hash,
+            'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'address': f'{rng.randint(1, 999)} {rng.choice(WORDS).title()} Street',
+            'city': rng.choice(CITIES),
+            'postal_code': f'{rng.randint(10000, 99999)}',
+            'is_admin': False,
+            'created_at': past(),
+            'updated_at': now,
+        }
+        for user_id in range(first_user, first_user + users)
+    ), batch_size, progress)
+
+    catalog = db.session.execute(select(Book.id, Book.price)).all()
+    user_ids = [user_id for (user_id,) in db.session.execute(select(User.id))]
+    if not catalog or not user_ids:
+        return added
+
+    # Orders and their items are generated together so totals match; each
+    # batch of orders is inserted before its items
+    order_id = _next_id(Order)
+    item_id = _next_id(OrderItem)
+    added['order'] = added['order_item'] = 0
+    while added['order'] < orders:
+        order_batch, item_batch = [], []
+        for _ in range(min(batch_size, orders - added['order'])):
+            lines = {catalog[_popular(rng, len(catalog))] for _ in range(rng.choices((1, 2, 3, 4), (5, 3, 1, 1))[0])}
+            total = 0
+            for book_id, price in lines:
+                quantity = rng.choices((1, 2, 3), (8, 2, 1))[0]
+                item_batch.append({'id': item_id, 'order_id': order_id, 'book_id': book_id,
+                                   'quantity': quantity, 'price_at_purchase': price})
+                item_id += 1
+                total += price * quantity
+            created_at = past()
+            order_batch.append({
+                'id': order_id,
+                'user_id': rng.choice(user_ids),
+                'total_price': round(total, 2),
+                'status': rng.choice(ORDER_STATUSES),
+                'shipping_address': f'{rng.randint(1, 999)} {rng.choice(WORDS).title()} Street',
+                'shipping_city': rng.choice(CITIES),
+                'shipping_postal': f'{rng.randint(10000, 99999)}',
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+            order_id += 1
+        db.session.execute(insert(Order.__table__), order_batch)
+        db.session.execute(insert(OrderItem.__table__), item_batch)
+        db.session.commit()
+        added['order'] += len(order_batch)
+        added['order_item'] += len(item_batch)
+        if progress:
+            progress('order', added['order'])
+
+    # One review per user and book
+    reviewed = set(db.session.execute(select(Review.user_id, Review.book_id)).all())
+    limit = len(user_ids) * len(catalog)
+
+    def review_rows():
+        for _ in range(min(reviews, limit - len(reviewed))):
+            while True:
+                pair = (rng.choice(user_ids), catalog[_popular(rng, len(catalog))][0])
+                if pair not in reviewed:
+                    break
+            reviewed.add(pair)
+            created_at = past()
+            yield {
+                'user_id': pair[0],
+                'book_id': pair[1],
+                'rating': rng.choice(REVIEW_RATINGS),
+                'title': _phrase(rng, rng.randint(2, 6)).capitalize(),
+                'content': _phrase(rng, rng.randint(15, 80)).capitalize() + '.',
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+    added['review'] = _insert_batches(Review.__table__, review_rows(), batch_size, progress)
+    return added
+
+
+def rebuild_derived():
+    """Recompute everything the app maintains incrementally from the generated rows"""
+    backfill_ratings()
+    refresh_reorder_levels()
+    db.session.commit()
+    analytics.rebuild()
+    stats.reconcile()
+
+
+def populate(books, users, orders, reviews, seed=42, batch_size=10000, progress=None):
+    """
+    Bootstrap the schema, generate rows and rebuild the derived data
+    Runs inside the current app context
+    Returns:
+        Dict of table name to rows added
+    """
+    bootstrap(sample_data=False)
+    added = generate(books, users, orders, reviews, seed=seed, batch_size=batch_size, progress=progress)
+    rebuild_derived()
+    return added
+
+
+def run(books, users, orders, reviews, database, seed, batch_size):
+    uri = os.environ.get('DATABASE_URL') or f'sqlite:///{os.path.abspath(database)}'
+    app = create_benchmark_app(uri)
+
+    def progress(table, written):
+        print(f'  {table}: {written} rows', end='\r', flush=True)
+
+    started = time.perf_counter()
+    with app.app_context():
+        added = populate(books, users, orders, reviews, seed=seed, batch_size=batch_size, progress=progress)
+        db.engine.dispose()
+    elapsed = time.perf_counter() - started
+
+    total = sum(added.values())
+    print(' ' * 40, end='\r')
+    for table, count in added.items():
+        print(f'{table:<12} {count:>10} rows')
+    print(f'{total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s) -> {uri}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--database', default=os.path.join(ROOT, 'instance', 'benchmark.db'),
+                        help='SQLite file to fill when DATABASE_URL is not set')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.database)), exist_ok=True)
+    run(args.books, args.users, args.orders, args.reviews, args.database, args.seed, args.batch_size)
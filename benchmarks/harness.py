@@ -0,0 +1,187 @@
+"""
+Shared benchmark helpers
+Benchmark app/database setup, latency percentiles, result tables and
+baseline files for datagen.py, micro.py and load.py
+
+Baselines are JSON files mapping benchmark name to its measures
+({'p50': ms, 'p95': ms, 'p99': ms, 'throughput': ops/s}). They are only
+comparable on the machine and dataset they were recorded with.
+"""
+import json
+import math
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+# Measures where a higher value is a regression
+LOWER_IS_BETTER = ('p50', 'p95', 'p99')
+
+
+def database_uri():
+    """
+    Database for a benchmark run
+    Returns:
+        (SQLAlchemy URI, temporary file to remove afterwards or None);
+        DATABASE_URL wins over a new temporary SQLite file
+    """
+    if os.environ.get('DATABASE_URL'):
+        return os.environ['DATABASE_URL'], None
+    fd, db_file = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    return f'sqlite:///{db_file}', db_file
+
+
+def create_benchmark_app(uri, **settings):
+    """
+    App on the given database with benchmark-friendly settings
+    CSRF and the job worker threads are off; keyword arguments override any
+    setting (e.g. CACHE_BACKEND='null')
+    """
+    from app import create_app
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = uri
+        WTF_CSRF_ENABLED = False
+        JOBS_MODE = 'external'
+
+    for name, value in settings.items():
+        setattr(BenchmarkConfig, name, value)
+    return create_app(BenchmarkConfig)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed=None):
+    """
+    Latency percentiles and throughput of a list of timings
+    Args:
+        samples: Durations in seconds
+        elapsed: Wall-clock seconds of the run (defaults to the sum of the
+                 samples, i.e. sequential execution)
+    Returns:
+        Dict with 'count', 'p50', 'p95', 'p99' (milliseconds) and
+        'throughput' (operations per second)
+    """
+    ordered = sorted(samples)
+    elapsed = elapsed if elapsed is not None else sum(ordered)
+    return {
+        'count': len(ordered),
+        'p50': percentile(ordered, 0.50) * 1000,
+        'p95': percentile(ordered, 0.95) * 1000,
+        'p99': percentile(ordered, 0.99) * 1000,
+        'throughput': len(ordered) / elapsed if elapsed else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of results against a baseline
+    Args:
+        results: Dict of benchmark name to summarize() output
+        baseline: Same shape, as loaded from a baseline file
+        tolerance: Allowed relative change (0.1 = 10%)
+    Returns:
+        Dict of benchmark name to {measure: relative change} for the
+        measures that got worse by more than the tolerance
+    """
+    regressions = {}
+    for name, measures in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for measure in LOWER_IS_BETTER + ('throughput',):
+            old, new = reference.get(measure), measures.get(measure)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if measure in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.setdefault(name, {})[measure] = change
+    return regressions
+
+
+def print_results(results, baseline=None, unit='ops/s'):
+    """Table of results, with the change against the baseline p95 when given"""
+    print(f"{'benchmark':<22} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {unit:>10}"
+          + (f" {'p95 vs base':>12}" if baseline else ''))
+    for name, measures in results.items():
+        line = (f"{name:<22} {measures['count']:>7} {measures['p50']:>9.2f} {measures['p95']:>9.2f} "
+                f"{measures['p99']:>9.2f} {measures['throughput']:>10.1f}")
+        reference = (baseline or {}).get(name)
+        if reference and reference.get('p95'):
+            line += f" {(measures['p95'] - reference['p95']) / reference['p95']:>+12.1%}"
+        print(line)
+
+
+def baseline_path(suite, path=None):
+    """Explicit baseline path, or benchmarks/baselines/<suite>.json"""
+    return path or os.path.join(BASELINE_DIR, f'{suite}.json')
+
+
+def load_baseline(path):
+    """Baseline results from a JSON file (None if it does not exist)"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save_baseline(path, results):
+    """Write results as the new baseline"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def report(suite, results, args):
+    """
+    Print results, compare them with the suite's baseline and optionally save
+    them as the new baseline
+    Args:
+        suite: Suite name ('micro' or 'load'), names the default baseline file
+        results: Dict of benchmark name to summarize() output
+        args: Parsed arguments with baseline, save_baseline and tolerance
+    Returns:
+        True if nothing regressed beyond the tolerance
+    """
+    path = baseline_path(suite, args.baseline)
+    baseline = load_baseline(path)
+    print_results(results, baseline)
+
+    ok = True
+    if baseline is None:
+        print(f'No baseline at {path} (record one with --save-baseline)')
+    else:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, measures in regressions.items():
+            changes = ', '.join(f'{measure} {change:+.1%}' for measure, change in measures.items())
+            print(f'REGRESSION {name}: {changes}')
+        ok = not regressions
+        print(f"{'OK' if ok else 'FAILED'}: compared with {path} (tolerance {args.tolerance:.0%})")
+
+    if args.save_baseline:
+        save_baseline(path, results)
+        print(f'Baseline saved to {path}')
+    return ok
+
+
+def add_baseline_arguments(parser):
+    """--baseline, --save-baseline and --tolerance options"""
+    parser.add_argument('--baseline', default=None,
+                        help='Baseline JSON file (default: benchmarks/baselines/<suite>.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed relative regression before failing (default 0.10)')
@@ -0,0 +1,231 @@
+"""
+HTTP load driver
+Concurrent virtual users log in and browse over real HTTP: home page,
+catalog pages and searches, book pages, add to cart and checkout in a fixed
+mix. Reports p50/p95/p99 latency and throughput per endpoint and compares
+them with a stored baseline
+
+Usage:
+    python benchmarks/load.py [--users 8] [--duration 20] [--warmup 3]
+    python benchmarks/load.py --save-baseline
+    DATABASE_URL=sqlite:///instance/benchmark.db python benchmarks/load.py --url http://127.0.0.1:8000
+
+Without --url the app is served in-process by a threaded Werkzeug server,
+on a temporary SQLite database filled by datagen.py unless DATABASE_URL is
+set. With --url an already running server is driven (e.g. gunicorn, which
+keeps the driver and the app from sharing one interpreter); DATABASE_URL
+must then point at that server's database, filled with datagen.py, to pick
+book IDs and benchmark users from. Exits with status 1 when an endpoint
+regressed beyond --tolerance against the baseline or requests failed.
+"""
+import argparse
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import add_baseline_arguments, create_benchmark_app, database_uri, report, summarize
+from datagen import BENCHMARK_PASSWORD, WORDS, populate
+from sqlalchemy import select
+from werkzeug.serving import make_server
+from app.models import db, Book, User
+
+# Relative frequency of each step in a virtual user's session
+MIX = {
+    'home': 20,
+    'books': 30,
+    'book_detail': 30,
+    'add_to_cart': 15,
+    'checkout': 5,
+}
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """Report redirects instead of following them, so each request is timed alone"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    """One logged-in browser session with its own cookies and cart"""
+
+    def __init__(self, base_url, email, book_ids, rng):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.book_ids = book_ids
+        self.rng = rng
+        self.cart_items = 0
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def request(self, path, data=None):
+        """
+        Issue one request and read the whole response
+        Returns:
+            (status code, body)
+        """
+        body = urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(Request(self.base_url + path, data=body), timeout=60) as response:
+                return response.status, response.read()
+        except HTTPError as error:
+            # Redirects and error pages both arrive here
+            with error:
+                return error.code, error.read()
+
+    def login(self):
+        status, body = self.request('/auth/login')
+        form = {'email': self.email, 'password': BENCHMARK_PASSWORD}
+        token = CSRF_TOKEN.search(body.decode('utf-8', 'replace'))
+        if token:
+            form['csrf_token'] = token.group(1)
+        status, _ = self.request('/auth/login', form)
+        if status != 302:
+            raise RuntimeError(f'Login as {self.email} failed with status {status}')
+
+    def step(self, name):
+        """
+        Perform one step of the mix
+        Returns:
+            (endpoint name actually exercised, status code)
+        """
+        if name == 'checkout' and not self.cart_items:
+            name = 'add_to_cart'
+        if name == 'home':
+            status, _ = self.request('/')
+        elif name == 'books':
+            if self.rng.random() < 0.3:
+                status, _ = self.request(f'/books?search={self.rng.choice(WORDS)}')
+            else:
+                status, _ = self.request(f'/books?page={self.rng.randint(1, 5)}')
+        elif name == 'book_detail':
+            status, _ = self.request(f'/book/{self.rng.choice(self.book_ids)}')
+        elif name == 'add_to_cart':
+            status, _ = self.request(f'/cart/add/{self.rng.choice(self.book_ids)}', {})
+            self.cart_items += 1
+        else:
+            status, _ = self.request('/checkout', {})
+            self.cart_items = 0
+        return name, status
+
+
+def _serve(app):
+    """Serve the app on a free local port from a background thread"""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def drive(base_url, emails, book_ids, duration, warmup, seed):
+    """
+    Run the virtual users for warmup + duration seconds
+    Returns:
+        (dict of endpoint to latencies, dict of endpoint to failed requests)
+    """
+    samples = {name: [] for name in MIX}
+    failures = {name: 0 for name in MIX}
+    lock = threading.Lock()
+    names, weights = list(MIX), list(MIX.values())
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(number, email):
+        rng = random.Random(seed + number)
+        user = VirtualUser(base_url, email, book_ids, rng)
+        user.login()
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            try:
+                name, status = user.step(name)
+            except (URLError, OSError):
+                status = None
+            elapsed = time.perf_counter() - started
+            if started < measure_from:
+                continue
+            with lock:
+                if status in (200, 302):
+                    samples[name].append(elapsed)
+                else:
+                    failures[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(number, email)) for number, email in enumerate(emails)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, failures
+
+
+def run(args):
+    uri, db_file = database_uri()
+    if args.url and db_file:
+        os.remove(db_file)
+        sys.exit('--url needs DATABASE_URL pointing at the server database')
+
+    app = create_benchmark_app(uri)
+    with app.app_context():
+        if db_file:
+            started = time.perf_counter()
+            populate(args.books, args.users * 10, args.orders, args.reviews, seed=args.seed)
+            print(f'Generated data in {time.perf_counter() - started:.1f}s')
+        book_ids = list(db.session.scalars(select(Book.id)))
+        emails = list(db.session.scalars(
+            select(User.email).where(User.username.startswith('bench')).order_by(User.id).limit(args.users)
+        ))
+    if len(emails) < args.users:
+        sys.exit(f'Only {len(emails)} benchmark users in the database; run datagen.py with more --users')
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = _serve(app)
+
+    samples, failures = drive(base_url, emails, book_ids, args.duration, args.warmup, args.seed)
+
+    if server is not None:
+        server.shutdown()
+    with app.app_context():
+        db.engine.dispose()
+    if db_file:
+        os.remove(db_file)
+
+    results = {name: summarize(latencies, elapsed=args.duration) for name, latencies in samples.items()}
+    results['total'] = summarize([latency for latencies in samples.values() for latency in latencies],
+                                 elapsed=args.duration)
+    failed = sum(failures.values())
+    print(f'{base_url}: {args.users} users for {args.duration}s, {len(book_ids)} books, '
+          f"{results['total']['count']} requests, {failed} failed")
+    if failed:
+        print('failed: ' + ', '.join(f'{name}={count}' for name, count in failures.items() if count))
+    return report('load', results, args) and not failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default=None, help='Drive a running server instead of serving in-process')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before measuring')
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    add_baseline_arguments(parser)
+    ok = run(parser.parse_args())
+    sys.exit(0 if ok else 1)
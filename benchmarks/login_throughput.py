@@ -0,0 +1,102 @@
+"""
+Login throughput benchmark
+Concurrent clients log in through the auth.login view and the run reports
+logins per second, overall and per CPU core, for a password hash method
+
+Usage:
+    python benchmarks/login_throughput.py [--method scrypt:32768:8:1] [--clients 8] [--logins 200]
+    python benchmarks/login_throughput.py --stored-method pbkdf2:sha256:600000
+
+--stored-method hashes the users' passwords with a different method first,
+so the first login of each user also measures the transparent rehash.
+Set DATABASE_URL to benchmark against PostgreSQL/MySQL instead of a
+temporary SQLite file.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import create_benchmark_app, database_uri
+from werkzeug.security import generate_password_hash
+from app.bootstrap import bootstrap
+from app.models import db, User
+from config import Config
+
+PASSWORD = 'benchmark-password'
+
+
+def run(method, stored_method, clients, logins, users, hash_workers):
+    uri, db_file = database_uri()
+    settings = {'PASSWORD_HASH_METHOD': method}
+    if hash_workers is not None:
+        settings['PASSWORD_HASH_WORKERS'] = hash_workers
+    app = create_benchmark_app(uri, **settings)
+    with app.app_context():
+        bootstrap(sample_data=False)
+        stored_hash = generate_password_hash(PASSWORD, stored_method or method)
+        db.session.add_all([
+            User(username=f'bench{number}', email=f'bench{number}@example.com',
+                 full_name=f'Benchmark User {number}', password_hash=stored_hash)
+            for number in range(users)
+        ])
+        db.session.commit()
+
+    counts = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+    remaining = iter(range(logins))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                number = next(remaining, None)
+            if number is None:
+                return
+            response = client.post('/auth/login', data={
+                'email': f'bench{number % users}@example.com',
+                'password': PASSWORD,
+            })
+            client.get('/auth/logout')
+            with lock:
+                counts['ok' if response.status_code == 302 else 'failed'] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        upgraded = User.query.filter(User.username.startswith('bench'),
+                                     User.password_hash.startswith(
+                                         app.extensions['password_hasher']['method'] + '$')).count()
+        db.engine.dispose()
+    if db_file:
+        os.remove(db_file)
+
+    cores = os.cpu_count() or 1
+    print(f'method={method} stored={stored_method or method} clients={clients} '
+          f"hash_workers={app.config['PASSWORD_HASH_WORKERS']} cores={cores}")
+    print(f'logins={logins} elapsed={elapsed:.2f}s throughput={logins / elapsed:.1f} logins/s '
+          f'({logins / elapsed / cores:.1f} per core)')
+    print(f"ok={counts['ok']} failed={counts['failed']} users on current method={upgraded}/{users}")
+    return counts['failed'] == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--method', default=Config.PASSWORD_HASH_METHOD)
+    parser.add_argument('--stored-method', default=None)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--hash-workers', type=int, default=None)
+    args = parser.parse_args()
+    ok = run(args.method, args.stored_method, args.clients, args.logins, args.users, args.hash_workers)
+    sys.exit(0 if ok else 1)
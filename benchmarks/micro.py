@@ -0,0 +1,182 @@
+"""
+Micro-benchmarks for hot code paths
+Times the functions behind the busiest pages one call at a time: cart
+pricing, stock reservation, a whole checkout request, catalog search and the
+admin dashboard / analytics aggregates, and compares p50/p95/p99 latency and
+throughput with a stored baseline
+
+Usage:
+    python benchmarks/micro.py [--iterations 200] [--only price_cart,search]
+    python benchmarks/micro.py --save-baseline
+    python benchmarks/micro.py --books 200000 --orders 500000 --iterations 500
+
+Without DATABASE_URL a temporary SQLite database is filled by datagen.py at
+the --books/--users/--orders/--reviews scale. With DATABASE_URL the existing
+data is used as-is (fill it with datagen.py first); the checkout benchmark
+places real orders in it. Exits with status 1 when a benchmark regressed
+beyond --tolerance against the baseline.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import add_baseline_arguments, create_benchmark_app, database_uri, report, summarize
+from datagen import BENCHMARK_PASSWORD, WORDS, populate
+from sqlalchemy import select
+from app import analytics
+from app.cart import price_cart
+from app.inventory import low_stock_books, reserve_stock
+from app.models import db, Book, Order, User
+from app.queries import orders_with_summary
+from app.search import book_search
+from app.stats import get_stats
+
+BENCHMARKS = {}
+
+
+def benchmark(name, setup=None):
+    """
+    Register a benchmark: a callable(data, rng) timed once per iteration
+    Args:
+        name: Benchmark name
+        setup: Optional callable(data, rng) run untimed before each call
+    """
+    def register(function):
+        BENCHMARKS[name] = (function, setup)
+        return function
+    return register
+
+
+class BenchmarkData:
+    """IDs the benchmarks draw from, loaded once before timing starts"""
+
+    def __init__(self, app):
+        with app.app_context():
+            self.book_ids = list(db.session.scalars(select(Book.id)))
+            # Books that can take many single-copy orders without running out
+            self.stocked_ids = list(db.session.scalars(select(Book.id).where(Book.stock >= 100)))
+            self.user_email = db.session.scalar(
+                select(User.email).where(User.username.startswith('bench')).order_by(User.id)
+            )
+        self.app = app
+        self.client = None
+
+
+@benchmark('price_cart')
+def bench_price_cart(data, rng):
+    price_cart({book_id: rng.randint(1, 3) for book_id in rng.sample(data.book_ids, 10)})
+
+
+@benchmark('reserve_stock')
+def bench_reserve_stock(data, rng):
+    reserve_stock({book_id: 1 for book_id in rng.sample(data.stocked_ids, 3)})
+    db.session.rollback()
+
+
+def _fill_cart(data, rng):
+    for book_id in rng.sample(data.stocked_ids, 2):
+        data.client.post(f'/cart/add/{book_id}')
+
+
+@benchmark('checkout', setup=_fill_cart)
+def bench_checkout(data, rng):
+    # The whole view: pricing, reservation, order rows, stats, rollups and
+    # the confirmation job
+    data.client.post('/checkout')
+
+
+@benchmark('search')
+def bench_search(data, rng):
+    search = f'{rng.choice(WORDS)} {rng.choice(WORDS)}'
+    book_search.search(Book.query, search).limit(20).all()
+
+
+@benchmark('admin_dashboard')
+def bench_admin_dashboard(data, rng):
+    get_stats()
+    orders_with_summary().order_by(Order.created_at.desc()).limit(10).all()
+    low_stock_books().order_by(Book.stock, Book.id).limit(10).all()
+
+
+@benchmark('sales_analytics')
+def bench_sales_analytics(data, rng):
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=rng.choice((7, 30, 90, 365)) - 1)
+    analytics.daily_series(start, end)
+    analytics.top_sellers(start, end)
+    analytics.category_revenue(start, end)
+
+
+def time_benchmark(name, data, iterations, warmup, seed):
+    """
+    Run one benchmark
+    Returns:
+        summarize() of the timed iterations
+    """
+    function, setup = BENCHMARKS[name]
+    rng = random.Random(seed)
+    samples = []
+    with data.app.app_context():
+        for iteration in range(warmup + iterations):
+            if setup is not None:
+                setup(data, rng)
+            started = time.perf_counter()
+            function(data, rng)
+            elapsed = time.perf_counter() - started
+            # A fresh session per call, as each request gets
+            db.session.remove()
+            if iteration >= warmup:
+                samples.append(elapsed)
+    return summarize(samples)
+
+
+def run(args):
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmark(s): {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+
+    uri, db_file = database_uri()
+    app = create_benchmark_app(uri)
+    if db_file:
+        started = time.perf_counter()
+        with app.app_context():
+            populate(args.books, args.users, args.orders, args.reviews, seed=args.seed)
+        print(f'Generated data in {time.perf_counter() - started:.1f}s')
+
+    data = BenchmarkData(app)
+    if 'checkout' in names:
+        data.client = app.test_client()
+        data.client.post('/auth/login', data={'email': data.user_email, 'password': BENCHMARK_PASSWORD})
+
+    results = {}
+    for name in names:
+        results[name] = time_benchmark(name, data, args.iterations, args.warmup, args.seed)
+
+    with app.app_context():
+        db.engine.dispose()
+    if db_file:
+        os.remove(db_file)
+
+    print(f'{len(data.book_ids)} books, {args.iterations} iterations per benchmark')
+    return report('micro', results, args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--only', default=None, help='Comma-separated benchmark names')
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    add_baseline_arguments(parser)
+    ok = run(parser.parse_args())
+    sys.exit(0 if ok else 1)
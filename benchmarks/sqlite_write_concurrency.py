@@ -0,0 +1,99 @@
+"""
+SQLite write concurrency benchmark
+Several worker processes (like gunicorn workers) share one SQLite file and
+mix catalog reads with checkout-style stock writes; the run is repeated
+without and with the SQLITE_PRAGMAS engine profile and reports throughput
+and "database is locked" errors for each
+
+Usage:
+    python benchmarks/sqlite_write_concurrency.py [--workers 4] [--seconds 10] [--write-ratio 0.3]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import create_benchmark_app
+from sqlalchemy.exc import OperationalError
+from app.bootstrap import bootstrap
+from app.models import db, Book
+from app.inventory import reserve_stock
+from app.queries import books_with_category
+from config import Config
+
+PROFILES = {
+    'before': {},  # SQLite defaults: rollback journal, synchronous=FULL
+    'after': Config.SQLITE_PRAGMAS,
+}
+
+
+def worker(db_file, pragmas, seconds, write_ratio, results):
+    app = create_benchmark_app(f'sqlite:///{db_file}', SQLITE_PRAGMAS=pragmas)
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    with app.app_context():
+        book_ids = [book_id for book_id, in db.session.query(Book.id)]
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                if random.random() < write_ratio:
+                    reserve_stock({random.choice(book_ids): 1})
+                    db.session.commit()
+                    counts['writes'] += 1
+                else:
+                    books_with_category(Book.query).order_by(Book.id.desc()).limit(12).all()
+                    db.session.rollback()
+                    counts['reads'] += 1
+            except OperationalError:
+                db.session.rollback()
+                counts['locked'] += 1
+    results.put(counts)
+
+
+def run(profile, workers, seconds, write_ratio):
+    fd, db_file = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    pragmas = PROFILES[profile]
+
+    app = create_benchmark_app(f'sqlite:///{db_file}', SQLITE_PRAGMAS=pragmas)
+    with app.app_context():
+        bootstrap()
+        Book.query.update({Book.stock: 10 ** 9})
+        db.session.commit()
+        db.engine.dispose()
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(db_file, pragmas, seconds, write_ratio, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    totals = {'reads': 0, 'writes': 0, 'locked': 0}
+    for _ in processes:
+        for name, count in results.get().items():
+            totals[name] += count
+    for process in processes:
+        process.join()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+    print(f'{profile:>6}: workers={workers} {seconds}s '
+          f"reads={totals['reads'] / seconds:.0f}/s writes={totals['writes'] / seconds:.0f}/s "
+          f"locked={totals['locked']}")
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--profile', choices=list(PROFILES), action='append',
+                        help='Profile to run (default: both)')
+    args = parser.parse_args()
+    for name in args.profile or list(PROFILES):
+        run(name, args.workers, args.seconds, args.write_ratio)
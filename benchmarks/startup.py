@@ -0,0 +1,95 @@
+"""
+Application startup benchmark
+Measures worker cold start in fresh interpreters (import, create_app() and
+the first request to the home page) and repeated create_app() calls in one
+process, as a test suite creates apps
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--apps 50]
+
+Set DATABASE_URL to benchmark against PostgreSQL/MySQL instead of a
+temporary SQLite file.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import ROOT, create_benchmark_app, database_uri
+
+# Runs in a fresh interpreter for each cold start
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app import create_app
+from config import Config
+imported = time.perf_counter()
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = {uri!r}
+    TEMPLATE_CACHE_DIR = {template_cache!r}
+    JOBS_MODE = 'external'
+
+app = create_app(BenchmarkConfig)
+created = time.perf_counter()
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'status': status}}))
+"""
+
+
+def cold_starts(runs, uri, template_cache):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START.format(root=ROOT, uri=uri, template_cache=template_cache)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        timings.append(json.loads(output.strip().splitlines()[-1]))
+    return timings
+
+
+def run(runs, apps):
+    from app import create_app
+    from app.bootstrap import bootstrap
+    from app.models import db
+    from config import TestingConfig
+
+    uri, db_file = database_uri()
+    template_cache = tempfile.mkdtemp(prefix='bookstore-templates-')
+
+    app = create_benchmark_app(uri)
+    with app.app_context():
+        bootstrap()
+        db.engine.dispose()
+
+    for label, cache_dir in (('no template cache', None), ('template cache', template_cache)):
+        timings = cold_starts(runs, uri, cache_dir)
+        print(f'cold start, {label} ({runs} runs, median):')
+        for step in ('import', 'create_app', 'first_request'):
+            print(f'  {step:<14} {statistics.median(t[step] for t in timings) * 1000:7.1f} ms')
+
+    started = time.perf_counter()
+    for _ in range(apps):
+        create_app(TestingConfig)
+    elapsed = time.perf_counter() - started
+    print(f'create_app(TestingConfig) x{apps}: {elapsed / apps * 1000:.1f} ms per app')
+
+    if db_file:
+        os.remove(db_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--apps', type=int, default=50)
+    args = parser.parse_args()
+    run(args.runs, args.apps)
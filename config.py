@@ -12,6 +12,31 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///bookstore.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Database Engine Profile (see app/database.py)
+    # Pool settings apply to PostgreSQL/MySQL and SQLite files; recycle and
+    # pre-ping only to server databases
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = 1800  # seconds, below typical server idle timeouts
+    DB_POOL_PRE_PING = True
+    # Run on every new SQLite connection; WAL lets readers and one writer
+    # work concurrently across worker processes
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',  # durable across app crashes; WAL keeps it consistent
+        'busy_timeout': 5000,  # ms to wait for the write lock
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # KiB
+        'temp_store': 'memory',
+    }
+    # Read replicas (comma-separated URIs) for catalog pages and admin
+    # reports; a session that wrote stays on the primary for DB_REPLICA_LAG
+    # seconds so it reads its own writes
+    DB_REPLICA_URIS = [uri.strip() for uri in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',')
+                       if uri.strip()]
+    DB_REPLICA_LAG = 5  # seconds
+    
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -20,14 +45,118 @@ class Config:
     
     # Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    UPLOAD_FOLDER = 'app/static/uploads'
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'app/static/uploads'  # relative to the project root
+    
+    # Cover Images (app/covers.py); thumbnails are 2:3 and served from
+    # /covers/ with immutable cache headers
+    COVER_WIDTHS = (160, 320, 640)  # thumbnail widths in pixels, for srcset
+    COVER_JPEG_QUALITY = 85
+    COVER_WEBP_QUALITY = 80
+    COVER_MAX_AGE = 365 * 24 * 3600  # seconds
     ALLOWED_EXTENSIONS = {'pdf', 'txt', 'png', 'jpg', 'jpeg', 'gif'}
+    
+    # Search Configuration
+    # 'auto' picks SQLite FTS5 or PostgreSQL tsvector from the database URL,
+    # or set explicitly to 'sqlite_fts5', 'postgres_tsvector' or 'like'
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    
+    # Cart Configuration
+    # 'sql' stores carts in the cart_item table (shared by all workers),
+    # 'memory' keeps them in-process (single worker / development only)
+    CART_BACKEND = os.environ.get('CART_BACKEND') or 'sql'
+    CART_TTL = timedelta(days=30)  # idle lines expire; `flask purge-carts` deletes their rows
+    
+    # Pagination Configuration
+    # 'keyset' pages listings with cursors (explicit ?page= links still use
+    # OFFSET); 'offset' always uses page numbers
+    PAGINATION_MODE = 'keyset'
+    # Totals shown next to listings: 'exact', 'cached' or 'none'
+    PAGINATION_COUNT = 'cached'
+    PAGINATION_COUNT_TTL = 60  # seconds
+    
+    # Admin Dashboard Statistics
+    # Running totals are recomputed from scratch when older than this
+    # (None relies on `flask reconcile-stats` being scheduled)
+    STATS_MAX_STALENESS = timedelta(hours=6)
+    
+    # Inventory Configuration
+    # Default reorder level; books and categories can set their own
+    LOW_STOCK_THRESHOLD = 5
+    
+    # Logged-in User Cache (per process; other processes see a change to a
+    # user once their entry expires)
+    USER_CACHE_TTL = 60  # seconds, 0 disables
+    USER_CACHE_MAX_ENTRIES = 4096
+    
+    # Password Hashing
+    # Any Werkzeug method with its cost, e.g. 'pbkdf2:sha256:600000'; hashes
+    # made with other settings are upgraded on the user's next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = os.cpu_count() or 1  # concurrent hash verifications
+    
+    # Background Jobs
+    # 'thread' runs jobs in worker threads of each web process, 'external'
+    # leaves them to `flask run-jobs` processes, 'eager' runs them at the end
+    # of the request that queued them
+    JOBS_MODE = os.environ.get('JOBS_MODE') or 'thread'
+    JOBS_WORKERS = 2
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_BACKOFF = 30  # seconds before the first retry, doubled per attempt
+    
+    # Mail Configuration (messages are only logged when MAIL_SERVER is unset)
+    MAIL_SERVER = os.environ.get('MAIL_SERVER')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
+    MAIL_USE_TLS = True
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'ARX Bookstore <noreply@bookstore.com>'
+    CONTACT_EMAIL = os.environ.get('CONTACT_EMAIL') or 'support@bookstore.com'
+    
+    # Fragment Cache Configuration
+    # 'lru' (per process), 'file' (shared by workers on one host) or 'null'
+    # Stock badges on cached listing fragments can lag by up to the TTL;
+    # checkout always re-checks stock
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'lru'
+    CACHE_DEFAULT_TTL = 300  # seconds
+    CACHE_MAX_ENTRIES = 1024
+    
+    # Request Instrumentation (app/metrics.py); off by default, so requests
+    # pay nothing for it
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    METRICS_SERVER_TIMING = True  # Server-Timing header with DB and app time
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token for /metrics scrapers
+    # Who may read /metrics without the token; None for anyone. Behind a
+    # reverse proxy this needs ProxyFix, or every client is the proxy
+    METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+    SLOW_QUERY_THRESHOLD = 0.25  # seconds; slower statements are logged
+    
+    # Request Profiling (app/profiling.py, admin Profiling page)
+    # 'sample' mode only adds a stack-sampling thread while a profiled request
+    # runs, so a low rate can stay on in production
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILING_MODE = 'sample'  # or 'cprofile' (deterministic, much slower requests)
+    PROFILING_SAMPLE_RATE = 0.01  # fraction of requests
+    PROFILING_ENDPOINTS = ()  # e.g. ('main.checkout', 'main.book_detail') to profile every request
+    PROFILING_HEADER = 'X-Profile'  # admins can ask for a profile of one request
+    
+    # Static Assets (app/assets.py)
+    # `flask build-assets` writes hashed, minified and precompressed copies
+    # plus this manifest (relative to the static folder); None serves the
+    # source files as they are
+    ASSETS_MANIFEST = 'dist/manifest.json'
+    ASSETS_MAX_AGE = 365 * 24 * 3600  # seconds, for hashed (immutable) files
+    
+    # Query Budget (statements per request, enforced only when TESTING)
+    QUERY_BUDGET = None
 
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     TESTING = False
+    METRICS_ENABLED = True
+    SLOW_QUERY_THRESHOLD = 0.05
+    ASSETS_MANIFEST = None  # edits to static files show up without a rebuild
 
 
 class TestingConfig(Config):
@@ -35,9 +164,23 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    JOBS_MODE = 'eager'
+    TEMPLATE_CACHE_DIR = None  # compile templates in memory only
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # fast hashing for tests
+    
+    # Fail any request that issues more SQL statements than this
+    # (override per view with app.queries.query_budget)
+    QUERY_BUDGET = 10
 
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
+    DB_POOL_SIZE = 10
+    DB_MAX_OVERFLOW = 20
+    METRICS_ENABLED = True
+    METRICS_SERVER_TIMING = False  # timings are for /metrics, not for browsers
+    # Requests arrive through the reverse proxy from 127.0.0.1, so only
+    # scrapers with METRICS_TOKEN may read /metrics
+    METRICS_ALLOWED_IPS = ()
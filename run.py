@@ -2,14 +2,16 @@
 Online Bookstore - Main Application Entry Point
 Run this file to start the Flask development server
 """
-from app import create_app, db
+from app import create_app
+from app.bootstrap import bootstrap
 
 if __name__ == '__main__':
     app = create_app()
     
-    # Create database tables and sample data
+    # Create database tables and sample data (production runs `flask init-db`
+    # once per deployment instead)
     with app.app_context():
-        db.create_all()
+        bootstrap()
     
     # Run development server
     app.run(debug=True, host='0.0.0.0', port=5000)
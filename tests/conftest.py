@@ -0,0 +1,29 @@
+import pytest
+from app import create_app
+from app.bootstrap import bootstrap
+from app.models import db
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh SQLite file with the sample catalog"""
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'bookstore.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(Config)
+    with app.app_context():
+        bootstrap()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def admin_client(app):
+    """Test client logged in as the sample admin"""
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'admin@bookstore.com', 'password': 'admin123'})
+    return client
@@ -0,0 +1,39 @@
+from app.models import db, Book
+
+
+def _form(**values):
+    form = {'title': 'New Book', 'author': 'An Author', 'isbn': '978-0000000001', 'price': '9.99',
+            'stock': '3', 'category_id': '1'}
+    form.update(values)
+    return form
+
+
+def test_add_book_with_duplicate_isbn_flashes_error(admin_client):
+    existing = Book.query.first().isbn
+    count = Book.query.count()
+
+    response = admin_client.post('/admin/books/add', data=_form(isbn=existing))
+
+    assert response.status_code == 200
+    assert 'An error occurred while adding the book' in response.get_data(as_text=True)
+    assert Book.query.count() == count
+
+
+def test_add_book_sets_reorder_level(admin_client):
+    response = admin_client.post('/admin/books/add', data=_form(reorder_threshold='7'))
+
+    assert response.status_code == 302
+    book = Book.query.filter_by(isbn='978-0000000001').one()
+    assert book.reorder_level == 7
+
+
+def test_edit_book_to_duplicate_isbn_flashes_error(admin_client):
+    first, second = Book.query.order_by(Book.id).limit(2).all()
+    isbn = first.isbn
+
+    response = admin_client.post(f'/admin/books/{first.id}/edit', data=_form(isbn=second.isbn))
+
+    assert response.status_code == 200
+    assert 'An error occurred while updating the book' in response.get_data(as_text=True)
+    db.session.expire_all()
+    assert db.session.get(Book, first.id).isbn == isbn
@@ -0,0 +1,10 @@
+def test_listings_validate_with_etag_only(app):
+    client = app.test_client()
+    response = client.get('/api/v1/books')
+    assert response.status_code == 200 and response.last_modified is None
+    assert client.get('/api/v1/books', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_single_book_sends_last_modified(app):
+    response = app.test_client().get('/api/v1/books/1')
+    assert response.status_code == 200 and response.last_modified is not None
@@ -0,0 +1,21 @@
+from app import create_app
+from app.assets import build
+from config import TestingConfig
+
+
+def test_default_upload_folder_is_excluded_from_build():
+    app = create_app(TestingConfig)
+    assert app.extensions['assets']['exclude'] == {'uploads'}
+
+
+def test_build_skips_excluded_folders(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'css' / 'style.css').write_text('body { color: red; }')
+    (static / 'uploads' / 'covers' / 'ab').mkdir(parents=True)
+    (static / 'uploads' / 'covers' / 'ab' / 'abcd-160.jpg').write_bytes(b'jpeg')
+
+    manifest = build(str(static), exclude={'uploads'})
+
+    assert list(manifest) == ['css/style.css']
+    assert not (static / 'dist' / 'uploads').exists()
@@ -0,0 +1,43 @@
+import io
+import json
+import pytest
+from app.bulk import import_books
+from app.models import db, Book
+
+
+def test_blank_stock_and_language_keep_existing_values(app):
+    book = Book.query.first()
+    stock, language = book.stock, book.language
+    csv_data = f'isbn,title,stock,language\n{book.isbn},Renamed,,\n'
+
+    report = import_books(io.StringIO(csv_data), 'csv')
+
+    assert report.updated == 1 and report.error_count == 0
+    db.session.expire_all()
+    book = db.session.get(Book, book.id)
+    assert (book.title, book.stock, book.language) == ('Renamed', stock, language)
+    assert app.test_client().get(f'/book/{book.id}').status_code == 200
+
+
+@pytest.mark.parametrize('category_id', [[1], {}, 1e400])
+def test_non_scalar_category_id_is_a_row_error(app, category_id):
+    lines = [
+        {'isbn': 'TEST-1', 'title': 'Bad', 'author': 'A', 'price': 5, 'category_id': category_id},
+        {'isbn': 'TEST-2', 'title': 'Good', 'author': 'A', 'price': 5, 'category_id': 1},
+    ]
+    stream = io.StringIO(''.join(json.dumps(line) + '\n' for line in lines))
+
+    report = import_books(stream, 'jsonl')
+
+    assert report.inserted == 1
+    assert report.errors == [(1, 'invalid category_id')]
+
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-Infinity', float('nan'), float('inf')])
+def test_non_finite_price_is_a_row_error(app, price):
+    line = {'isbn': 'TEST-3', 'title': 'Odd', 'author': 'A', 'price': price, 'category_id': 1}
+
+    report = import_books(io.StringIO(json.dumps(line) + '\n'), 'jsonl')
+
+    assert report.inserted == 0
+    assert report.errors == [(1, 'invalid price: must be a finite number')]
@@ -0,0 +1,15 @@
+from app.cache import fragment_cache
+
+
+def test_fragment_keys_do_not_collide(app):
+    with app.test_request_context():
+        assert fragment_cache.key('catalog', 'foo:None') != fragment_cache.key('catalog', 'foo', None)
+        assert fragment_cache.key('catalog', None) != fragment_cache.key('catalog', 'None')
+        assert fragment_cache.key('catalog', 'a', 1) == fragment_cache.key('catalog', 'a', 1)
+
+
+def test_books_results_keyed_on_parsed_args(app):
+    client = app.test_client()
+    client.get('/books', query_string={'search': 'foo', 'page': 'None:None'})
+    html = client.get('/books', query_string={'search': 'foo:None'}).get_data(as_text=True)
+    assert 'Search Results for "foo:None"' in html
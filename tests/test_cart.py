@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.cart import cart_store
+from app.models import db, CartItem, User
+
+
+def test_add_same_book_twice_upserts(app):
+    backend = cart_store.backend
+    backend.add('c1', 1)
+    backend.add('c1', 1, 2)
+    assert backend.get('c1') == {1: 3}
+    assert db.session.query(CartItem).filter_by(cart_id='c1').count() == 1
+
+
+def test_update_ignores_books_not_in_cart(app):
+    client = app.test_client()
+    client.post('/cart/add/1')
+    response = client.post('/cart/update', data={'quantity-1': '4', 'quantity-999999': '2'})
+    assert response.status_code == 302
+    assert db.session.query(CartItem.book_id, CartItem.quantity).all() == [(1, 4)]
+
+
+def _expire(cart_id):
+    db.session.execute(update(CartItem).where(CartItem.cart_id == cart_id)
+                       .values(updated_at=datetime.utcnow() - timedelta(days=365)))
+    db.session.commit()
+
+
+def test_expired_lines_are_not_returned_or_added_to(app):
+    backend = cart_store.backend
+    backend.add('c2', 1, 5)
+    backend.set_quantities('c2', {2: 1})
+    _expire('c2')
+
+    assert backend.get('c2') == {}
+    backend.add('c2', 1)
+    backend.set_quantities('c2', {2: 3})
+    assert backend.get('c2') == {1: 1, 2: 3}
+
+
+def test_expired_anonymous_cart_is_not_merged_at_login(app):
+    client = app.test_client()
+    client.post('/cart/add/1')
+    with client.session_transaction() as session:
+        anonymous_id = session['cart_id']
+    _expire(anonymous_id)
+
+    client.post('/auth/login', data={'email': 'admin@bookstore.com', 'password': 'admin123'})
+
+    admin = User.query.filter_by(email='admin@bookstore.com').one()
+    assert cart_store.backend.get(f'u{admin.id}') == {}
@@ -0,0 +1,105 @@
+import io
+import os
+import pytest
+from PIL import Image
+from app import covers
+from app.jobs import job_queue
+from app.models import db, Book, CoverImage
+
+
+def _image(color='red', size=(300, 450), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def _upload(client, book_id, data, filename='cover.png'):
+    return client.post(f'/admin/books/{book_id}/edit', content_type='multipart/form-data', data={
+        'title': 'Title', 'author': 'Author', 'price': '9.99', 'stock': '5', 'category_id': '1',
+        'cover_file': (io.BytesIO(data), filename),
+    })
+
+
+def test_ingest_stores_original_once_and_queues_processing(app):
+    data = _image()
+
+    cover = covers.ingest(data)
+    db.session.commit()
+
+    assert cover.status == 'pending' and (cover.width, cover.height) == (300, 450)
+    assert os.path.exists(os.path.join(covers.cover_folder(), covers.original_name(cover.key, 'png')))
+    assert covers.ingest(data).id == cover.id
+    assert CoverImage.query.count() == 1
+    assert job_queue.run_pending() == 1
+
+
+def test_ingest_rejects_non_images(app):
+    with pytest.raises(covers.InvalidCover):
+        covers.ingest(b'not an image')
+
+
+def test_process_cover_makes_thumbnails_and_shows_them(app):
+    book = Book.query.first()
+    cover = covers.ingest(_image())
+    covers.assign_cover(book, cover)
+    db.session.commit()
+
+    covers.process_cover(cover.id)
+
+    db.session.expire_all()
+    assert db.session.get(CoverImage, cover.id).status == 'ready'
+    assert db.session.get(Book, book.id).cover_key == cover.key
+    for width in app.config['COVER_WIDTHS']:
+        for extension in covers.THUMBNAIL_FORMATS:
+            path = os.path.join(covers.cover_folder(), covers.thumbnail_name(cover.key, width, extension))
+            with Image.open(path) as thumbnail:
+                assert thumbnail.size == (width, round(width * covers.COVER_RATIO))
+
+
+def test_uploaded_cover_is_deduplicated_and_served(app, admin_client):
+    first, second = Book.query.order_by(Book.id).limit(2).all()
+    data = _image('blue')
+
+    assert _upload(admin_client, first.id, data).status_code == 302
+    assert _upload(admin_client, second.id, data, 'same.png').status_code == 302
+
+    cover = CoverImage.query.one()
+    assert cover.status == 'ready'
+    assert {book.cover_key for book in Book.query.filter(Book.cover_id == cover.id)} == {cover.key}
+    with app.test_request_context():
+        srcset, url = covers.cover_srcset(cover.key, 'webp'), covers.cover_url(cover.key, 320)
+    assert srcset in admin_client.get(f'/book/{first.id}').get_data(as_text=True)
+
+    response = admin_client.get(url)
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    assert response.cache_control.public and response.cache_control.immutable
+    assert response.cache_control.max_age == app.config['COVER_MAX_AGE']
+    assert admin_client.get('/covers/../config.py').status_code == 404
+
+
+def test_failed_cover_is_processed_again_on_upload(app, admin_client):
+    book = Book.query.first()
+    data = _image('green')
+    cover = covers.ingest(data)
+    db.session.commit()
+    job_queue.run_pending()
+    cover.status = 'failed'
+    db.session.commit()
+
+    assert _upload(admin_client, book.id, data).status_code == 302
+
+    db.session.expire_all()
+    assert db.session.get(CoverImage, cover.id).status == 'ready'
+
+
+def test_purge_removes_files_of_rolled_back_uploads(app):
+    kept = covers.ingest(_image('white'))
+    db.session.commit()
+    orphan = covers.ingest(_image('black'))
+    orphan_path = os.path.join(covers.cover_folder(), covers.original_name(orphan.key, 'png'))
+    db.session.rollback()
+
+    assert covers.purge_orphans() == 0  # too recent
+    assert covers.purge_orphans(min_age=0) == 1
+    assert not os.path.exists(orphan_path)
+    assert os.path.exists(os.path.join(covers.cover_folder(), covers.original_name(kept.key, 'png')))
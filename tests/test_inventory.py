@@ -0,0 +1,47 @@
+import pytest
+from app.inventory import InsufficientStock, reserve_stock
+from app.models import db, Book
+
+
+@pytest.fixture(params=['returning', 'per_line'])
+def reserve(request, app, monkeypatch):
+    """reserve_stock with UPDATE ... RETURNING and with the per-line fallback"""
+    if request.param == 'per_line':
+        monkeypatch.setattr(db.engine.dialect, 'update_returning', False)
+    return reserve_stock
+
+
+def _set_stock(stock_by_id):
+    for book_id, stock in stock_by_id.items():
+        db.session.get(Book, book_id).stock = stock
+    db.session.commit()
+
+
+def _stock(book_id):
+    return db.session.scalar(db.select(Book.stock).where(Book.id == book_id))
+
+
+def test_reserve_decrements_every_line(reserve):
+    _set_stock({1: 10, 2: 10})
+
+    reserve({1: 3, 2: 1})
+    db.session.commit()
+
+    assert (_stock(1), _stock(2)) == (7, 9)
+
+
+def test_insufficient_stock_lists_every_short_line(reserve):
+    _set_stock({1: 10, 2: 1, 3: 0})
+    titles = {book.id: book.title for book in Book.query.filter(Book.id.in_([2, 3]))}
+
+    with pytest.raises(InsufficientStock) as raised:
+        reserve({1: 2, 2: 4, 3: 1, 999999: 1})
+    db.session.rollback()
+
+    shortages = sorted(raised.value.shortages, key=lambda shortage: shortage['book_id'])
+    assert shortages == [
+        {'book_id': 2, 'title': titles[2], 'requested': 4, 'available': 1},
+        {'book_id': 3, 'title': titles[3], 'requested': 1, 'available': 0},
+        {'book_id': 999999, 'title': 'this book', 'requested': 1, 'available': 0},
+    ]
+    assert _stock(1) == 10
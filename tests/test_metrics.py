@@ -0,0 +1,31 @@
+import pytest
+from app import create_app
+from config import ProductionConfig, TestingConfig
+
+
+@pytest.fixture
+def metrics_app(tmp_path):
+    def make(base=TestingConfig, **settings):
+        class Config(base):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'metrics.db'}"
+            METRICS_ENABLED = True
+        for name, value in settings.items():
+            setattr(Config, name, value)
+        return create_app(Config)
+    return make
+
+
+def test_allowlisted_address_reads_metrics(metrics_app):
+    client = metrics_app().test_client()
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 403
+
+
+def test_production_requires_the_token_even_from_localhost(metrics_app):
+    client = metrics_app(ProductionConfig, METRICS_TOKEN='s3cret', SECRET_KEY='x').test_client()
+    local = {'REMOTE_ADDR': '127.0.0.1'}
+    assert client.get('/metrics', environ_base=local).status_code == 403
+    assert client.get('/metrics', environ_base=local,
+                      headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', environ_base=local,
+                      headers={'Authorization': 'Bearer s3cret'}).status_code == 200
@@ -0,0 +1,28 @@
+import base64
+import json
+import pytest
+from app.pagination import decode_cursor, encode_cursor
+
+
+def _token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(['Dune', 7], 'next')
+    assert decode_cursor(token, 2) == (['Dune', 7], 'next')
+
+
+@pytest.mark.parametrize('keys', [[['Dune'], 7], [{}, 7], [None, 7], ['Dune'], 'Dune', [float('nan'), 7]])
+def test_tampered_cursor_is_ignored(keys):
+    assert decode_cursor(_token({'d': 'next', 'k': keys}), 2) is None
+
+
+@pytest.mark.parametrize('path', ['/books', '/api/v1/books'])
+def test_tampered_cursor_shows_first_page(app, path):
+    client = app.test_client()
+    first = client.get(path)
+    for keys in ([['x'], [1]], [{'a': 1}, 1], [None, None]):
+        response = client.get(path, query_string={'cursor': _token({'d': 'next', 'k': keys})})
+        assert response.status_code == 200
+        assert response.data == first.data
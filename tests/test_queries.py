@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import text
+from app.models import db
+from app.queries import QueryBudgetExceeded, query_budget
+
+
+@pytest.fixture
+def statements_view(app):
+    """Register /_statements/<count>, which issues count statements under a budget of 3"""
+    @query_budget(3)
+    def statements(count):
+        for _ in range(count):
+            db.session.execute(text('SELECT 1'))
+        return 'ok'
+
+    app.add_url_rule('/_statements/<int:count>', 'statements', statements)
+    return app.test_client()
+
+
+def test_view_within_budget_passes(statements_view):
+    assert statements_view.get('/_statements/3').status_code == 200
+
+
+def test_view_over_budget_fails_in_testing(statements_view):
+    with pytest.raises(QueryBudgetExceeded, match='issued 4 SQL statements'):
+        statements_view.get('/_statements/4')
+
+
+def test_budget_is_per_request(statements_view):
+    for _ in range(3):
+        assert statements_view.get('/_statements/2').status_code == 200
+
+
+def test_budget_is_not_enforced_outside_testing(app, statements_view):
+    app.testing = False
+    assert statements_view.get('/_statements/4').status_code == 200
+
+
+def test_listing_pages_stay_within_default_budget(app):
+    client = app.test_client()
+    for path in ('/', '/books', '/book/1', '/api/v1/books'):
+        assert client.get(path).status_code == 200
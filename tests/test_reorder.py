@@ -0,0 +1,61 @@
+from app.inventory import low_stock_books, notify_low_stock, refresh_reorder_levels, reserve_stock, stock_low
+from app.models import db, Book, Category
+
+
+def _set_stock(stock_by_id):
+    for book_id, stock in stock_by_id.items():
+        db.session.get(Book, book_id).stock = stock
+    db.session.commit()
+
+
+def test_reserve_reports_books_crossing_their_reorder_level(app):
+    _set_stock({1: 6, 2: 3})
+    refresh_reorder_levels()
+    db.session.commit()
+
+    crossings = reserve_stock({1: 2, 2: 1})
+
+    # Book 2 was already below its level
+    assert crossings == [{'book_id': 1, 'stock': 4, 'reorder_level': 5}]
+
+
+def test_notify_low_stock_sends_stock_low(app):
+    received = []
+
+    def receiver(sender, **crossing):
+        received.append(crossing)
+
+    crossing = {'book_id': 1, 'stock': 4, 'reorder_level': 5}
+    with stock_low.connected_to(receiver, app):
+        notify_low_stock([crossing])
+    assert received == [crossing]
+
+
+def test_reorder_level_prefers_book_then_category_then_global(app):
+    app.config['LOW_STOCK_THRESHOLD'] = 4
+    first, second, third = Book.query.order_by(Book.id).limit(3).all()
+    first.reorder_threshold = 9
+    second.reorder_threshold = None
+    db.session.get(Category, second.category_id).reorder_threshold = 7
+    third.reorder_threshold = None
+    if third.category_id == second.category_id:
+        third.category_id = Category.query.filter(Category.id != second.category_id).first().id
+    db.session.get(Category, third.category_id).reorder_threshold = None
+    db.session.commit()
+
+    refresh_reorder_levels()
+    db.session.commit()
+
+    db.session.expire_all()
+    assert [book.reorder_level for book in Book.query.order_by(Book.id).limit(3)] == [9, 7, 4]
+
+
+def test_low_stock_books_uses_reorder_level(app):
+    _set_stock({1: 2})
+    db.session.get(Book, 1).reorder_threshold = 3
+    refresh_reorder_levels(Book.id == 1)
+    db.session.commit()
+
+    assert 1 in {book.id for book in low_stock_books()}
+    _set_stock({1: 3})
+    assert 1 not in {book.id for book in low_stock_books()}
@@ -0,0 +1,13 @@
+from flask import g
+from sqlalchemy import create_engine, select, update
+from app.models import db, Book
+
+
+def test_selects_return_to_primary_after_a_write(app):
+    replica = create_engine('sqlite://')
+    primary = db.engine
+    with app.test_request_context():
+        g.db_replica = replica
+        assert db.session.get_bind(clause=select(Book.id)) is replica
+        db.session.get_bind(clause=update(Book).values(stock=1))
+        assert db.session.get_bind(clause=select(Book.id)) is primary